@@ -1,4 +1,34 @@
+import threading
 import streamlit as st
+from util.lazy_import import preload_in_background
+
+
+@st.cache_resource(show_spinner=False)
+def _start_heavy_import_preload():
+    """每个服务进程只执行一次：后台线程预加载 plotly / scipy / sklearn / wordcloud 等重量级依赖"""
+    return preload_in_background()
+
+
+_start_heavy_import_preload()
+
+
+def _prewarm_wordcloud():
+    # 在后台线程中导入，避免把数据加载和 pandas 的开销计入入口脚本的 import 时间
+    from store.anime_store import AnimeStore
+    from util.visualization_part1 import isekai_tag_texts
+    from util import wordcloud_cache
+    wordcloud_cache.submit(isekai_tag_texts(AnimeStore().df))
+
+
+@st.cache_resource(show_spinner=False)
+def _start_wordcloud_prewarm():
+    """每个服务进程只执行一次：后台预热 Isekai 词云的磁盘缓存（已有缓存时几乎无开销）"""
+    thread = threading.Thread(target=_prewarm_wordcloud, name="wordcloud-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+_start_wordcloud_prewarm()
 
 # 1. 定义页面列表（先实例化 Page 对象）
 search_page = st.Page("pages/search.py", title="Search")
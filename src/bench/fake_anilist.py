@@ -0,0 +1,291 @@
+# bench/fake_anilist.py
+"""
+本地的 AniList 替身：与 https://graphql.anilist.co 相同的 GraphQL 请求 / 响应格式，用来离线、可重复地测量抓取性能。
+
+支持 ingest.queries 中的全部查询：
+- MEDIA_QUERY（按季度分页）、batched_media_query（别名批量，超过 max_aliases 时返回复杂度错误）
+- MEDIA_BY_ID_QUERY（id_in）、AIRING_QUERY（airingSchedules，按 airingAt 升序分页）
+
+数据：
+- 合成（默认）：按 seed 生成每季约 items_per_season 部作品，字段长度与真实数据相近，
+  约 85% 为 JP，约 5% 仍在放送（每周一集的放送日程）
+- 回放：--dataset 指向 notebook 导出的原始 CSV（如 anilist_anime_2016_2025.csv），按行还原为 media
+
+模拟：
+- latency_ms：每个请求的延迟（±50% 均匀抖动）
+- rate_limit：60 秒滑动窗口内的请求数上限，超出返回 429 + Retry-After；每个响应带 X-RateLimit-* 头
+- error_rate：按概率返回 500 / 502 / 503
+- GET /stats：累计的请求数、返回的页数、429 / 5xx 次数
+
+命令行（在仓库根目录执行）：
+    PYTHONPATH=src python -m bench.fake_anilist --port 8765 --rate-limit 90 --latency-ms 120 --error-rate 0.02
+    PYTHONPATH=src python -m ingest.fetch --endpoint http://127.0.0.1:8765/ --cache off
+"""
+import argparse
+import asyncio
+import collections
+import json
+import math
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from aiohttp import web
+from ingest.queries import SEASONS
+
+GENRES = ["Action", "Adventure", "Comedy", "Drama", "Ecchi", "Fantasy", "Horror", "Mahou Shoujo", "Mecha", "Music",
+          "Mystery", "Psychological", "Romance", "Sci-Fi", "Slice of Life", "Sports", "Supernatural", "Thriller"]
+TAGS = ["Male Protagonist", "Female Protagonist", "Isekai", "School", "Magic", "Shounen", "Seinen", "Iyashikei",
+        "Time Skip", "Ensemble Cast", "Idol", "Military", "Super Power", "Urban Fantasy", "Found Family",
+        "Primarily Teen Cast", "Coming of Age", "Work", "Revenge", "Reincarnation", "CGI", "Full CGI", "Cute Girls",
+        "Boys' Love", "Yuri", "Survival", "Tragedy", "Detective", "Politics", "Kuudere"]
+STUDIOS = ["MAPPA", "A-1 Pictures", "Madhouse", "J.C.Staff", "Bones", "Kyoto Animation", "Production I.G",
+           "Toei Animation", "Studio Deen", "CloverWorks", "Wit Studio", "TMS Entertainment", "Silver Link.",
+           "Lerche", "Doga Kobo", "Shaft", "OLM", "Bandai Namco Pictures", "SynergySP", "Studio Gokumi"]
+FORMATS = ["TV", "TV", "TV", "TV_SHORT", "MOVIE", "OVA", "ONA", "SPECIAL"]
+SOURCES = ["MANGA", "LIGHT_NOVEL", "ORIGINAL", "VIDEO_GAME", "WEB_NOVEL", "NOVEL", "OTHER"]
+SITES = ["Official Site", "Twitter", "Crunchyroll", "Netflix", "Hulu", "HIDIVE", "YouTube"]
+ERROR_STATUS = [500, 502, 503]
+WEEK = 7 * 24 * 3600
+
+
+def _date(value: str) -> dict:
+    parts = (str(value).split("-") + ["", "", ""])[:3] if isinstance(value, str) else ["", "", ""]
+    return {k: int(p) if p.isdigit() else None for k, p in zip(["year", "month", "day"], parts)}
+
+
+def _value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+def media_from_row(row: dict) -> dict:
+    """原始 CSV 的一行（ingest.normalize.normalize_media_rows 的输出）还原为 GraphQL 的 media 对象"""
+    def split(value):
+        return value.split("|") if isinstance(value, str) and value else []
+
+    def loads(value):
+        return json.loads(value) if isinstance(value, str) and value else []
+
+    studio = _value(row.get("mainStudio"))
+    return {
+        "id": int(row["id"]),
+        "idMal": _value(row.get("idMal")),
+        "title": {"romaji": _value(row.get("title_romaji")), "english": _value(row.get("title_english")),
+                  "native": _value(row.get("title_native")), "userPreferred": _value(row.get("title_romaji"))},
+        "season": _value(row.get("season")),
+        "seasonYear": _value(row.get("seasonYear")),
+        "startDate": _date(row.get("startDate")),
+        "endDate": _date(row.get("endDate")),
+        **{k: _value(row.get(k)) for k in ["episodes", "duration", "format", "status", "source", "averageScore",
+                                           "meanScore", "popularity", "favourites", "trending"]},
+        "countryOfOrigin": "JP",
+        "genres": split(row.get("genres")),
+        "tags": [{"name": name, "rank": 80, "category": "Theme", "isGeneralSpoiler": False, "isMediaSpoiler": False}
+                 for name in split(row.get("tags"))],
+        "studios": {"edges": [{"isMain": True}] if studio else [],
+                    "nodes": [{"id": 1, "name": studio, "isAnimationStudio": True}] if studio else []},
+        "rankings": loads(row.get("rankings_json")),
+        "externalLinks": loads(row.get("externalLinks_json")),
+        "trailer": None,
+        "coverImage": {"large": f"https://img.example/{int(row['id'])}.jpg", "medium": None},
+    }
+
+
+def synthetic_media(year_start: int, year_end: int, items_per_season: int = 110, seed: int = 0) -> List[dict]:
+    """合成的作品列表（同一 seed 结果相同）"""
+    rng = random.Random(seed)
+    media = []
+    next_id = 100000
+    for year in range(year_start, year_end + 1):
+        for season in SEASONS:
+            for _ in range(max(1, int(items_per_season * rng.uniform(0.7, 1.3)))):
+                next_id += rng.randint(1, 5)
+                month = SEASONS.index(season) * 3 + 1
+                status = "RELEASING" if rng.random() < 0.05 else "FINISHED"
+                popularity = int(rng.paretovariate(1.2) * 2000)
+                media.append({
+                    "id": next_id,
+                    "idMal": next_id - 60000 if rng.random() < 0.9 else None,
+                    "title": {"romaji": f"Sakuhin {next_id}", "english": f"Title {next_id}" if rng.random() < 0.6 else None,
+                              "native": f"作品{next_id}", "userPreferred": f"Sakuhin {next_id}"},
+                    "season": season,
+                    "seasonYear": year,
+                    "startDate": {"year": year, "month": month, "day": rng.randint(1, 28)},
+                    "endDate": {"year": None, "month": None, "day": None} if status == "RELEASING"
+                    else {"year": year, "month": month + 2, "day": rng.randint(1, 28)},
+                    "episodes": rng.choice([1, 12, 12, 13, 24, 25, None]),
+                    "duration": rng.choice([5, 24, 24, 24, 100]),
+                    "format": rng.choice(FORMATS),
+                    "status": status,
+                    "source": rng.choice(SOURCES),
+                    "countryOfOrigin": "JP" if rng.random() < 0.85 else rng.choice(["CN", "KR"]),
+                    "averageScore": rng.randint(45, 88) if rng.random() < 0.8 else None,
+                    "meanScore": rng.randint(45, 88),
+                    "popularity": popularity,
+                    "favourites": popularity // rng.randint(20, 200),
+                    "trending": rng.randint(0, 50),
+                    "genres": rng.sample(GENRES, rng.randint(1, 5)),
+                    "tags": [{"name": name, "rank": rng.randint(20, 100), "category": "Theme",
+                              "isGeneralSpoiler": False, "isMediaSpoiler": False}
+                             for name in rng.sample(TAGS, rng.randint(3, 15))],
+                    "studios": {"edges": [{"isMain": True}],
+                                "nodes": [{"id": 1, "name": rng.choice(STUDIOS), "isAnimationStudio": True}]},
+                    "rankings": [{"rank": rng.randint(1, 500), "type": rng.choice(["RATED", "POPULAR"]),
+                                  "year": year, "season": season, "allTime": False, "context": "most popular"}
+                                 for _ in range(rng.randint(0, 6))],
+                    "externalLinks": [{"site": site, "url": f"https://{site.lower().replace(' ', '')}.example/{next_id}"}
+                                      for site in rng.sample(SITES, rng.randint(1, 5))],
+                    "trailer": None,
+                    "coverImage": {"large": f"https://img.example/{next_id}.jpg", "medium": None},
+                })
+    return media
+
+
+class FakeAniList:
+    """
+    :param media: 全部作品（media 对象）
+    :param rate_limit: 每分钟请求数上限，None 表示不限
+    :param max_aliases: 别名批量查询的复杂度上限（超过时返回错误，与 AniList 的 query complexity 限制对应）
+    :param airing_now: 放送日程的基准时间（Unix 秒），仍在放送的作品从该时间起每周一集
+    """
+
+    def __init__(self, media: List[dict], latency_ms: float = 80.0, rate_limit: Optional[int] = 90,
+                 error_rate: float = 0.0, max_aliases: int = 8, last_page_hint: bool = True,
+                 airing_now: Optional[int] = None, seed: int = 0):
+        self.latency = latency_ms / 1000
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.max_aliases = max_aliases
+        self.last_page_hint = last_page_hint
+        self.rng = random.Random(seed)
+        self.by_id = {m["id"]: m for m in media}
+        self.by_season: Dict[Tuple[int, str], List[dict]] = collections.defaultdict(list)
+        for m in media:
+            self.by_season[(m["seasonYear"], m["season"])].append(m)
+        for items in self.by_season.values():
+            items.sort(key=lambda m: -(m["popularity"] or 0))
+        now = int(time.time()) if airing_now is None else airing_now
+        releasing = [m for m in media if m["status"] in ("RELEASING", "NOT_YET_RELEASED")]
+        self.schedules = sorted(
+            ({"id": m["id"] * 100 + episode, "airingAt": now + (m["id"] % WEEK) + (episode - 1) * WEEK,
+              "episode": episode, "timeUntilAiring": (m["id"] % WEEK) + (episode - 1) * WEEK, "media": m}
+             for m in releasing for episode in range(1, 14)),
+            key=lambda s: s["airingAt"])
+        self.window = collections.deque()
+        self.stats = {"requests": 0, "pages": 0, "items": 0, "throttled": 0, "errors": 0, "too_complex": 0}
+
+    def _page(self, items: List[dict], page: int, per_page: int, key: str) -> dict:
+        page = max(1, page or 1)
+        last = max(1, math.ceil(len(items) / per_page))
+        chunk = items[(page - 1) * per_page:page * per_page]
+        self.stats["pages"] += 1
+        self.stats["items"] += len(chunk)
+        return {"pageInfo": {"total": len(items), "perPage": per_page, "currentPage": page,
+                             "lastPage": last if self.last_page_hint else None, "hasNextPage": page < last},
+                key: chunk}
+
+    def _season(self, year: int, season: str, country: Optional[str], sort: Optional[List[str]] = None) -> List[dict]:
+        # 默认热度降序（与 MEDIA_QUERY 的默认 $sort 相同），sort 为 ["ID"] 时按 id 升序
+        items = self.by_season.get((year, season), [])
+        if sort == ["ID"]:
+            items = sorted(items, key=lambda m: m["id"])
+        return [m for m in items if m["countryOfOrigin"] == country] if country else items
+
+    def _rate_headers(self) -> dict:
+        if self.rate_limit is None:
+            return {}
+        return {"X-RateLimit-Limit": str(self.rate_limit),
+                "X-RateLimit-Remaining": str(max(0, self.rate_limit - len(self.window)))}
+
+    def answer(self, query: str, v: dict):
+        """返回 (HTTP 状态码, 响应体)"""
+        per_page = v.get("perPage") or 50
+        if query.startswith("query MediaBatch"):
+            n = sum(1 for key in v if key[:1] == "p" and key[1:].isdigit())
+            if n > self.max_aliases:
+                self.stats["too_complex"] += 1
+                return 400, {"errors": [{"message": f"Max query complexity exceeded ({n} > {self.max_aliases} pages)",
+                                         "status": 400}], "data": None}
+            return 200, {"data": {f"s{i}": self._page(self._season(v[f"y{i}"], v[f"s{i}"], v.get("country")),
+                                                      v[f"p{i}"], per_page, "media") for i in range(n)}}
+        if "airingSchedules" in query:
+            items = [s for s in self.schedules if v.get("from", 0) < s["airingAt"] < v.get("to", 2 ** 31)]
+            return 200, {"data": {"Page": self._page(items, v.get("page"), per_page, "airingSchedules")}}
+        if "ids" in v:
+            items = [self.by_id[i] for i in v["ids"] or [] if i in self.by_id]
+            return 200, {"data": {"Page": self._page(items, v.get("page"), per_page, "media")}}
+        items = self._season(v.get("seasonYear"), v.get("season"), v.get("country"), v.get("sort"))
+        return 200, {"data": {"Page": self._page(items, v.get("page"), per_page, "media")}}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        now = time.monotonic()
+        while self.window and now - self.window[0] >= 60:
+            self.window.popleft()
+        if self.rate_limit is not None and len(self.window) >= self.rate_limit:
+            self.stats["throttled"] += 1
+            retry_after = max(1, math.ceil(60 - (now - self.window[0])))
+            return web.json_response({"errors": [{"message": "Too Many Requests.", "status": 429}], "data": None},
+                                     status=429, headers={**self._rate_headers(), "Retry-After": str(retry_after),
+                                                          "X-RateLimit-Reset": str(int(time.time()) + retry_after)})
+        self.window.append(now)
+        await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+        if self.rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=self.rng.choice(ERROR_STATUS), text="upstream error")
+        body = await request.json()
+        status, payload = self.answer(body.get("query", ""), body.get("variables") or {})
+        return web.json_response(payload, status=status, headers=self._rate_headers())
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/", self.handle)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+
+def build_fake(args) -> FakeAniList:
+    if args.dataset:
+        df = pd.read_csv(args.dataset)
+        media = [media_from_row(row) for row in df.to_dict("records") if isinstance(row.get("season"), str)]
+    else:
+        media = synthetic_media(args.start_year, args.end_year, args.items_per_season, args.seed)
+    return FakeAniList(media, args.latency_ms, args.rate_limit or None, args.error_rate, args.max_aliases,
+                       not args.no_last_page, seed=args.seed)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """服务器参数（ingest_throughput 复用）"""
+    parser.add_argument("--dataset", default=None, help="raw CSV to replay (default: synthetic media)")
+    parser.add_argument("--start-year", type=int, default=2016)
+    parser.add_argument("--end-year", type=int, default=2025)
+    parser.add_argument("--items-per-season", type=int, default=110)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--rate-limit", type=int, default=90, help="requests per 60s window (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 500/502/503 response")
+    parser.add_argument("--max-aliases", type=int, default=8, help="aliased pages per query before a complexity error")
+    parser.add_argument("--no-last-page", action="store_true", help="omit pageInfo.lastPage")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local AniList GraphQL stand-in for offline ingest benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    fake = build_fake(args)
+    print(f"fake AniList on http://{args.host}:{args.port}/ ({len(fake.by_id)} media, "
+          f"{len(fake.by_season)} seasons, rate limit {args.rate_limit or 'off'}/min)", flush=True)
+    web.run_app(fake.app(), host=args.host, port=args.port, print=None)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+# bench/import_time.py
+"""
+启动耗时基准：用 `python -X importtime` 测量 src/app.py 与每个页面的 import 开销，并与预算对比。
+
+用法（在仓库根目录执行）：
+    python src/bench/import_time.py            # 测量并检查预算，超出时返回码为 1
+    python src/bench/import_time.py --update   # 以当前测量值（乘以余量系数）重写预算文件
+    python src/bench/import_time.py --top 10   # 额外打印每个目标最慢的 10 个模块
+
+只执行脚本顶层的 import 语句（通过 ast 提取），不会运行页面里的 Streamlit 渲染代码。
+"""
+import argparse
+import ast
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+BUDGET_PATH = Path(__file__).resolve().with_name("import_budget.json")
+
+# 预算重写时在实测值上预留的余量（不同机器、磁盘缓存状态下会有波动）
+HEADROOM = 1.5
+
+
+def list_targets():
+    """返回需要测量的脚本（相对 src 的路径）：入口 app.py + 所有页面"""
+    targets = ["app.py"]
+    targets += sorted(str(p.relative_to(SRC_DIR)) for p in (SRC_DIR / "pages").glob("*.py"))
+    return targets
+
+
+def extract_imports(script_path: Path) -> str:
+    """提取脚本顶层的 import / from-import 语句，拼成可独立执行的代码"""
+    tree = ast.parse(script_path.read_text(encoding="utf-8"))
+    lines = [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return "\n".join(lines) or "pass"
+
+
+def parse_importtime(stderr: str):
+    """
+    解析 -X importtime 输出，返回 (顶层累计耗时 ms, {模块: 自身耗时 ms})。
+
+    输出格式：`import time: self [us] | cumulative | imported package`，
+    包名前的缩进表示嵌套层级，只累加缩进为 0 的条目即可得到总耗时。
+    """
+    total_us = 0
+    self_us = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_col, cumulative_col, raw_name = line.split(":", 1)[1].split("|", 2)
+        module = raw_name.strip()
+        self_us[module] = self_us.get(module, 0) + int(self_col)
+        # 顶层条目的包名前只有一个空格，嵌套条目为 " " + 两个空格 × 层级
+        if not raw_name.startswith("  "):
+            total_us += int(cumulative_col)
+    return total_us / 1000, {k: v / 1000 for k, v in self_us.items()}
+
+
+def measure(target: str, repeat: int = 3):
+    """在全新解释器中测量一个目标的 import 耗时，取多次运行的中位数"""
+    code = extract_imports(SRC_DIR / target)
+    totals, modules = [], {}
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=SRC_DIR,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"{target} 的 import 执行失败：\n{proc.stderr[-2000:]}")
+        total_ms, modules = parse_importtime(proc.stderr)
+        totals.append(total_ms)
+    return statistics.median(totals), modules
+
+
+def load_budget():
+    if not BUDGET_PATH.exists():
+        return {}
+    return json.loads(BUDGET_PATH.read_text(encoding="utf-8"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time budget check for the Streamlit app")
+    parser.add_argument("--update", action="store_true", help="rewrite the budget file from this run")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per target (median is used)")
+    parser.add_argument("--top", type=int, default=0, help="print the N slowest modules per target")
+    args = parser.parse_args(argv)
+
+    budget = load_budget()
+    results = {}
+    failed = []
+    for target in list_targets():
+        total_ms, modules = measure(target, repeat=args.repeat)
+        results[target] = total_ms
+        limit = budget.get(target)
+        status = "no budget" if limit is None else ("OK" if total_ms <= limit else "OVER")
+        if status == "OVER":
+            failed.append(target)
+        limit_text = "-" if limit is None else f"{limit:.0f}"
+        print(f"{target:<32} {total_ms:8.1f} ms   budget {limit_text:>6} ms   {status}")
+        if args.top:
+            for name, ms in sorted(modules.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+                print(f"    {ms:8.1f} ms  {name}")
+
+    if args.update:
+        new_budget = {t: round(ms * HEADROOM) for t, ms in results.items()}
+        BUDGET_PATH.write_text(json.dumps(new_budget, indent=2) + "\n", encoding="utf-8")
+        print(f"预算已更新：{BUDGET_PATH}")
+        return 0
+
+    if failed:
+        print(f"超出 import 预算：{', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
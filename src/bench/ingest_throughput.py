@@ -0,0 +1,190 @@
+# bench/ingest_throughput.py
+"""
+抓取吞吐基准：在子进程中启动 bench.fake_anilist，再为每个场景各开一个全新的子进程跑
+fetch → normalize → write 全流程（不使用响应缓存），记录：
+
+- 耗时、pages/s（替身服务器实际返回的 Page 数，别名批量中每个别名算一页）、rows/s
+- 请求数、重试、429 次数（客户端统计）
+- 内存：tracemalloc 峰值（Python 分配）与进程 RSS 峰值相对流程开始前的增量（Linux / macOS）
+
+场景：
+    rows            每个季度单独分页（--batch 1），全部行在内存中拼成 DataFrame → CSV
+    rows-batched    别名批量（默认批大小），同上
+    stream-batched  别名批量，逐页写 Parquet 分块 → compact
+    airing          放送日程窗口（4 周）
+
+用法（在仓库根目录执行）：
+    PYTHONPATH=src python -m bench.ingest_throughput                        # 默认：每分钟 600 次、80ms 延迟
+    PYTHONPATH=src python -m bench.ingest_throughput --rate-limit 90 --error-rate 0.05 --scenarios rows rows-batched
+    PYTHONPATH=src python -m bench.ingest_throughput --dataset DataAnalysisPart/animation_data/anilist_anime_2016_2025.csv
+    PYTHONPATH=src python -m bench.ingest_throughput --json .cache/bench/ingest.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from pathlib import Path
+
+from bench.fake_anilist import add_arguments
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+SCENARIOS = ["rows", "rows-batched", "stream-batched", "airing"]
+AIRING_WINDOW_DAYS = 28
+
+
+def _max_rss_mb() -> float:
+    if resource is None:
+        return float("nan")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 为 KB，macOS 为字节
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def _server_stats(endpoint: str) -> dict:
+    with urllib.request.urlopen(endpoint + "stats", timeout=5) as resp:
+        return json.load(resp)
+
+
+def run_scenario(scenario: str, endpoint: str, year_start: int, year_end: int, rate: float, out_dir: str) -> dict:
+    """在当前进程中跑一个场景（由子进程调用）"""
+    from ingest.client import MEDIA_BATCH, AniListClient
+    from ingest.fetch import fetch_training_rows, fetch_training_stream, unix_ts
+    from ingest.normalize import normalize_airing_rows
+    from ingest.rate_limit import TokenBucket
+
+    async def airing():
+        async with AniListClient(endpoint, TokenBucket(rate)) as client:
+            start = unix_ts(time.strftime("%Y-%m-%d"))
+            rows = normalize_airing_rows(await client.fetch_airing_window(start, start + AIRING_WINDOW_DAYS * 86400))
+        return len(rows), dict(client.stats, waited=client.bucket.waited)
+
+    before = _server_stats(endpoint)
+    rss_before = _max_rss_mb()
+    tracemalloc.start()
+    start = time.perf_counter()
+    if scenario in ("rows", "rows-batched"):
+        batch = 1 if scenario == "rows" else MEDIA_BATCH
+        df, stats = asyncio.run(fetch_training_rows(year_start, year_end, endpoint, rate_per_minute=rate, batch=batch))
+        df.to_csv(os.path.join(out_dir, f"{scenario}.csv"), index=False, encoding="utf-8-sig")
+        n_rows = len(df)
+    elif scenario == "stream-batched":
+        n_rows, stats = asyncio.run(fetch_training_stream(year_start, year_end, os.path.join(out_dir, "stream.parquet"),
+                                                          endpoint, rate_per_minute=rate, country="JP",
+                                                          chunk_dir=os.path.join(out_dir, "chunks")))
+    elif scenario == "airing":
+        n_rows, stats = asyncio.run(airing())
+    else:
+        raise ValueError(f"未知场景：{scenario}")
+    seconds = time.perf_counter() - start
+    peak_alloc = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    after = _server_stats(endpoint)
+    pages = after["pages"] - before["pages"]
+    return {
+        "scenario": scenario, "seconds": round(seconds, 3), "rows": int(n_rows), "pages": pages,
+        "pages_per_s": round(pages / seconds, 2), "rows_per_s": round(n_rows / seconds, 1),
+        "requests": stats["requests"], "retries": stats["retries"], "throttled": stats["throttled"],
+        "waited_s": round(stats["waited"], 2), "peak_alloc_mb": round(peak_alloc / 1e6, 1),
+        "rss_delta_mb": round(_max_rss_mb() - rss_before, 1),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _env() -> dict:
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(SRC_DIR), os.environ.get("PYTHONPATH")])))
+
+
+def start_server(args) -> tuple:
+    """子进程中启动替身服务器，返回 (Popen, endpoint)；等到 /stats 可访问为止"""
+    port = _free_port()
+    cmd = [sys.executable, "-m", "bench.fake_anilist", "--port", str(port),
+           "--start-year", str(args.start_year), "--end-year", str(args.end_year),
+           "--items-per-season", str(args.items_per_season), "--latency-ms", str(args.latency_ms),
+           "--rate-limit", str(args.rate_limit), "--error-rate", str(args.error_rate),
+           "--max-aliases", str(args.max_aliases), "--seed", str(args.seed)]
+    if args.dataset:
+        cmd += ["--dataset", args.dataset]
+    if args.no_last_page:
+        cmd.append("--no-last-page")
+    proc = subprocess.Popen(cmd, env=_env(), stdout=subprocess.DEVNULL)
+    endpoint = f"http://127.0.0.1:{port}/"
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            _server_stats(endpoint)
+            return proc, endpoint
+        except OSError:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                proc.kill()
+                raise RuntimeError("替身服务器启动失败")
+            time.sleep(0.2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline ingest throughput benchmark against a fake AniList server")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--json", default=None, help="also write the results to this JSON file")
+    parser.add_argument("--run-one", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--endpoint", default=None, help=argparse.SUPPRESS)
+    add_arguments(parser)
+    parser.set_defaults(rate_limit=600)
+    args = parser.parse_args(argv)
+    # 客户端令牌桶的初始速率与服务端限额一致（之后由 X-RateLimit-Limit 校正）
+    rate = args.rate_limit or 6000
+
+    if args.run_one:
+        with tempfile.TemporaryDirectory() as out_dir:
+            result = run_scenario(args.run_one, args.endpoint, args.start_year, args.end_year, rate, out_dir)
+        print(json.dumps(result))
+        return 0
+
+    proc, endpoint = start_server(args)
+    results = []
+    try:
+        for scenario in args.scenarios:
+            child = subprocess.run(
+                [sys.executable, "-m", "bench.ingest_throughput", "--run-one", scenario, "--endpoint", endpoint,
+                 "--start-year", str(args.start_year), "--end-year", str(args.end_year),
+                 "--rate-limit", str(args.rate_limit)],
+                env=_env(), capture_output=True, text=True,
+            )
+            if child.returncode != 0:
+                raise RuntimeError(f"场景 {scenario} 失败：\n{child.stderr[-2000:]}")
+            results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+            r = results[-1]
+            print(f"{scenario:<15} {r['seconds']:>7.2f}s  {r['pages_per_s']:>7.1f} pages/s  {r['rows']:>6} rows  "
+                  f"requests {r['requests']:>4}  retries {r['retries']:>3}  429 {r['throttled']:>3}  "
+                  f"alloc {r['peak_alloc_mb']:>6.1f}MB  rss +{r['rss_delta_mb']:.1f}MB", flush=True)
+        server = _server_stats(endpoint)
+    finally:
+        proc.terminate()
+        proc.wait()
+    print(f"服务器：{server['requests']} 个请求，{server['pages']} 页，429 {server['throttled']} 次，"
+          f"5xx {server['errors']} 次，复杂度超限 {server['too_complex']} 次")
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k not in ("run_one", "endpoint", "json")},
+                       "results": results, "server": server}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
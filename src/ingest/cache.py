@@ -0,0 +1,170 @@
+# ingest/cache.py
+"""
+AniList 响应的磁盘缓存：按 (endpoint, query, variables) 的哈希内容寻址，gzip 压缩存储。
+
+- 每种查询有自己的有效期（QUERY_TTL）：季度分页 6 天（短于每周一次的增量同步，
+  使同步总能拿到新数据），按 id 刷新 12 小时，放送日程 1 小时
+- 总大小超过 max_bytes 时按最近使用时间（mtime）做 LRU 淘汰
+- 模式：
+    use      先查缓存，过期或未命中时请求并写入（默认）
+    refresh  总是请求，写入缓存（强制更新）
+    offline  只读缓存，忽略有效期；未命中抛出 CacheMiss，不发出任何网络请求（可复现的重建 / 无网络开发）
+    off      不使用缓存
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Optional
+
+from ingest.queries import AIRING_QUERY, MEDIA_BY_ID_QUERY, MEDIA_QUERY
+
+CACHE_DIR = ".cache/ingest/responses"
+MAX_BYTES = 256 * 1024 * 1024
+CACHE_MODES = ("use", "refresh", "offline", "off")
+# 缓存格式版本：存储格式变化时递增，使旧文件自然失效
+CACHE_FORMAT = 1
+# 各类查询的有效期（秒）
+QUERY_TTL = {
+    "media": 6 * 24 * 3600,
+    "media_by_id": 12 * 3600,
+    "airing": 3600,
+    "other": 3600,
+}
+_QUERY_TYPES = {MEDIA_QUERY: "media", MEDIA_BY_ID_QUERY: "media_by_id", AIRING_QUERY: "airing"}
+
+
+class CacheMiss(LookupError):
+    """offline 模式下缓存中没有（可用的）响应"""
+
+
+def query_type(query: str) -> str:
+    return _QUERY_TYPES.get(query, "other")
+
+
+def cache_key(endpoint: str, query: str, variables: dict) -> str:
+    """内容寻址键：查询文本（空白归一化）+ 变量（键排序）+ endpoint 的 sha256 前 24 位"""
+    payload = {
+        "format": CACHE_FORMAT,
+        "endpoint": endpoint,
+        "query": re.sub(r"\s+", " ", query).strip(),
+        "variables": variables,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+
+
+class ResponseCache:
+    """
+    用法：
+        cache = ResponseCache(mode="offline")
+        async with AniListClient(cache=cache) as client: ...
+
+    :param ttl: 覆盖 QUERY_TTL 中的部分有效期，如 {"media": 0}
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, mode: str = "use", max_bytes: int = MAX_BYTES,
+                 ttl: Optional[dict] = None, clock=time.time):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"mode 只能是 {CACHE_MODES} 之一")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.ttl = dict(QUERY_TTL, **(ttl or {}))
+        self.clock = clock
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+        # 缓存目录的总大小，第一次写入时扫描一次，之后增量维护
+        self._size: Optional[int] = None
+
+    @property
+    def offline(self) -> bool:
+        return self.mode == "offline"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def get(self, endpoint: str, query: str, variables: dict) -> Optional[dict]:
+        """命中且未过期（offline 模式不看有效期）时返回 data，否则返回 None；offline 未命中抛出 CacheMiss"""
+        if self.mode in ("off", "refresh"):
+            return None
+        key = cache_key(endpoint, query, variables)
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rb") as f:
+                entry = json.loads(f.read().decode("utf-8"))
+        except (FileNotFoundError, OSError, EOFError, ValueError):
+            entry = None
+        if entry is not None and (self.offline or
+                                  self.clock() - entry["stored_at"] <= self.ttl[entry["query_type"]]):
+            self.stats["hits"] += 1
+            # 命中时刷新 mtime，作为 LRU 的“最近使用”时间
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            return entry["data"]
+        self.stats["misses"] += 1
+        if self.offline:
+            raise CacheMiss(f"离线模式下缓存未命中：{query_type(query)} {json.dumps(variables, sort_keys=True)}")
+        return None
+
+    def put(self, endpoint: str, query: str, variables: dict, data: dict):
+        if self.mode in ("off", "offline"):
+            return
+        key = cache_key(endpoint, query, variables)
+        path = self._path(key)
+        entry = {"stored_at": self.clock(), "query_type": query_type(query), "variables": variables, "data": data}
+        blob = gzip.compress(json.dumps(entry, ensure_ascii=False).encode("utf-8"), compresslevel=6)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        try:
+            self._size -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        # 先写临时文件再替换，避免并发读到半个文件
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+        self._size += len(blob)
+        self.stats["stored"] += 1
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _entries(self):
+        """[(mtime, size, path)]"""
+        entries = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".json.gz"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        """按 mtime 淘汰最久未使用的响应，直到总大小降到 max_bytes 的 90%（避免每次写入都扫描目录）"""
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._size -= size
+            self.stats["evicted"] += 1
+
+
+def open_cache(mode: str = "use", cache_dir: str = CACHE_DIR) -> Optional[ResponseCache]:
+    """命令行 / 同步入口用：mode 为 'off' 时返回 None"""
+    if mode not in CACHE_MODES:
+        raise ValueError(f"mode 只能是 {CACHE_MODES} 之一")
+    return None if mode == "off" else ResponseCache(cache_dir, mode)
@@ -0,0 +1,316 @@
+# ingest/client.py
+"""
+AniList 异步客户端（aiohttp）：一个会话、一个令牌桶，多个季度 / 分页并发抓取。
+
+与 notebook 中逐页 time.sleep(0.4) 的串行抓取不同：
+- 请求速率只受令牌桶（服务端限额）约束，max_concurrency 控制同时在途的请求数
+- 一个季度的分页：第一页拿到 lastPage 后其余页并发请求；没有 lastPage 时逐页请求
+  （推测页码会在空页上浪费限额，并发由多个季度同时抓取提供）
+- 多个季度并发，共享同一个限速器
+- fetch_seasons_batched：用 GraphQL 别名把多个季度的页合并进一次请求，批大小遇到查询复杂度超限时减半
+  （并以失败的大小减一为上限）、成功一轮后加一，往返次数（限速下即耗时）按批大小成倍下降
+- 429 按 Retry-After 暂停整个桶；5xx / 连接错误按带抖动的指数退避重试；GraphQL 错误直接抛出
+- 可选的响应缓存（ingest.cache.ResponseCache）：命中时不占用限额；offline 模式下不发出网络请求
+
+用法：
+    async with AniListClient() as client:
+        media = await client.fetch_seasons([(2025, "FALL"), (2025, "SUMMER")])
+
+endpoint 可指向本地的桩服务器（与 AniList 相同的 GraphQL 请求 / 响应格式）做测试。
+"""
+import asyncio
+import random
+import re
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+from ingest.cache import ResponseCache
+from ingest.queries import (AIRING_QUERY, ANILIST_ENDPOINT, MEDIA_BY_ID_QUERY, MEDIA_QUERY, SEASONS,
+                            batched_media_query)
+from ingest.rate_limit import TokenBucket, backoff_delay, retry_after_seconds
+
+PER_PAGE = 50
+MAX_CONCURRENCY = 4
+MAX_RETRIES = 6
+TIMEOUT_SECONDS = 30
+# 别名批量查询：初始 / 最大的每次请求页数
+MEDIA_BATCH = 6
+MAX_MEDIA_BATCH = 12
+# 服务端错误与网关问题：退避后重试
+RETRY_STATUS = {500, 502, 503, 504}
+
+
+class AniListError(RuntimeError):
+    """AniList 返回 GraphQL 错误、非重试类的 HTTP 错误，或重试次数用尽"""
+
+    def __init__(self, message: str, status: Optional[int] = None, errors=None):
+        super().__init__(message)
+        self.status = status
+        self.errors = errors
+
+
+class QueryTooComplex(AniListError):
+    """查询复杂度超过服务端上限（减小别名批量的大小后重试）"""
+
+
+class AniListClient:
+    """
+    :param bucket: 令牌桶，默认按 AniList 的限额新建；多个客户端可以共享一个
+    :param max_concurrency: 同时在途的请求数上限
+    :param cache: 响应缓存，None 表示不缓存
+    """
+
+    def __init__(self, endpoint: str = ANILIST_ENDPOINT, bucket: Optional[TokenBucket] = None,
+                 max_concurrency: int = MAX_CONCURRENCY, max_retries: int = MAX_RETRIES,
+                 per_page: int = PER_PAGE, timeout: float = TIMEOUT_SECONDS, seed: Optional[int] = None,
+                 cache: Optional[ResponseCache] = None):
+        self.endpoint = endpoint
+        self.bucket = bucket or TokenBucket()
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.per_page = per_page
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.cache = cache
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "cached": 0}
+        self.media_batch = MEDIA_BATCH
+        # 复杂度超限过的最小批大小减一（同一客户端后续的批量请求不再超过它）
+        self.media_batch_ceiling = MAX_MEDIA_BATCH
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AniListClient":
+        self._session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"Content-Type": "application/json", "Accept": "application/json"},
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        self._session = None
+
+    async def query(self, query: str, variables: dict, use_cache: bool = True) -> dict:
+        """
+        执行一次 GraphQL 查询，返回 data 字段
+
+        :param use_cache: False 时不读写响应缓存（别名批量查询按页自行缓存）
+        """
+        if self._session is None:
+            raise RuntimeError("AniListClient 需要在 async with 中使用")
+        if use_cache and self.cache is not None:
+            data = self.cache.get(self.endpoint, query, variables)
+            if data is not None:
+                self.stats["cached"] += 1
+                return data
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+            await self.bucket.acquire()
+            try:
+                async with self._semaphore:
+                    self.stats["requests"] += 1
+                    async with self._session.post(self.endpoint, json={"query": query, "variables": variables}) as resp:
+                        self.bucket.observe(resp.headers)
+                        if resp.status == 429:
+                            # 限流：整个桶暂停，本次请求不额外退避
+                            self.stats["throttled"] += 1
+                            wait = retry_after_seconds(resp.headers)
+                            self.bucket.pause(backoff_delay(attempt, rng=self.rng) if wait is None
+                                              else wait + self.rng.uniform(0, 1))
+                            error = AniListError("rate limited", status=429)
+                            continue
+                        if resp.status in RETRY_STATUS:
+                            error = AniListError(f"HTTP {resp.status}", status=resp.status)
+                        else:
+                            payload = await resp.json(content_type=None)
+                            if resp.status != 200 or payload.get("errors"):
+                                error_type = (QueryTooComplex if re.search("complexity", str(payload.get("errors")), re.I)
+                                              else AniListError)
+                                raise error_type(f"HTTP {resp.status}: {payload.get('errors')}",
+                                                   status=resp.status, errors=payload.get("errors"))
+                            if use_cache and self.cache is not None:
+                                self.cache.put(self.endpoint, query, variables, payload["data"])
+                            return payload["data"]
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            await asyncio.sleep(backoff_delay(attempt, rng=self.rng))
+        raise AniListError(f"{self.max_retries} 次重试后仍失败：{error}") from error
+
+    async def fetch_pages(self, query: str, variables: dict, items_key: str, start_page: int = 1,
+                          on_page: Optional[Callable[[int, List[dict], bool], None]] = None,
+                          collect: bool = True) -> List[dict]:
+        """
+        抓取一个分页查询从 start_page 起的全部页，按页码顺序拼接 Page[items_key]。
+
+        start_page 之后：lastPage 给出时一次并发请求其余页（按页码顺序逐页交给 on_page），否则逐页请求；
+        遇到 hasNextPage 为 false（或空）的页为止，之后的页丢弃（lastPage 偏大时）。
+
+        :param on_page: 每页完成后按页码顺序调用 on_page(页码, items, 是否最后一页)（断点续传的检查点）
+        :param collect: False 时不保留各页的 items、返回空列表（由 on_page 流式处理，内存不随页数增长）
+        """
+        async def page(number):
+            data = await self.query(query, dict(variables, page=number, perPage=self.per_page))
+            return data["Page"]
+
+        def is_last(result):
+            return not result["pageInfo"]["hasNextPage"] or not result[items_key]
+
+        items = []
+
+        def accept(number, result):
+            if on_page is not None:
+                on_page(number, result[items_key], is_last(result))
+            if collect:
+                items.extend(result[items_key])
+
+        result = await page(start_page)
+        accept(start_page, result)
+        next_page = start_page + 1
+        while not is_last(result):
+            last_hint = result["pageInfo"].get("lastPage") or 0
+            window = last_hint - next_page + 1 if last_hint >= next_page else 1
+            tasks = [asyncio.ensure_future(page(n)) for n in range(next_page, next_page + window)]
+            try:
+                # 并发请求、按页码顺序等待：每一页在它之前的页都完成后立即交给 on_page，
+                # 某一页失败时，它之前已完成的页都已检查点
+                for number, task in enumerate(tasks, start=next_page):
+                    result = await task
+                    accept(number, result)
+                    if is_last(result):
+                        break
+            finally:
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+                    elif not task.cancelled():
+                        task.exception()  # 取走未等待页的异常，避免 "exception was never retrieved"
+            next_page += window
+        return items
+
+    async def fetch_season(self, year: int, season: str, start_page: int = 1, on_page=None,
+                           country: Optional[str] = "JP", collect: bool = True,
+                           sort: Optional[List[str]] = None) -> List[dict]:
+        """
+        某一年某个季度（WINTER / SPRING / SUMMER / FALL）的全部动画；其余参数含义同 fetch_pages
+
+        :param country: 国家 / 地区代码，None 表示不限（全部国家、全部格式）
+        :param sort: 分页顺序，如 ["ID"]；None 时为查询默认的热度降序（变量中不出现，缓存键与批量抓取一致）
+        """
+        variables = {"season": season, "seasonYear": year, "country": country}
+        if sort is not None:
+            variables["sort"] = list(sort)
+        return await self.fetch_pages(MEDIA_QUERY, variables, "media", start_page, on_page, collect)
+
+    async def fetch_seasons(self, seasons: Sequence[Tuple[int, str]],
+                            country: Optional[str] = "JP") -> Dict[Tuple[int, str], List[dict]]:
+        """多个季度并发抓取，返回 {(year, season): media}（顺序同 seasons）"""
+        results = await asyncio.gather(*(self.fetch_season(year, season, country=country) for year, season in seasons))
+        return dict(zip(seasons, results))
+
+    async def fetch_seasons_batched(self, seasons: Sequence[Tuple[int, str]], country: Optional[str] = "JP",
+                                    on_page=None, collect: bool = True) -> Dict[Tuple[int, str], List[dict]]:
+        """
+        与 fetch_seasons 结果相同，但一次请求带多个（季度, 页码）。
+
+        按轮进行：每轮把所有待抓的（季度, 页码）按当前批大小 self.media_batch 分组并发请求，
+        响应按别名拆回各季度；季度的下一页（lastPage 已知时为其余全部页）进入下一轮。
+        某一批复杂度超限时批大小减半、上限降为这一批的大小减一，并把这一批拆成两半重试；
+        一轮全部成功后批大小加一（不超过 self.media_batch_ceiling）。
+
+        响应缓存按（季度, 页码）存取，键与 fetch_season 的单页 MEDIA_QUERY 相同：分组前先查缓存，
+        批量响应按别名拆开逐页写回。缓存因此与分组方式、批大小无关，离线回放总能命中。
+
+        :param on_page: 每个季度的页按页码顺序调用 on_page((year, season), 页码, items, 是否最后一页)
+        :param collect: 同 fetch_pages
+        """
+        state = {key: {"pages": {}, "emitted": 0, "last": None, "requested": 1, "items": []} for key in seasons}
+        pending = deque((key, 1) for key in seasons)
+
+        def emit(key):
+            st = state[key]
+            while st["emitted"] + 1 in st["pages"] and (st["last"] is None or st["emitted"] < st["last"]):
+                number = st["emitted"] + 1
+                items = st["pages"].pop(number)
+                if on_page is not None:
+                    on_page(key, number, items, number == st["last"])
+                if collect:
+                    st["items"].extend(items)
+                st["emitted"] = number
+
+        def page_variables(key, number):
+            # 与 fetch_season → fetch_pages 的单页变量相同
+            year, season = key
+            return {"season": season, "seasonYear": year, "country": country, "page": number, "perPage": self.per_page}
+
+        def accept(key, number, result):
+            st = state[key]
+            if st["last"] is not None and number > st["last"]:
+                return
+            st["pages"][number] = result["media"]
+            if not result["pageInfo"]["hasNextPage"] or not result["media"]:
+                st["last"] = number if st["last"] is None else min(st["last"], number)
+            elif st["requested"] == number:
+                # lastPage 已知时其余页一次排进下一轮，否则只排下一页
+                last_hint = result["pageInfo"].get("lastPage") or 0
+                for n in range(number + 1, max(last_hint, number + 1) + 1):
+                    pending.append((key, n))
+                st["requested"] = max(last_hint, number + 1)
+            emit(key)
+
+        async def run_batch(cursors):
+            variables = {"perPage": self.per_page, "country": country}
+            for i, ((year, season), number) in enumerate(cursors):
+                variables.update({f"p{i}": number, f"s{i}": season, f"y{i}": year})
+            try:
+                data = await self.query(batched_media_query(len(cursors)), variables, use_cache=False)
+            except QueryTooComplex:
+                if len(cursors) == 1:
+                    raise
+                self.media_batch_ceiling = min(self.media_batch_ceiling, len(cursors) - 1)
+                self.media_batch = max(1, min(self.media_batch, len(cursors) // 2))
+                half = len(cursors) // 2
+                await asyncio.gather(run_batch(cursors[:half]), run_batch(cursors[half:]))
+                return
+            for i, (key, number) in enumerate(cursors):
+                if self.cache is not None:
+                    self.cache.put(self.endpoint, MEDIA_QUERY, page_variables(key, number), {"Page": data[f"s{i}"]})
+                accept(key, number, data[f"s{i}"])
+
+        while pending:
+            # 按（年份, 季度, 页码）排序，分组与各批完成的先后无关
+            cursors = sorted(pending, key=lambda c: (c[0][0], SEASONS.index(c[0][1]), c[1]))
+            pending.clear()
+            if self.cache is not None:
+                misses = []
+                for key, number in cursors:
+                    data = self.cache.get(self.endpoint, MEDIA_QUERY, page_variables(key, number))
+                    if data is None:
+                        misses.append((key, number))
+                    else:
+                        self.stats["cached"] += 1
+                        accept(key, number, data["Page"])
+                cursors = misses
+                if not cursors:
+                    continue
+            size = self.media_batch
+            await asyncio.gather(*(run_batch(cursors[i:i + size]) for i in range(0, len(cursors), size)))
+            if self.media_batch == size:
+                self.media_batch = min(self.media_batch_ceiling, size + 1)
+        return {key: state[key]["items"] for key in seasons}
+
+    async def fetch_media_by_ids(self, ids: Sequence[int]) -> List[dict]:
+        """按 id 批量抓取作品，每 per_page 个 id 一次请求（各批并发）；返回顺序不保证"""
+        ids = list(dict.fromkeys(int(i) for i in ids))
+        chunks = [ids[i:i + self.per_page] for i in range(0, len(ids), self.per_page)]
+        results = await asyncio.gather(*(self.fetch_pages(MEDIA_BY_ID_QUERY, {"ids": chunk}, "media")
+                                         for chunk in chunks))
+        return [item for batch in results for item in batch]
+
+    async def fetch_airing_window(self, from_ts: int, to_ts: int, not_yet: bool = True) -> List[dict]:
+        """时间窗口（Unix 秒）内的放送日程"""
+        variables = {"from": from_ts, "to": to_ts, "notYet": bool(not_yet)}
+        return await self.fetch_pages(AIRING_QUERY, variables, "airingSchedules")
@@ -0,0 +1,145 @@
+# ingest/fetch.py
+"""
+训练集抓取：2016–2025 年全部季度并发抓取，输出与 notebook 相同列的原始 CSV。
+
+命令行（在仓库根目录执行）：
+    PYTHONPATH=src python -m ingest.fetch --start-year 2016 --end-year 2025 --out anilist_anime_2016_2025.csv
+    PYTHONPATH=src python -m ingest.fetch --endpoint http://127.0.0.1:8765/   # 本地桩服务器
+    PYTHONPATH=src python -m ingest.fetch --cache offline                      # 只用缓存的响应重建（不联网）
+    PYTHONPATH=src python -m ingest.fetch --country ALL --stream --out anilist_anime_all.parquet
+                                          # 全部国家 / 格式，逐页写 Parquet 分块，内存不随行数增长
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import pandas as pd
+from ingest.cache import CACHE_DIR, CACHE_MODES, ResponseCache, open_cache
+from ingest.client import MAX_CONCURRENCY, MEDIA_BATCH, AniListClient
+from ingest.normalize import normalize_airing_rows, normalize_media_rows
+from ingest.queries import ANILIST_ENDPOINT, SEASONS
+from ingest.rate_limit import RATE_PER_MINUTE, TokenBucket
+from ingest.writer import CHUNK_DIR, CHUNK_ROWS, ChunkedWriter
+
+
+def unix_ts(date: str) -> int:
+    """'YYYY-MM-DD'（UTC）→ Unix 秒"""
+    return int(datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+
+
+async def fetch_training_rows(year_start: int, year_end: int, endpoint: str = ANILIST_ENDPOINT,
+                              max_concurrency: int = MAX_CONCURRENCY, rate_per_minute: float = RATE_PER_MINUTE,
+                              cache: Optional[ResponseCache] = None, country: Optional[str] = "JP",
+                              batch: int = MEDIA_BATCH):
+    """
+    :param country: 国家 / 地区代码，None 表示不限
+    :param batch: 每次请求合并的（季度, 页码）数的初始值（自适应调整），1 表示每个季度单独分页请求
+    :return: (DataFrame, stats)  行按 年份 → 季度 → 热度降序，按 id 去重（保留第一次出现）
+    """
+    seasons = [(year, season) for year in range(year_start, year_end + 1) for season in SEASONS]
+    async with AniListClient(endpoint, TokenBucket(rate_per_minute), max_concurrency, cache=cache) as client:
+        if batch > 1:
+            client.media_batch = batch
+            results = await client.fetch_seasons_batched(seasons, country)
+        else:
+            results = await client.fetch_seasons(seasons, country)
+    rows = [row for key in seasons for row in normalize_media_rows(results[key])]
+    df = pd.DataFrame(rows).drop_duplicates(subset=["id"])
+    return df.reset_index(drop=True), dict(client.stats, waited=client.bucket.waited, batch=client.media_batch if batch > 1 else 1)
+
+
+async def fetch_training_stream(year_start: int, year_end: int, out: str, endpoint: str = ANILIST_ENDPOINT,
+                                max_concurrency: int = MAX_CONCURRENCY, rate_per_minute: float = RATE_PER_MINUTE,
+                                cache: Optional[ResponseCache] = None, country: Optional[str] = None,
+                                chunk_rows: int = CHUNK_ROWS, chunk_dir: str = CHUNK_DIR, batch: int = MEDIA_BATCH):
+    """
+    流式版本：每页到达即写入 ChunkedWriter，结束后 compact 到 out（.parquet 或 CSV）。
+    行按到达顺序、按 id 去重（保留第一次到达的行）。
+
+    :return: (行数, stats)
+    """
+    seasons = [(year, season) for year in range(year_start, year_end + 1) for season in SEASONS]
+    writer = ChunkedWriter(os.path.join(chunk_dir, os.path.basename(out)), chunk_rows)
+    async with AniListClient(endpoint, TokenBucket(rate_per_minute), max_concurrency, cache=cache) as client:
+        if batch > 1:
+            client.media_batch = batch
+            await client.fetch_seasons_batched(seasons, country, collect=False,
+                                               on_page=lambda key, n, media, last: writer.write_page(media))
+        else:
+            await asyncio.gather(*(client.fetch_season(year, season, country=country, collect=False,
+                                                       on_page=lambda n, media, last: writer.write_page(media))
+                                   for year, season in seasons))
+    n_rows = writer.compact(out)
+    return n_rows, dict(client.stats, waited=client.bucket.waited, batch=client.media_batch if batch > 1 else 1, **writer.stats)
+
+
+def fetch_training_dataset(year_start: int = 2016, year_end: int = 2025, out: Optional[str] = None,
+                           endpoint: str = ANILIST_ENDPOINT, max_concurrency: int = MAX_CONCURRENCY,
+                           cache_mode: str = "use") -> pd.DataFrame:
+    """
+    同步入口（notebook 中可直接调用）；提供 out 时写出 CSV（utf-8-sig，与 notebook 相同）
+
+    :param cache_mode: 响应缓存模式（见 ingest.cache），'offline' 时只用缓存、不联网
+    """
+    df, _ = asyncio.run(fetch_training_rows(year_start, year_end, endpoint, max_concurrency,
+                                            cache=open_cache(cache_mode)))
+    if out:
+        df.to_csv(out, index=False, encoding="utf-8-sig")
+    return df
+
+
+def fetch_airing_window(start_date: str, end_date: str, not_yet: bool = True,
+                        endpoint: str = ANILIST_ENDPOINT, cache_mode: str = "use") -> pd.DataFrame:
+    """时间窗口内的放送日程（日期为 'YYYY-MM-DD'），列与 notebook 的 fetch_airing_window 相同"""
+    async def run():
+        async with AniListClient(endpoint, cache=open_cache(cache_mode)) as client:
+            return await client.fetch_airing_window(unix_ts(start_date), unix_ts(end_date), not_yet)
+    return pd.DataFrame(normalize_airing_rows(asyncio.run(run())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch AniList anime seasons concurrently under the rate limit")
+    parser.add_argument("--start-year", type=int, default=2016)
+    parser.add_argument("--end-year", type=int, default=2025)
+    parser.add_argument("--out", default=None, help="output CSV (default: anilist_anime_<start>_<end>.csv)")
+    parser.add_argument("--endpoint", default=ANILIST_ENDPOINT)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=RATE_PER_MINUTE,
+                        help="initial requests per minute (corrected by X-RateLimit-Limit)")
+    parser.add_argument("--cache", choices=CACHE_MODES, default="use",
+                        help="response cache: use / refresh / offline (replay only, no network) / off")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--country", default="JP", help="country of origin code, or ALL for every country")
+    parser.add_argument("--stream", action="store_true",
+                        help="write pages to Parquet chunks as they arrive and compact at the end (bounded memory); "
+                             "--out may end in .parquet or .csv")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--batch", type=int, default=MEDIA_BATCH,
+                        help="initial season pages per request via GraphQL aliases (adapts to complexity limits; 1 = off)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    country = None if args.country.upper() == "ALL" else args.country.upper()
+    cache = open_cache(args.cache, args.cache_dir)
+    out = args.out or f"anilist_anime_{args.start_year}_{args.end_year}.csv"
+    if args.stream:
+        n_rows, stats = asyncio.run(fetch_training_stream(args.start_year, args.end_year, out, args.endpoint,
+                                                          args.concurrency, args.rate, cache, country, args.chunk_rows,
+                                                          batch=args.batch))
+        print(f"已保存 {out}（{n_rows} 行，{stats['chunks']} 个分块，去掉重复 {stats['duplicates']} 行），"
+              f"耗时 {time.perf_counter() - start:.1f}s")
+    else:
+        df, stats = asyncio.run(fetch_training_rows(args.start_year, args.end_year, args.endpoint,
+                                                    args.concurrency, args.rate, cache, country, args.batch))
+        df.to_csv(out, index=False, encoding="utf-8-sig")
+        print(f"已保存 {out}（{len(df)} 行），耗时 {time.perf_counter() - start:.1f}s")
+    print(f"请求 {stats['requests']} 次（最终批大小 {stats['batch']}），缓存命中 {stats['cached']} 次，重试 {stats['retries']} 次，限流 {stats['throttled']} 次，"
+          f"限速等待 {stats['waited']:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+# ingest/normalize.py
+"""
+把 GraphQL 返回的 media / airingSchedules 摊平成表格行（列名与 notebook 导出的原始 CSV 一致）。
+"""
+import json
+from typing import List
+
+
+def _date(value) -> str:
+    return "-".join(str((value or {}).get(k) or "") for k in ["year", "month", "day"])
+
+
+def main_studio(media: dict):
+    """主工作室：edges 与 nodes 一一对应时取第一个 isMain 的节点，否则取第一个工作室"""
+    studios = media.get("studios") or {}
+    nodes = studios.get("nodes") or []
+    edges = studios.get("edges") or []
+    if nodes and edges and len(nodes) == len(edges):
+        for node, edge in zip(nodes, edges):
+            if edge.get("isMain"):
+                return node.get("name")
+    return nodes[0].get("name") if nodes else None
+
+
+def normalize_media_rows(media_list: List[dict]) -> List[dict]:
+    rows = []
+    for m in media_list:
+        title = m.get("title") or {}
+        rows.append({
+            "id": m.get("id"),
+            "idMal": m.get("idMal"),
+            "title_romaji": title.get("romaji"),
+            "title_english": title.get("english"),
+            "title_native": title.get("native"),
+            "season": m.get("season"),
+            "seasonYear": m.get("seasonYear"),
+            "startDate": _date(m.get("startDate")),
+            "endDate": _date(m.get("endDate")),
+            "episodes": m.get("episodes"),
+            "duration": m.get("duration"),
+            "format": m.get("format"),
+            "status": m.get("status"),
+            "source": m.get("source"),
+            "averageScore": m.get("averageScore"),
+            "meanScore": m.get("meanScore"),
+            "popularity": m.get("popularity"),
+            "favourites": m.get("favourites"),
+            "trending": m.get("trending"),
+            "genres": "|".join(m.get("genres") or []),
+            "tags": "|".join(t.get("name") for t in (m.get("tags") or [])),
+            "mainStudio": main_studio(m),
+            "rankings_json": json.dumps(m.get("rankings") or [], ensure_ascii=False),
+            "externalLinks_json": json.dumps(m.get("externalLinks") or [], ensure_ascii=False),
+        })
+    return rows
+
+
+def normalize_airing_rows(schedules: List[dict]) -> List[dict]:
+    rows = []
+    for it in schedules:
+        m = it.get("media") or {}
+        title = m.get("title") or {}
+        rows.append({
+            "airing_id": it.get("id"),
+            "airingAt": it.get("airingAt"),
+            "episode": it.get("episode"),
+            "timeUntilAiring": it.get("timeUntilAiring"),
+            "media_id": m.get("id"),
+            "title_romaji": title.get("romaji"),
+            "title_english": title.get("english"),
+            "season": m.get("season"),
+            "seasonYear": m.get("seasonYear"),
+            "format": m.get("format"),
+            "status": m.get("status"),
+            "source": m.get("source"),
+            "averageScore": m.get("averageScore"),
+            "popularity": m.get("popularity"),
+            "favourites": m.get("favourites"),
+        })
+    return rows
@@ -0,0 +1,119 @@
+# ingest/queries.py
+"""
+AniList GraphQL 查询（与 DataAnalysisPart/animation_data/get_ani_data.ipynb 中的查询相同）。
+"""
+
+ANILIST_ENDPOINT = "https://graphql.anilist.co"
+
+SEASONS = ["WINTER", "SPRING", "SUMMER", "FALL"]
+
+# 媒体（作品）字段
+MEDIA_FIELDS = """
+      id
+      idMal
+      title { romaji english native userPreferred }
+      season
+      seasonYear
+      startDate { year month day }
+      endDate   { year month day }
+      episodes
+      duration
+      format
+      status
+      source
+      countryOfOrigin
+      averageScore
+      meanScore
+      popularity
+      favourites
+      trending
+      genres
+      tags { name rank category isGeneralSpoiler isMediaSpoiler }
+      studios {
+        edges { isMain }
+        nodes { id name isAnimationStudio }
+      }
+      rankings {
+        rank
+        type
+        year
+        season
+        allTime
+        context
+      }
+      externalLinks { site url }
+      trailer { id site }
+      coverImage { large medium }
+"""
+
+# 某一季度的动画（$country 为 null 时不限国家 / 地区），默认按热度降序分页。
+# 热度排序的名次随时在变，分页跨越较长时间（如中断后续抓）时会漏页或重复，此时用 $sort: [ID]
+MEDIA_QUERY = """
+query ($page:Int, $perPage:Int, $season:MediaSeason, $seasonYear:Int, $country:CountryCode,
+       $sort:[MediaSort]=[POPULARITY_DESC]) {
+  Page(page:$page, perPage:$perPage) {
+    pageInfo { total perPage currentPage lastPage hasNextPage }
+    media(
+      type: ANIME
+      countryOfOrigin: $country
+      isAdult: false
+      season: $season
+      seasonYear: $seasonYear
+      sort: $sort
+    ) {""" + MEDIA_FIELDS + """    }
+  }
+}
+"""
+
+# 按 id 批量查询（刷新仍在放送的作品，每页最多 perPage 个 id）
+MEDIA_BY_ID_QUERY = """
+query ($page:Int, $perPage:Int, $ids:[Int]) {
+  Page(page:$page, perPage:$perPage) {
+    pageInfo { total perPage currentPage lastPage hasNextPage }
+    media(type: ANIME, id_in: $ids) {""" + MEDIA_FIELDS + """    }
+  }
+}
+"""
+
+# 放送日程：时间窗口内的排程（秒级时间戳），用于候选新番
+AIRING_QUERY = """
+query ($page:Int, $perPage:Int, $notYet:Boolean, $from:Int, $to:Int) {
+  Page(page:$page, perPage:$perPage) {
+    pageInfo { total perPage currentPage lastPage hasNextPage }
+    airingSchedules(airingAt_greater:$from, airingAt_lesser:$to, notYetAired:$notYet) {
+      id
+      airingAt
+      timeUntilAiring
+      episode
+      media {
+        id
+        title { romaji english native userPreferred }
+        season
+        seasonYear
+        format
+        status
+        source
+        averageScore
+        popularity
+        favourites
+      }
+    }
+  }
+}
+"""
+
+
+def batched_media_query(n: int) -> str:
+    """
+    一次请求 n 个（季度, 页码）：别名 s0 … s{n-1} 各是一个 Page，变量 $p{i} / $s{i} / $y{i}
+    分别为第 i 个的页码、季度、年份；$perPage 与 $country 共用。字段同 MEDIA_QUERY（用片段避免重复）。
+    """
+    params = "".join(f", $p{i}:Int, $s{i}:MediaSeason, $y{i}:Int" for i in range(n))
+    pages = "".join(f"""
+  s{i}: Page(page:$p{i}, perPage:$perPage) {{
+    pageInfo {{ total perPage currentPage lastPage hasNextPage }}
+    media(type: ANIME, countryOfOrigin: $country, isAdult: false, season: $s{i}, seasonYear: $y{i},
+          sort: [POPULARITY_DESC]) {{ ...MediaFields }}
+  }}""" for i in range(n))
+    return ("query MediaBatch ($perPage:Int, $country:CountryCode" + params + ") {" + pages + "\n}\n"
+            "fragment MediaFields on Media {" + MEDIA_FIELDS + "}\n")
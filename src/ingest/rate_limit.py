@@ -0,0 +1,112 @@
+# ingest/rate_limit.py
+"""
+AniList 请求的限速与退避。
+
+- TokenBucket：按每分钟请求数匀速补充令牌，所有并发请求共用一个桶；
+  每个响应的 X-RateLimit-Limit / X-RateLimit-Remaining 用来校正速率与剩余令牌，
+  429 的 Retry-After（或 X-RateLimit-Reset）让整个桶暂停，而不是只让出错的那个请求等待
+- backoff_delay：5xx / 连接错误的指数退避，取 [0, 上限] 内的随机值（full jitter），避免并发请求同时重试
+"""
+import asyncio
+import random
+import time
+from typing import Mapping, Optional
+
+# AniList 文档给出的限额为每分钟 90 次；首个响应的 X-RateLimit-Limit 会覆盖这一默认值
+RATE_PER_MINUTE = 90
+# 桶容量：允许的最大突发请求数（AniList 另有短时突发限制，取小值）
+BURST = 5
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP,
+                  rng: Optional[random.Random] = None) -> float:
+    """第 attempt 次重试（从 0 开始）前的等待秒数：uniform(0, min(cap, base · 2^attempt))"""
+    return (rng or random).uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after_seconds(headers: Mapping[str, str], now: Optional[float] = None) -> Optional[float]:
+    """
+    429 响应应等待的秒数：优先 Retry-After（秒），其次 X-RateLimit-Reset（Unix 时间戳）；都没有时返回 None。
+    """
+    value = headers.get("Retry-After")
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+    reset = headers.get("X-RateLimit-Reset")
+    if reset is not None:
+        try:
+            return max(0.0, float(reset) - (time.time() if now is None else now))
+        except ValueError:
+            pass
+    return None
+
+
+class TokenBucket:
+    """
+    异步令牌桶。
+
+    用法：
+        bucket = TokenBucket()
+        await bucket.acquire()          # 每个请求发出前
+        bucket.observe(resp.headers)    # 每个响应之后
+        bucket.pause(seconds)           # 收到 429 时
+
+    等待中的请求按到达顺序（asyncio.Lock 先进先出）依次拿到令牌。
+    """
+
+    def __init__(self, rate_per_minute: float = RATE_PER_MINUTE, burst: int = BURST, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.clock = clock
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.waited = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        # 暂停期间 updated 在未来，不补充
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = self.clock()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                else:
+                    self._refill()
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    delay = (1 - self.tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+    def observe(self, headers: Mapping[str, str]):
+        """用响应头校正：限额变化时调整补充速率；服务端剩余次数比本地令牌少时以服务端为准"""
+        limit = headers.get("X-RateLimit-Limit")
+        if limit is not None:
+            try:
+                self.rate = max(float(limit), 1.0) / 60.0
+            except ValueError:
+                pass
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is not None:
+            try:
+                self._refill()
+                self.tokens = min(self.tokens, float(remaining))
+            except ValueError:
+                pass
+
+    def pause(self, seconds: float):
+        """所有请求暂停 seconds 秒，之后从空桶重新开始补充"""
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+        self.tokens = 0.0
+        self.updated = max(self.updated, self.paused_until)
@@ -0,0 +1,354 @@
+# ingest/sync.py
+"""
+AniList 训练数据的增量同步：逐页检查点、中断后续跑、按 id 合并进已保存的数据集。
+
+状态目录（默认 SYNC_DIR）：
+    state.json              各季度的同步状态 + 未完成的一次运行（pending 季度）
+    pages/<季度>.jsonl      未完成季度已抓取的页（已摊平的行），季度完成后合并进数据集并删除
+
+流程：
+1. 有未完成的运行时继续它（只抓 pending 中剩下的季度，未完成的季度从 next_page 续抓）；
+   否则按模式选出要抓取的季度，记为新的一次运行。
+   季度按 id 分页（SYNC_SORT）：热度名次在中断与续抓之间会变，按热度分页续抓会漏掉或重复作品；
+   检查点不是按 SYNC_SORT 记录的（旧版本的状态）季度从第 1 页重抓
+2. 每抓完一页：行追加到 pages/<季度>.jsonl，state.json 记录下一页页码（先写临时文件再替换）
+3. 一个季度抓完：按 id 合并进数据集 CSV（同 id 的行整行替换，新 id 追加）并写回，
+   记录抓取时间、行数、内容哈希，从 pending 中移除
+
+增量模式（默认）只抓取以下季度：
+- new / partial：从未抓完
+- recent：当前季度、下一季度，以及之前 RECENT_SEASONS 个季度（热度还在快速变化）
+- changed：上次抓取时内容（不计热度、评分等计数类字段）与再上次不同
+- stale：距上次抓取超过 max_age_days
+其余季度里仍在放送（RELEASING / NOT_YET_RELEASED）的作品按 id 批量刷新（每 50 个一次请求）并合并：
+长篇作品几乎散布在每个季度里（每季 1–4 部），按季度整季重抓会让每周刷新退化成全量抓取。
+每周刷新因此只涉及少数几页。--full 抓取全部季度。
+
+某个季度失败不影响其它季度：已完成的季度照常合并并记录，失败的季度留在 pending 中，
+抛出第一个错误；再次运行时续跑。
+
+第一次运行时若数据集 CSV 已存在而没有状态文件，按数据集内容初始化各季度（抓取时间取文件修改时间）。
+
+命令行（在仓库根目录执行）：
+    PYTHONPATH=src python -m ingest.sync                 # 增量同步
+    PYTHONPATH=src python -m ingest.sync --full          # 全部季度重新抓取（中断后再次运行会续跑）
+    PYTHONPATH=src python -m ingest.sync --cache off     # 不使用响应缓存（见 ingest.cache）
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from ingest.cache import CACHE_DIR, CACHE_MODES, ResponseCache, open_cache
+from ingest.client import MAX_CONCURRENCY, AniListClient
+from ingest.normalize import normalize_media_rows
+from ingest.queries import ANILIST_ENDPOINT, SEASONS
+from ingest.rate_limit import RATE_PER_MINUTE, TokenBucket
+
+SYNC_DIR = ".cache/ingest/sync"
+DATASET_PATH = "DataAnalysisPart/animation_data/anilist_anime_2016_2025.csv"
+STATE_VERSION = 1
+RECENT_SEASONS = 2
+MAX_AGE_DAYS = 90
+AIRING_STATUSES = {"RELEASING", "NOT_YET_RELEASED"}
+# 计数类字段每次抓取都会变化，不参与“内容是否变化”的判断
+VOLATILE_COLUMNS = ["popularity", "favourites", "trending", "averageScore", "meanScore", "rankings_json"]
+_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+# 季度分页的排序：id 不随同步变化，续抓时前后页不重不漏
+SYNC_SORT = ["ID"]
+
+
+def season_key(year: int, season: str) -> str:
+    """形如 "FALL 2024"（与 feature_store 的季度写法一致）"""
+    return f"{season} {year}"
+
+
+def season_number(year: int, season: str) -> int:
+    return year * 4 + SEASONS.index(season)
+
+
+def current_season(today: date) -> Tuple[int, str]:
+    return today.year, SEASONS[(today.month - 1) // 3]
+
+
+def content_hash(rows: pd.DataFrame) -> str:
+    """按 id 排序、去掉计数类字段后的内容哈希"""
+    stable = rows.drop(columns=[c for c in VOLATILE_COLUMNS if c in rows.columns]).sort_values("id", kind="stable")
+    return hashlib.sha256(stable.to_csv(index=False).encode("utf-8")).hexdigest()[:16]
+
+
+def refresh_reason(entry: Optional[dict], year: int, season: str, today: date,
+                   max_age_days: int = MAX_AGE_DAYS) -> Optional[str]:
+    """增量模式下该季度需要重新抓取的原因；不需要时返回 None"""
+    if entry is None:
+        return "new"
+    if entry.get("status") != "complete":
+        return "partial"
+    now = season_number(*current_season(today))
+    if now - RECENT_SEASONS <= season_number(year, season) <= now + 1:
+        return "recent"
+    if entry.get("changed"):
+        return "changed"
+    fetched = datetime.strptime(entry["fetched_at"], _TIME_FORMAT).date()
+    if today - fetched > timedelta(days=max_age_days):
+        return "stale"
+    return None
+
+
+def sort_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """年份 → 季度 → 热度降序（与 notebook 逐季按 POPULARITY_DESC 抓取的顺序一致）"""
+    order = df["season"].map({s: i for i, s in enumerate(SEASONS)})
+    keyed = df.assign(_year=df["seasonYear"], _season=order, _pop=-pd.to_numeric(df["popularity"], errors="coerce"))
+    keyed = keyed.sort_values(["_year", "_season", "_pop"], kind="stable", na_position="last")
+    return keyed.drop(columns=["_year", "_season", "_pop"]).reset_index(drop=True)
+
+
+def _comparable(frame: pd.DataFrame) -> pd.DataFrame:
+    # 读回的 CSV 与新抓取的行类型不同（12 与 12.0、NaN 与 None）：能整列转为数值的列先转数值，缺失统一为空串
+    def column(values):
+        numeric = pd.to_numeric(values, errors="coerce")
+        return numeric if numeric.notna().sum() == values.notna().sum() else values
+    return frame.apply(column).astype(object).where(frame.notna(), "").astype(str)
+
+
+def merge_rows(dataset: pd.DataFrame, rows: pd.DataFrame) -> Tuple[pd.DataFrame, int, int]:
+    """
+    按 id 合并：同 id 的行整行替换，新 id 追加。
+
+    :return: (合并后的数据集, 新增行数, 内容有变化的已有行数)
+    """
+    if dataset.empty:
+        return sort_rows(rows), len(rows), 0
+    existing = dataset.set_index("id")
+    overlap = rows[rows["id"].isin(existing.index)].set_index("id")
+    old = existing.loc[overlap.index, overlap.columns.intersection(existing.columns)]
+    changed = int((_comparable(old) != _comparable(overlap[old.columns])).any(axis=1).sum())
+    merged = pd.concat([dataset[~dataset["id"].isin(rows["id"])], rows], ignore_index=True)
+    return sort_rows(merged), len(rows) - len(overlap), changed
+
+
+def _write_atomic(path: str, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+class SyncState:
+    """state.json 的读写；每次修改后由调用方 save()，写入是原子的（临时文件 + 替换）"""
+
+    def __init__(self, root: str = SYNC_DIR):
+        self.root = root
+        self.path = os.path.join(root, "state.json")
+        self.data = {"version": STATE_VERSION, "seasons": {}, "run": None, "last_run": None}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == STATE_VERSION:
+                self.data = data
+
+    @property
+    def seasons(self) -> Dict[str, dict]:
+        return self.data["seasons"]
+
+    def pages_path(self, key: str) -> str:
+        return os.path.join(self.root, "pages", key.replace(" ", "_") + ".jsonl")
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+
+        def write(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=1)
+        _write_atomic(self.path, write)
+
+    def seed_from_dataset(self, dataset: pd.DataFrame, fetched_at: str):
+        """没有状态时按已有数据集初始化各季度（视为在 fetched_at 完整抓取过一次）"""
+        for (season, year), rows in dataset.groupby(["season", "seasonYear"]):
+            if season not in SEASONS:
+                continue
+            self.seasons[season_key(int(year), season)] = {
+                "status": "complete", "next_page": 1, "fetched_at": fetched_at, "n_rows": int(len(rows)),
+                "content_hash": content_hash(rows), "changed": False,
+            }
+
+
+class SeasonSync:
+    """
+    一次同步运行。
+
+    :param seasons: 同步范围 [(year, season)]
+    :param mode: 'incremental' 或 'full'
+    """
+
+    def __init__(self, seasons: Sequence[Tuple[int, str]], dataset_path: str = DATASET_PATH,
+                 state_dir: str = SYNC_DIR, mode: str = "incremental", max_age_days: int = MAX_AGE_DAYS,
+                 today: Optional[date] = None):
+        if mode not in ("incremental", "full"):
+            raise ValueError("mode 只能是 'incremental' 或 'full'")
+        self.seasons = list(seasons)
+        self.dataset_path = dataset_path
+        self.state = SyncState(state_dir)
+        self.mode = mode
+        self.max_age_days = max_age_days
+        self.today = today or date.today()
+        self.dataset = pd.read_csv(dataset_path) if os.path.exists(dataset_path) else pd.DataFrame()
+        if not self.state.seasons and not self.dataset.empty:
+            mtime = time.strftime(_TIME_FORMAT, time.localtime(os.path.getmtime(dataset_path)))
+            self.state.seed_from_dataset(self.dataset, mtime)
+        self.report = {"pages": 0, "rows_new": 0, "rows_changed": 0, "seasons": {}, "titles": 0}
+
+    def plan(self) -> Dict[str, str]:
+        """本次要抓取的季度 → 原因；有未完成的运行时为它剩下的季度"""
+        run = self.state.data.get("run")
+        if run and run.get("pending"):
+            return {key: "resume" for key in run["pending"]}
+        plan = {}
+        for year, season in self.seasons:
+            key = season_key(year, season)
+            reason = "full" if self.mode == "full" else refresh_reason(
+                self.state.seasons.get(key), year, season, self.today, self.max_age_days)
+            if reason is not None:
+                plan[key] = reason
+        return plan
+
+    def airing_ids(self, plan: Dict[str, str]) -> List[int]:
+        """同步范围内、不在本次抓取季度里、仍在放送的作品 id"""
+        if self.dataset.empty:
+            return []
+        keys = {season_key(year, season) for year, season in self.seasons} - set(plan)
+        rows = self.dataset[self.dataset["status"].isin(AIRING_STATUSES)]
+        in_scope = [season_key(int(y), s) in keys if pd.notna(y) else False
+                    for s, y in zip(rows["season"], rows["seasonYear"])]
+        return [int(i) for i in rows.loc[in_scope, "id"]]
+
+    def _merge(self, rows: pd.DataFrame):
+        self.dataset, n_new, n_changed = merge_rows(self.dataset, rows)
+        _write_atomic(self.dataset_path, lambda tmp: self.dataset.to_csv(tmp, index=False, encoding="utf-8-sig"))
+        self.report["rows_new"] += n_new
+        self.report["rows_changed"] += n_changed
+
+    def _on_page(self, key: str, number: int, media: List[dict], last: bool):
+        path = self.state.pages_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for row in normalize_media_rows(media):
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        entry = self.state.seasons.setdefault(key, {})
+        entry.update(status="complete_pending" if last else "partial", next_page=number + 1, sort=SYNC_SORT)
+        self.state.save()
+        self.report["pages"] += 1
+
+    def _complete(self, key: str):
+        path = self.state.pages_path(key)
+        rows = pd.DataFrame()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                rows = pd.DataFrame([json.loads(line) for line in f if line.strip()])
+        entry = self.state.seasons[key]
+        if not rows.empty:
+            rows = rows.drop_duplicates(subset=["id"]).reset_index(drop=True)
+            self._merge(rows)
+        new_hash = content_hash(rows) if not rows.empty else None
+        entry.update(
+            status="complete", next_page=1, fetched_at=time.strftime(_TIME_FORMAT), n_rows=int(len(rows)),
+            changed=entry.get("content_hash") is not None and new_hash != entry.get("content_hash"),
+            content_hash=new_hash,
+        )
+        run = self.state.data["run"]
+        run["pending"] = [k for k in run["pending"] if k != key]
+        self.state.save()
+        if os.path.exists(path):
+            os.remove(path)
+
+    async def _sync_season(self, client: AniListClient, key: str):
+        season, year = key.split()
+        entry = self.state.seasons.get(key) or {}
+        if entry.get("status") != "complete_pending":
+            resumable = entry.get("status") == "partial" and entry.get("sort") == SYNC_SORT
+            start_page = entry.get("next_page", 1) if resumable else 1
+            if start_page == 1 and os.path.exists(self.state.pages_path(key)):
+                os.remove(self.state.pages_path(key))
+            await client.fetch_season(int(year), season, start_page,
+                                      on_page=lambda n, media, last: self._on_page(key, n, media, last),
+                                      sort=SYNC_SORT)
+        self._complete(key)
+
+    async def _refresh_titles(self, client: AniListClient, ids: List[int]):
+        media = await client.fetch_media_by_ids(ids)
+        if media:
+            self._merge(pd.DataFrame(normalize_media_rows(media)).drop_duplicates(subset=["id"]))
+        self.report["titles"] = len(media)
+
+    async def run(self, client: AniListClient) -> dict:
+        plan = self.plan()
+        run = self.state.data.get("run")
+        if not (run and run.get("pending")):
+            self.state.data["run"] = {"mode": self.mode, "started_at": time.strftime(_TIME_FORMAT),
+                                      "pending": list(plan)}
+            self.state.save()
+        self.report["seasons"] = plan
+        titles = self.airing_ids(plan) if self.mode == "incremental" else []
+        results = await asyncio.gather(*(self._sync_season(client, key) for key in plan),
+                                       *([self._refresh_titles(client, titles)] if titles else []),
+                                       return_exceptions=True)
+        self.report["requests"] = client.stats["requests"]
+        self.report["cached"] = client.stats["cached"]
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            # 已完成的季度已经合并并从 pending 中移除；保留 run，下次运行续跑剩下的
+            self.state.save()
+            raise errors[0]
+        self.state.data["last_run"] = dict(self.state.data["run"], finished_at=time.strftime(_TIME_FORMAT),
+                                           pages=self.report["pages"], rows_new=self.report["rows_new"],
+                                           rows_changed=self.report["rows_changed"])
+        self.state.data["run"] = None
+        self.state.save()
+        return self.report
+
+
+async def sync_dataset(year_start: int = 2016, year_end: int = 2025, dataset_path: str = DATASET_PATH,
+                       state_dir: str = SYNC_DIR, mode: str = "incremental", endpoint: str = ANILIST_ENDPOINT,
+                       max_concurrency: int = MAX_CONCURRENCY, rate_per_minute: float = RATE_PER_MINUTE,
+                       max_age_days: int = MAX_AGE_DAYS, today: Optional[date] = None,
+                       cache: Optional[ResponseCache] = None) -> dict:
+    """同步 year_start–year_end 的全部季度，返回本次运行的报告"""
+    seasons = [(year, season) for year in range(year_start, year_end + 1) for season in SEASONS]
+    engine = SeasonSync(seasons, dataset_path, state_dir, mode, max_age_days, today)
+    async with AniListClient(endpoint, TokenBucket(rate_per_minute), max_concurrency, cache=cache) as client:
+        return await engine.run(client)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally sync AniList seasons into the raw training CSV")
+    parser.add_argument("--start-year", type=int, default=2016)
+    parser.add_argument("--end-year", type=int, default=2025)
+    parser.add_argument("--out", default=DATASET_PATH)
+    parser.add_argument("--state", default=SYNC_DIR)
+    parser.add_argument("--full", action="store_true", help="refetch every season")
+    parser.add_argument("--max-age-days", type=int, default=MAX_AGE_DAYS)
+    parser.add_argument("--endpoint", default=ANILIST_ENDPOINT)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=RATE_PER_MINUTE)
+    parser.add_argument("--cache", choices=CACHE_MODES, default="use")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    report = asyncio.run(sync_dataset(args.start_year, args.end_year, args.out, args.state,
+                                      "full" if args.full else "incremental", args.endpoint, args.concurrency,
+                                      args.rate, args.max_age_days, cache=open_cache(args.cache, args.cache_dir)))
+    n_seasons = (args.end_year - args.start_year + 1) * len(SEASONS)
+    reasons = pd.Series(report["seasons"], dtype=object).value_counts().to_dict()
+    print(f"抓取 {len(report['seasons'])}/{n_seasons} 个季度 {reasons}，{report['pages']} 页，"
+          f"刷新放送中作品 {report['titles']} 部，请求 {report['requests']} 次（缓存命中 {report['cached']} 次），耗时 {time.perf_counter() - start:.1f}s")
+    print(f"新增 {report['rows_new']} 行，更新 {report['rows_changed']} 行 → {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,149 @@
+# ingest/writer.py
+"""
+流式写出：每页 media 到达时就摊平、按 id 去重、攒够 chunk_rows 行写成一个 Parquet 分块，
+最后 compact() 把分块按顺序拼成一个 Parquet（每个分块一个 row group）或 CSV 文件。
+
+与 fetch_training_rows（全部行放进一个 list[dict] → DataFrame → drop_duplicates）相比，
+峰值内存只与 chunk_rows 和 id 上限有关，与抓取的总行数无关，适合不限国家 / 格式的全量抓取。
+
+- 去重：IdSet 用按 id 索引的位图（AniList id 目前在 20 万以内，约 25KB），保留第一次到达的行
+- 行顺序是页到达的顺序（多个季度并发时季度之间交错），需要固定顺序时在下游排序
+- 分块使用固定 schema（MEDIA_SCHEMA），全空的列在各分块中类型一致，可以直接拼接
+
+用法：
+    writer = ChunkedWriter(".cache/ingest/chunks/all")
+    await client.fetch_season(2025, "FALL", on_page=lambda n, media, last: writer.write_page(media),
+                              country=None, collect=False)
+    writer.compact("anilist_anime_all.parquet")      # 或 .csv
+"""
+import os
+import shutil
+from typing import Iterable, List
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from ingest.normalize import normalize_media_rows
+
+CHUNK_ROWS = 5000
+CHUNK_DIR = ".cache/ingest/chunks"
+
+_INT_COLUMNS = {"id", "idMal", "seasonYear", "episodes", "duration", "averageScore", "meanScore",
+                "popularity", "favourites", "trending"}
+# 列顺序与 normalize_media_rows 一致；其余列都是字符串
+MEDIA_SCHEMA = pa.schema([(name, pa.int64() if name in _INT_COLUMNS else pa.string())
+                          for name in normalize_media_rows([{}])[0]])
+
+
+class IdSet:
+    """非负整数 id 的集合（按需增长的位图）"""
+
+    def __init__(self, capacity: int = 1 << 18):
+        self._bits = np.zeros((capacity + 7) // 8, dtype=np.uint8)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, value: int) -> bool:
+        value = int(value)
+        return value < len(self._bits) * 8 and bool(self._bits[value >> 3] & (1 << (value & 7)))
+
+    def add_new(self, ids: Iterable[int]) -> np.ndarray:
+        """加入 ids，返回每个 id 是否第一次出现（同一批内重复的只有第一个为 True）"""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        if ids.size == 0:
+            return np.zeros(0, dtype=bool)
+        if ids.min() < 0:
+            raise ValueError("id 必须是非负整数")
+        need = int(ids.max()) // 8 + 1
+        if need > len(self._bits):
+            self._bits = np.concatenate([self._bits, np.zeros(max(need, 2 * len(self._bits)) - len(self._bits),
+                                                              dtype=np.uint8)])
+        byte, mask = ids >> 3, (1 << (ids & 7)).astype(np.uint8)
+        new = (self._bits[byte] & mask) == 0
+        # 同一批内的重复：只保留第一次出现
+        _, first = np.unique(ids, return_index=True)
+        in_batch_first = np.zeros(ids.size, dtype=bool)
+        in_batch_first[first] = True
+        new &= in_batch_first
+        np.bitwise_or.at(self._bits, byte[new], mask[new])
+        self._count += int(new.sum())
+        return new
+
+
+class ChunkedWriter:
+    """
+    :param out_dir: 分块目录（part-00000.parquet, ...），已存在的旧分块会被清空
+    :param chunk_rows: 每个分块（也是 compact 后的 row group）的行数
+    """
+
+    def __init__(self, out_dir: str, chunk_rows: int = CHUNK_ROWS):
+        self.out_dir = out_dir
+        self.chunk_rows = chunk_rows
+        self.seen = IdSet()
+        self.stats = {"pages": 0, "rows": 0, "duplicates": 0, "chunks": 0}
+        self._buffer: List[dict] = []
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.makedirs(out_dir)
+
+    def write_page(self, media: List[dict]):
+        """摊平一页 media，丢弃已见过的 id（或没有 id 的行），攒够 chunk_rows 行时写出一个分块"""
+        rows = [row for row in normalize_media_rows(media) if row["id"] is not None]
+        new = self.seen.add_new(row["id"] for row in rows)
+        self._buffer.extend(row for row, keep in zip(rows, new) if keep)
+        self.stats["pages"] += 1
+        self.stats["duplicates"] += len(media) - int(new.sum())
+        while len(self._buffer) >= self.chunk_rows:
+            self._flush(self._buffer[:self.chunk_rows])
+            del self._buffer[:self.chunk_rows]
+
+    def _flush(self, rows: List[dict]):
+        if not rows:
+            return
+        path = os.path.join(self.out_dir, f"part-{self.stats['chunks']:05d}.parquet")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(pa.Table.from_pylist(rows, schema=MEDIA_SCHEMA), tmp)
+        os.replace(tmp, path)
+        self.stats["chunks"] += 1
+        self.stats["rows"] += len(rows)
+
+    def close(self):
+        """写出缓冲区里剩下的行"""
+        self._flush(self._buffer)
+        self._buffer = []
+
+    def chunk_paths(self) -> List[str]:
+        return sorted(os.path.join(self.out_dir, name) for name in os.listdir(self.out_dir)
+                      if name.endswith(".parquet"))
+
+    def compact(self, out: str, remove_chunks: bool = True) -> int:
+        """
+        分块按顺序拼成一个文件，一次只读一个分块：
+        .parquet → 每个分块一个 row group；其它扩展名 → CSV（utf-8-sig，与 notebook 相同）
+
+        :return: 总行数
+        """
+        self.close()
+        paths = self.chunk_paths()
+        tmp = f"{out}.{os.getpid()}.tmp"
+        n_rows = 0
+        if out.endswith(".parquet"):
+            with pq.ParquetWriter(tmp, MEDIA_SCHEMA) as parquet_writer:
+                for path in paths:
+                    table = pq.read_table(path, schema=MEDIA_SCHEMA)
+                    parquet_writer.write_table(table, row_group_size=max(table.num_rows, 1))
+                    n_rows += table.num_rows
+        else:
+            with open(tmp, "w", encoding="utf-8-sig", newline="") as f:
+                if not paths:
+                    f.write(",".join(MEDIA_SCHEMA.names) + "\n")
+                for i, path in enumerate(paths):
+                    # 可空整数列保持整数写出（12 而不是 12.0）
+                    frame = pq.read_table(path, schema=MEDIA_SCHEMA).to_pandas(integer_object_nulls=True)
+                    frame.to_csv(f, index=False, header=i == 0)
+                    n_rows += len(frame)
+        os.replace(tmp, out)
+        if remove_chunks:
+            shutil.rmtree(self.out_dir, ignore_errors=True)
+        return n_rows
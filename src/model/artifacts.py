@@ -0,0 +1,398 @@
+# model/artifacts.py
+"""
+爆款预测模型的版本化产物：训练好的 RandomForest + 特征编码器（工作室热度表、题材词表、标准化参数）+ 元数据。
+
+目录结构（ARTIFACT_DIR 下每个版本一个子目录，LATEST 文件记录最新版本号）：
+    artifacts/hit_model/
+        LATEST
+        <version>/
+            model.joblib      RandomForestRegressor（训练 / 重新导出用）
+            forest/           拉平后的 NumPy 数组（model/flat_forest.py），服务端推理只读这一份，无需导入 sklearn
+            encoders.json     FeatureBuilder 状态 + StandardScaler 的 mean / scale
+            metadata.json     版本、训练数据哈希、参数、R²、特征名、依赖版本、增量训练历史等
+            train_ids.npy     参与训练的作品 id（增量训练据此找出新增的行，见 model/incremental.py）
+
+版本号由 训练数据内容 + 模型参数 + 特征版本 哈希得到，相同输入重复训练得到同一版本；
+增量训练的版本号另外混入上一版本号。
+
+命令行（在仓库根目录执行）：
+    PYTHONPATH=src python -m model.artifacts                          # 用 notebook 的最佳参数训练并保存
+    PYTHONPATH=src python -m model.artifacts --search-log .cache/search/trees   # 使用搜索日志中的最佳参数
+    PYTHONPATH=src python -m model.artifacts --tag-dim 256 --tag-encoding       # 追加标签哈希特征与目标编码
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from model.features import CANDIDATE_SCHEMA, FEATURE_VERSION, NUMERIC_FEATURES, FeatureBuilder, season_index
+from model.flat_forest import FlatForest
+from util.lazy_import import lazy_import
+
+joblib = lazy_import("joblib")
+ensemble = lazy_import("sklearn.ensemble")
+metrics = lazy_import("sklearn.metrics")
+model_selection = lazy_import("sklearn.model_selection")
+preprocessing = lazy_import("sklearn.preprocessing")
+
+ARTIFACT_DIR = "artifacts/hit_model"
+TRAIN_PATH = "public/data/anilist_anime_2016_2025_cleaned.csv"
+RANDOM_STATE = 42
+
+# 训练目标：raw 直接拟合 popularity（notebook 的做法）；log1p 拟合 log1p(popularity)，预测时用 expm1 还原。
+# 热度是长尾分布，log1p 让头部与长尾作品的相对误差更均衡；还原后的点预测接近条件中位数而非均值
+TARGETS = ("raw", "log1p")
+
+
+def encode_target(y: np.ndarray, target: str = "raw") -> np.ndarray:
+    if target not in TARGETS:
+        raise ValueError(f"未知的训练目标：{target}，可选 {TARGETS}")
+    return np.log1p(y) if target == "log1p" else y
+
+
+def decode_target(pred: np.ndarray, target: str = "raw") -> np.ndarray:
+    """模型输出还原为热度（单调变换，分位数可以先算后还原）"""
+    return np.expm1(pred) if target == "log1p" else pred
+
+
+# notebook 中 GridSearchCV 得到的最佳参数（prediction 页面报告的那一组）
+DEFAULT_PARAMS = {
+    "bootstrap": True,
+    "max_depth": 20,
+    "max_features": "sqrt",
+    "min_samples_leaf": 1,
+    "min_samples_split": 2,
+    "n_estimators": 200,
+}
+
+
+class ModelArtifact:
+    """
+    一个版本的模型产物：predict 对整张候选表做一次向量化打分。
+
+    model 为 sklearn 的 RandomForestRegressor（刚训练完时）或 FlatForest（从磁盘加载时），两者预测逐位一致。
+    """
+
+    def __init__(self, model, builder: FeatureBuilder, scaler_mean: np.ndarray, scaler_scale: np.ndarray,
+                 metadata: dict, train_ids: Optional[np.ndarray] = None, train_targets: Optional[np.ndarray] = None):
+        self.model = model
+        self.builder = builder
+        self.scaler_mean = np.asarray(scaler_mean, dtype=np.float64)
+        self.scaler_scale = np.asarray(scaler_scale, dtype=np.float64)
+        self.metadata = metadata
+        self.train_ids = None if train_ids is None else np.asarray(train_ids, dtype=np.int64)
+        # 与 train_ids 对应的、训练（或上次增量刷新）时的热度；增量刷新据此把热度变化作为差值计入编码器
+        self.train_targets = None if train_targets is None else np.asarray(train_targets, dtype=np.float64)
+
+    @property
+    def version(self) -> str:
+        return self.metadata["version"]
+
+    @property
+    def target(self) -> str:
+        return self.metadata.get("target", "raw")
+
+    @property
+    def forest(self) -> FlatForest:
+        """NumPy 形式的森林（刚训练完的 sklearn 模型即时转换）"""
+        if isinstance(self.model, FlatForest):
+            return self.model
+        return FlatForest.from_model(self.model)
+
+    def features(self, df: pd.DataFrame, schema: dict = CANDIDATE_SCHEMA) -> np.ndarray:
+        """
+        构建并标准化特征（与训练时 StandardScaler 的变换相同）
+
+        :raises ValueError: 模型使用了标签特征（--tag-dim），但 df 缺少 schema 中的 tags 列
+        """
+        if self.builder.tags is not None and schema.get("tags") not in df.columns:
+            # 缺列时标签特征会全部取“无标签”时的值，预测整体偏低且没有任何提示
+            raise ValueError(f"模型版本 {self.version} 使用了标签特征，但输入缺少 {schema.get('tags')!r} 列")
+        X = self.builder.transform(df, schema=schema)
+        return (X - self.scaler_mean) / self.scaler_scale
+
+    def predict(self, df: pd.DataFrame, schema: dict = CANDIDATE_SCHEMA) -> np.ndarray:
+        if len(df) == 0:
+            return np.zeros(0, dtype=np.float64)
+        return decode_target(self.model.predict(self.features(df, schema)), self.target)
+
+    def predict_per_tree(self, df: pd.DataFrame, schema: dict = CANDIDATE_SCHEMA) -> np.ndarray:
+        """各树的预测（已还原为热度），形状 (n_trees, n_samples)，一次向量化下降得到"""
+        return decode_target(self.forest.predict_per_tree(self.features(df, schema)), self.target)
+
+
+def _artifact_version(train_bytes: bytes, params: dict, parent: Optional[str] = None, target: str = "raw",
+                      feature_config: Optional[dict] = None) -> str:
+    h = hashlib.sha256(train_bytes)
+    key = {"params": params, "feature_version": FEATURE_VERSION}
+    if parent is not None:
+        key["parent"] = parent
+    if target != "raw":
+        key["target"] = target
+    if feature_config:
+        key["feature_config"] = feature_config
+    h.update(json.dumps(key, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+def trained_rows(train_df: pd.DataFrame) -> pd.Series:
+    """参与训练的行（popularity 非缺失，与 FeatureBuilder.training_matrix 的筛选一致）"""
+    return pd.to_numeric(train_df["popularity"], errors="coerce").notna()
+
+
+def fit_scaler(X) -> tuple:
+    """
+    标准化参数 (mean, scale)。
+
+    稠密矩阵：全部列做 StandardScaler（notebook 的做法）；
+    CSR 矩阵（启用标签特征时）：只标准化前面的数值列，题材 / 标签列 mean=0、scale=1，
+    矩阵保持稀疏（树模型对逐列的单调仿射变换不敏感，不影响划分）
+    """
+    if not sp.issparse(X):
+        scaler = preprocessing.StandardScaler().fit(X)
+        return scaler.mean_, scaler.scale_
+    k = len(NUMERIC_FEATURES)
+    scaler = preprocessing.StandardScaler().fit(X[:, :k].toarray())
+    mean, scale = np.zeros(X.shape[1]), np.ones(X.shape[1])
+    mean[:k], scale[:k] = scaler.mean_, scaler.scale_
+    return mean, scale
+
+
+def scale_features(X, mean: np.ndarray, scale: np.ndarray):
+    """(X - mean) / scale；CSR 矩阵只变换 mean≠0 或 scale≠1 的列（fit_scaler 中即数值列），结果仍为 CSR"""
+    if not sp.issparse(X):
+        return (X - mean) / scale
+    k = len(NUMERIC_FEATURES)
+    if np.any(mean[k:] != 0) or np.any(scale[k:] != 1):
+        raise ValueError("稀疏特征只支持标准化前面的数值列")
+    numeric = (X[:, :k].toarray() - mean[:k]) / scale[:k]
+    return sp.hstack([sp.csr_matrix(numeric), X[:, k:]], format="csr")
+
+
+def trained_keys_sha256(train_df: pd.DataFrame, ids: np.ndarray, builder: FeatureBuilder) -> str:
+    """
+    id 属于 ids 的训练行的 id 与 builder.state_columns（工作室 / 标签）的内容哈希，按 id 排序。
+
+    不含 popularity 等每次同步都会变化的数值列：热度变化由增量刷新作为差值计入编码器，
+    这里只用来判断已训练的行是否被删除、或改了编码器无法撤回的工作室 / 标签。
+    """
+    rows = train_df[trained_rows(train_df) & train_df["id"].isin(ids)].sort_values("id", kind="stable")
+    columns = ["id"] + [c for c in builder.state_columns() if c in rows.columns]
+    return hashlib.sha256(rows[columns].to_csv(index=False).encode("utf-8")).hexdigest()
+
+
+def forward_r2(train_df: pd.DataFrame, params: dict, n_jobs: int = -1, target: str = "raw",
+               feature_config: Optional[dict] = None) -> Optional[float]:
+    """
+    向前验证 R²：编码器与模型只用最新季度之前的数据拟合，对最新季度打分。
+
+    刚播出的季度热度普遍偏低，这一 R² 与随机划分的验证集 R² 不可直接比较；增量刷新的漂移检测以它为基准。
+    """
+    seasons = season_index(train_df)
+    latest = seasons.max()
+    past, held = train_df[seasons < latest], train_df[seasons == latest]
+    builder = FeatureBuilder(**(feature_config or {})).fit(past)
+    sparse = builder.tags is not None
+    X_past, y_past = builder.training_matrix(past, sparse=sparse)
+    X_held, y_held = builder.training_matrix(held, sparse=sparse, out_of_fold=False)
+    if len(y_past) == 0 or len(y_held) < 2:
+        return None
+    # 标准化是逐列的单调仿射变换，不改变树的划分，这里省略
+    model = ensemble.RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=n_jobs, **params)
+    model.fit(X_past, encode_target(y_past, target))
+    return float(metrics.r2_score(y_held, decode_target(model.predict(X_held), target)))
+
+
+def train_artifact(train_path: str = TRAIN_PATH, params: Optional[dict] = None, n_jobs: int = -1,
+                   target: str = "raw", feature_config: Optional[dict] = None) -> ModelArtifact:
+    """
+    按 notebook 的流程训练：特征 → 标准化 → 80/20 划分评估验证集 R² → 用全部训练数据重新拟合。
+    另外记录向前验证 R²（forward_r2），作为增量刷新漂移检测的基准。
+
+    :param target: 'raw' 或 'log1p'（见 TARGETS）；各项 R² 都在还原后的热度上计算，两种目标可直接比较
+    :param feature_config: FeatureBuilder 的构造参数，如 {"tag_dim": 256, "tag_encoding": True}；默认为 notebook 的特征
+    """
+    params = dict(params or DEFAULT_PARAMS)
+    with open(train_path, "rb") as f:
+        raw = f.read()
+    train_df = pd.read_csv(train_path)
+
+    builder = FeatureBuilder(**(feature_config or {})).fit(train_df)
+    # 启用标签特征时 X 全程保持 CSR（n × tag_dim 的稠密矩阵正是标签哈希要避免的），森林直接在稀疏矩阵上训练
+    X, y = builder.training_matrix(train_df, sparse=builder.tags is not None)
+    scaler_mean, scaler_scale = fit_scaler(X)
+    X_scaled = scale_features(X, scaler_mean, scaler_scale)
+
+    X_fit, X_val, y_fit, y_val = model_selection.train_test_split(
+        X_scaled, y, test_size=0.2, random_state=RANDOM_STATE
+    )
+    model = ensemble.RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=n_jobs, **params)
+    model.fit(X_fit, encode_target(y_fit, target))
+    val_r2 = float(metrics.r2_score(y_val, decode_target(model.predict(X_val), target)))
+
+    start = time.perf_counter()
+    model.fit(X_scaled, encode_target(y, target))
+    fit_seconds = time.perf_counter() - start
+    train_r2 = float(metrics.r2_score(y, decode_target(model.predict(X_scaled), target)))
+
+    fwd_r2 = forward_r2(train_df, params, n_jobs, target, builder.config)
+
+    import sklearn
+    train_ids = train_df.loc[trained_rows(train_df), "id"].to_numpy()
+    metadata = {
+        "version": _artifact_version(raw, params, target=target, feature_config=builder.config),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "train_path": train_path,
+        "train_sha256": hashlib.sha256(raw).hexdigest(),
+        "train_keys_sha256": trained_keys_sha256(train_df, train_ids, builder),
+        "n_train": int(len(y)),
+        "params": params,
+        "target": target,
+        "feature_version": FEATURE_VERSION,
+        "feature_config": builder.config,
+        "feature_names": builder.feature_names,
+        "train_r2": train_r2,
+        "validation_r2": val_r2,
+        "forward_r2": fwd_r2,
+        "n_trees": int(params["n_estimators"]),
+        "fit_seconds": fit_seconds,
+        "sklearn_version": sklearn.__version__,
+        "mode": "full",
+        "history": [{"mode": "full", "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     "n_train": int(len(y)), "validation_r2": val_r2, "forward_r2": fwd_r2,
+                     "fit_seconds": fit_seconds}],
+    }
+    return ModelArtifact(model, builder, scaler_mean, scaler_scale, metadata, train_ids, y)
+
+
+def save_artifact(artifact: ModelArtifact, root: str = ARTIFACT_DIR) -> str:
+    """保存到 root/<version>/ 并更新 LATEST；返回版本目录"""
+    path = os.path.join(root, artifact.version)
+    os.makedirs(path, exist_ok=True)
+    if isinstance(artifact.model, FlatForest):
+        forest = artifact.model
+    else:
+        joblib.dump(artifact.model, os.path.join(path, "model.joblib"), compress=3)
+        forest = FlatForest.from_model(artifact.model)
+    forest.save(os.path.join(path, "forest"))
+    encoders = {
+        "builder": artifact.builder.to_state(),
+        "scaler_mean": artifact.scaler_mean.tolist(),
+        "scaler_scale": artifact.scaler_scale.tolist(),
+    }
+    with open(os.path.join(path, "encoders.json"), "w", encoding="utf-8") as f:
+        json.dump(encoders, f, ensure_ascii=False)
+    with open(os.path.join(path, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump(artifact.metadata, f, ensure_ascii=False, indent=2)
+    if artifact.train_ids is not None:
+        np.save(os.path.join(path, "train_ids.npy"), artifact.train_ids)
+    if artifact.train_targets is not None:
+        np.save(os.path.join(path, "train_targets.npy"), artifact.train_targets)
+    # 最后写 LATEST（先写临时文件再替换），读取方不会看到只写了一半的版本
+    tmp = os.path.join(root, "LATEST.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(artifact.version)
+    os.replace(tmp, os.path.join(root, "LATEST"))
+    return path
+
+
+def latest_version(root: str = ARTIFACT_DIR) -> Optional[str]:
+    try:
+        with open(os.path.join(root, "LATEST"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_artifact(root: str = ARTIFACT_DIR, version: Optional[str] = None, backend: str = "numpy") -> ModelArtifact:
+    """
+    读取指定版本（默认 LATEST）的产物。
+
+    :param backend: 'numpy' 读取 forest/（内存映射，不导入 sklearn；旧版本没有 forest/ 时退回 joblib），
+                    'sklearn' 读取 model.joblib
+
+    :raises FileNotFoundError: 还没有训练过任何版本
+    :raises ValueError: 产物的特征版本与当前代码不一致
+    """
+    version = version or latest_version(root)
+    if version is None:
+        raise FileNotFoundError(f"{root} 下没有模型产物，请先运行 python -m model.artifacts")
+    path = os.path.join(root, version)
+    with open(os.path.join(path, "metadata.json"), encoding="utf-8") as f:
+        metadata = json.load(f)
+    with open(os.path.join(path, "encoders.json"), encoding="utf-8") as f:
+        encoders = json.load(f)
+    builder = FeatureBuilder.from_state(encoders["builder"])
+    forest_path = os.path.join(path, "forest")
+    if backend == "numpy" and os.path.isdir(forest_path):
+        model = FlatForest.load(forest_path)
+    else:
+        model = joblib.load(os.path.join(path, "model.joblib"))
+    ids_path = os.path.join(path, "train_ids.npy")
+    train_ids = np.load(ids_path) if os.path.exists(ids_path) else None
+    targets_path = os.path.join(path, "train_targets.npy")
+    train_targets = np.load(targets_path) if os.path.exists(targets_path) else None
+    return ModelArtifact(model, builder, encoders["scaler_mean"], encoders["scaler_scale"], metadata, train_ids,
+                         train_targets)
+
+
+def training_data_changed(artifact: ModelArtifact, train_path: str = TRAIN_PATH) -> bool:
+    """训练数据文件与产物训练时的内容不同（产物已过期，需要运行 python -m model.incremental 刷新）"""
+    try:
+        with open(train_path, "rb") as f:
+            current = hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return False
+    return artifact.metadata.get("train_sha256") != current
+
+
+def load_or_train(root: str = ARTIFACT_DIR, train_path: str = TRAIN_PATH) -> ModelArtifact:
+    """
+    读取最新产物；不存在或特征版本过期时用 DEFAULT_PARAMS 完整训练并保存。
+
+    训练数据变化时不在这里刷新（服务端不导入 sklearn、不在请求中训练），照常返回最新产物，
+    由调用方用 training_data_changed 提示模型已过期；刷新交给 python -m model.incremental。
+    """
+    try:
+        return load_artifact(root)
+    except (FileNotFoundError, ValueError):
+        artifact = train_artifact(train_path, DEFAULT_PARAMS)
+        save_artifact(artifact, root)
+    # 重新从磁盘读取，服务端始终使用 NumPy 推理
+    return load_artifact(root, artifact.version)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and save a versioned hit-prediction model artifact")
+    parser.add_argument("--train", default=TRAIN_PATH)
+    parser.add_argument("--out", default=ARTIFACT_DIR)
+    parser.add_argument("--search-log", default=None, help="use the best parameters from a model.search log directory")
+    parser.add_argument("--target", choices=TARGETS, default="raw", help="fit popularity directly or log1p(popularity)")
+    parser.add_argument("--tag-dim", type=int, default=0, help="number of hashed tag buckets (0 = no tag features)")
+    parser.add_argument("--tag-encoding", action="store_true", help="add out-of-fold target encoding of frequent tags")
+    args = parser.parse_args(argv)
+    if args.tag_encoding and args.tag_dim <= 0:
+        parser.error("--tag-encoding requires --tag-dim > 0")
+
+    params = DEFAULT_PARAMS
+    if args.search_log:
+        from model.search import best_params_from_log
+        params = best_params_from_log(args.search_log)
+
+    feature_config = {"tag_dim": args.tag_dim, "tag_encoding": args.tag_encoding} if args.tag_dim > 0 else None
+    artifact = train_artifact(args.train, params, target=args.target, feature_config=feature_config)
+    path = save_artifact(artifact, args.out)
+    meta = artifact.metadata
+    print(f"已保存 {path}")
+    print(f"参数：{meta['params']}  训练目标：{meta['target']}")
+    print(f"训练集 R²：{meta['train_r2']:.4f}  验证集 R²：{meta['validation_r2']:.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,206 @@
+# model/explain.py
+"""
+预测解释：置换特征重要性（进程池并行）+ 单个预测的决策路径贡献（FlatForest.contributions）。
+
+特征按组计算：6 个数值特征各为一组，全部题材 one-hot 合为 "genres" 一组（整块一起置换），
+启用标签特征时全部标签哈希桶与目标编码列合为 "tags" 一组。
+
+置换重要性不逐个（特征组, 重复）重新对全部样本预测：
+- 先在原始数据上求出每个 (树, 样本) 的叶子，以及决策路径上用到了哪些特征组（FlatForest.path_groups）
+- 置换某一组时，路径上没有用到这一组的 (树, 样本) 落到的叶子不会变，只对其余的对重新下降
+- 各 (组, 重复) 任务分发到进程池；工作进程内存映射同一份 forest/ 数组
+
+结果按模型版本保存在产物目录的 importance.json 中，同一版本只计算一次。
+
+命令行（在仓库根目录执行，训练后预先算好，页面即可直接读取）：
+    PYTHONPATH=src python -m model.explain
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from model.artifacts import ARTIFACT_DIR, ModelArtifact, encode_target, load_artifact, trained_rows
+from model.features import NUMERIC_FEATURES, TRAIN_SCHEMA
+from model.flat_forest import FlatForest
+
+IMPORTANCE_FILE = "importance.json"
+N_REPEATS = 5
+RANDOM_STATE = 42
+
+
+def feature_groups(feature_names: List[str]):
+    """
+    :return: (group_names, feature_group)  feature_group[i] 为第 i 个特征所属组的下标
+    """
+    def group(name):
+        if name in NUMERIC_FEATURES:
+            return name
+        return "tags" if name.startswith("tag_") else "genres"
+
+    groups = [group(name) for name in feature_names]
+    group_names = list(NUMERIC_FEATURES) + [g for g in ("genres", "tags") if g in groups]
+    feature_group = np.array([group_names.index(g) for g in groups], dtype=np.int64)
+    return group_names, feature_group
+
+
+def display_feature(name: str) -> str:
+    """特征显示名：训练集题材拆分残留的括号 / 引号去掉（genre_['Action → genre_Action）"""
+    if name.startswith("genre_"):
+        return "genre_" + name[len("genre_"):].strip("[]'\" ")
+    return name
+
+
+def _r2(y: np.ndarray, pred: np.ndarray) -> float:
+    return float(1 - np.sum((y - pred) ** 2) / np.sum((y - y.mean()) ** 2))
+
+
+def _forest_predict(forest: FlatForest, leaves: np.ndarray) -> np.ndarray:
+    # 与 FlatForest.predict 相同：按树的顺序逐棵累加后除以树数
+    total = np.zeros(leaves.shape[1], dtype=np.float64)
+    for row in forest.value[leaves]:
+        total += row
+    return total / leaves.shape[0]
+
+
+# ---------------- 工作进程 ----------------
+
+_worker_state = {}
+
+
+def _init_worker(forest, X, y, leaves, masks, feature_group):
+    # forest 为目录时在工作进程内重新内存映射，避免把整片数组复制进每个进程
+    if isinstance(forest, str):
+        forest = FlatForest.load(forest)
+    _worker_state.update(forest=forest, X=X, y=y, leaves=leaves, masks=masks, feature_group=feature_group)
+
+
+def _permuted_score(group: int, repeat: int) -> tuple:
+    """置换一组特征（同一随机行序整块置换）后的 R²，返回 (group, repeat, R², 重新下降的对数)"""
+    state = _worker_state
+    forest, X, y = state["forest"], state["X"], state["y"]
+    columns = np.flatnonzero(state["feature_group"] == group)
+    rng = np.random.default_rng([RANDOM_STATE, group, repeat])
+    X_perm = X.copy()
+    X_perm[:, columns] = X[rng.permutation(len(X))][:, columns]
+
+    trees, samples = np.nonzero(state["masks"] & np.uint64(1 << group))
+    leaves = state["leaves"].copy()
+    leaves[trees, samples] = forest.apply_pairs(X_perm, trees, samples)
+    return group, repeat, _r2(y, _forest_predict(forest, leaves)), int(len(trees))
+
+
+def permutation_importance(forest: FlatForest, X: np.ndarray, y: np.ndarray, feature_names: List[str],
+                           n_repeats: int = N_REPEATS, n_jobs: Optional[int] = None,
+                           forest_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    按特征组的置换重要性：R²（原始）− R²（置换后），对 n_repeats 次置换取均值与标准差。
+
+    :param forest_path: forest 的目录（来自磁盘时传入，工作进程据此内存映射）
+    :param n_jobs: 工作进程数，默认 CPU 核数
+    :return: 列 feature / importance_mean / importance_std / recomputed（重新下降的 (树, 样本) 对所占比例），
+             按 importance_mean 降序
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    group_names, feature_group = feature_groups(feature_names)
+    leaves = forest.apply(X)
+    masks = forest.path_groups(X, feature_group)
+    baseline = _r2(y, _forest_predict(forest, leaves))
+
+    tasks = [(g, r) for g in range(len(group_names)) for r in range(n_repeats)]
+    scores = np.zeros((len(group_names), n_repeats))
+    recomputed = np.zeros(len(group_names))
+    initargs = (forest_path or forest, X, y, leaves, masks, feature_group)
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=initargs) as pool:
+        for group, repeat, score, n_pairs in pool.map(_permuted_score, *zip(*tasks)):
+            scores[group, repeat] = score
+            recomputed[group] = n_pairs / leaves.size
+
+    drops = baseline - scores
+    table = pd.DataFrame({
+        "feature": group_names,
+        "importance_mean": drops.mean(axis=1),
+        "importance_std": drops.std(axis=1),
+        "recomputed": recomputed,
+    })
+    return table.sort_values("importance_mean", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def load_or_compute_importance(artifact: ModelArtifact, root: str = ARTIFACT_DIR,
+                               n_repeats: int = N_REPEATS, n_jobs: Optional[int] = None) -> pd.DataFrame:
+    """
+    模型在其训练数据上的置换重要性（R² 按模型的训练目标计算，log1p 目标即在对数尺度上）；
+    结果保存在 root/<version>/importance.json，同一版本只计算一次。
+    """
+    path = os.path.join(root, artifact.version)
+    cache_path = os.path.join(path, IMPORTANCE_FILE)
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("n_repeats") == n_repeats:
+            return pd.DataFrame(cached["importance"])
+
+    train_df = pd.read_csv(artifact.metadata["train_path"])
+    train_df = train_df[trained_rows(train_df)]
+    X = artifact.features(train_df, schema=TRAIN_SCHEMA)
+    y = encode_target(pd.to_numeric(train_df["popularity"]).to_numpy(dtype=np.float64), artifact.target)
+    forest = artifact.forest
+    forest_path = os.path.join(path, "forest")
+    table = permutation_importance(forest, X, y, artifact.metadata["feature_names"], n_repeats, n_jobs,
+                                   forest_path=forest_path if os.path.isdir(forest_path) else None)
+    if os.path.isdir(path):
+        tmp = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"n_repeats": n_repeats, "importance": table.to_dict(orient="list")}, f)
+        os.replace(tmp, cache_path)
+    return table
+
+
+def prediction_contributions(artifact: ModelArtifact, df: pd.DataFrame, schema: dict) -> tuple:
+    """
+    每行预测的路径贡献（按显示名合并：训练集中同一题材可能对应多个 one-hot 列）。
+    贡献在模型的训练目标尺度上：log1p 目标时 bias + Σ 贡献 = log1p(预测热度)。
+
+    :return: (bias, contributions)  contributions 为 DataFrame（行与 df 对应，列为特征显示名）
+    """
+    bias, contrib = artifact.forest.contributions(artifact.features(df, schema))
+    names = [display_feature(n) for n in artifact.metadata["feature_names"]]
+    table = pd.DataFrame(contrib, columns=names).T.groupby(level=0, sort=False).sum().T
+    return bias, table
+
+
+def top_drivers(contributions: pd.DataFrame, n: int = 3, fmt: str = "{:+,.0f}") -> pd.Series:
+    """
+    每行贡献绝对值最大的 n 个特征，格式如 "studio_popularity +12,345 · genre_Action -1,234"
+
+    :param fmt: 贡献值的格式（log1p 目标的贡献在对数尺度上，需保留小数）
+    """
+    values = contributions.to_numpy()
+    order = np.argsort(-np.abs(values), axis=1, kind="stable")[:, :n]
+    names = contributions.columns.to_numpy()
+    return pd.Series([
+        " · ".join(f"{names[j]} {fmt.format(values[i, j])}" for j in row)
+        for i, row in enumerate(order)
+    ], index=contributions.index)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute permutation importance for the latest model artifact")
+    parser.add_argument("--root", default=ARTIFACT_DIR)
+    parser.add_argument("--repeats", type=int, default=N_REPEATS)
+    parser.add_argument("--jobs", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    artifact = load_artifact(args.root)
+    table = load_or_compute_importance(artifact, args.root, args.repeats, args.jobs)
+    print(f"模型版本 {artifact.version}")
+    print(table.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,278 @@
+# model/feature_store.py
+"""
+无泄漏的按时间（as-of）特征：工作室与题材的历史热度统计。
+
+notebook 的 studio_popularity 是对整个训练集求均值，作品自身以及之后播出的作品都会泄漏进它的特征。
+这里每个作品只使用 **它所在季度之前** 播出的作品（同一季度的作品互相不可见）：
+
+    studio_hist_mean / _count / _ewm      主工作室：历史平均热度、历史作品数、按季度指数衰减加权的平均热度
+    genre_hist_mean / _max / _count / _ewm 题材：所有题材合并的历史平均热度、各题材历史均值的最大值、
+                                           合并作品数（一部作品按题材数重复计数）、衰减加权平均热度
+
+没有历史的作品统计为 NaN（mean / ewm）与 0（count）。
+
+实现（全程向量化，没有逐行遍历历史的 Python 循环）：
+- 先聚合为 (分组, 季度) 的 总和 / 作品数，按 (分组, 季度) 排序后做分组累计和
+- 查询 (分组, 季度 t) 时在合并键 分组编码 × STRIDE + 季度 上 searchsorted，
+  取该组季度 < t 的最后一行 —— 即 as-of 连接
+- 衰减加权平均 Σx_s·w^(t−s) / Σw^(t−s) 中 w^t 约去，只需累计 x_s·w^(−s) 与 w^(−s)；
+  s 以最早季度为零点，十年约 40 个季度，不会溢出
+
+物化：materialize 对一张表一次算出全部列（带 id 与 season_index，可直接按 id / 季度 join），
+load_or_materialize 按训练数据内容哈希缓存到 .cache/feature_store/。
+
+命令行（在仓库根目录执行），比较整表均值与 as-of 特征的训练 / 验证 R²：
+    PYTHONPATH=src python -m model.feature_store
+"""
+import argparse
+import ast
+import hashlib
+import os
+import re
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from model.features import (
+    NUMERIC_FEATURES, SEASON_ORDER, TRAIN_SCHEMA, FeatureBuilder, _column, _map_unique, build_features,
+    genre_lists, season_index, studio_column,
+)
+from store.studio_dimension import STUDIO_SEPARATOR
+
+CACHE_DIR = ".cache/feature_store"
+# 存储格式版本：统计口径或列变化时递增，旧缓存随之失效
+STORE_VERSION = 2
+# 衰减加权的半衰期（季度数）
+HALF_LIFE_SEASONS = 8
+
+STUDIO_FEATURES = ["studio_hist_mean", "studio_hist_count", "studio_hist_ewm"]
+GENRE_FEATURES = ["genre_hist_mean", "genre_hist_max", "genre_hist_count", "genre_hist_ewm"]
+STORE_FEATURES = STUDIO_FEATURES + GENRE_FEATURES
+
+
+class GroupHistory:
+    """
+    一类分组（工作室 / 题材）的累计历史，asof 查询某分组在某季度之前的统计。
+
+    用法：
+        history = GroupHistory().fit(groups, seasons, popularity)
+        stats = history.asof(query_groups, query_seasons)
+    """
+
+    def __init__(self, half_life: float = HALF_LIFE_SEASONS):
+        self.half_life = half_life
+        self.groups: Optional[pd.Index] = None
+
+    def fit(self, groups, seasons: np.ndarray, values: np.ndarray) -> "GroupHistory":
+        frame = pd.DataFrame({"group": np.asarray(groups, dtype=object), "season": seasons, "value": values})
+        frame = frame[frame["group"].notna() & (frame["group"] != "") & frame["value"].notna() & (frame["season"] >= 0)]
+        self.origin = int(frame["season"].min()) if len(frame) else 0
+        # STRIDE 大于季度跨度，查询时季度截断到 STRIDE - 1（= 之后所有季度都能看到全部历史）
+        self.stride = int(frame["season"].max()) - self.origin + 2 if len(frame) else 2
+        decay = 0.5 ** (1.0 / self.half_life)
+        weight = decay ** -(frame["season"].to_numpy(dtype=np.float64) - self.origin)
+        frame = frame.assign(weight=weight, weighted=frame["value"].to_numpy(dtype=np.float64) * weight)
+
+        agg = (
+            frame.groupby(["group", "season"], sort=True)
+                 .agg(total=("value", "sum"), count=("value", "size"),
+                      weighted=("weighted", "sum"), weight=("weight", "sum"))
+                 .reset_index()
+        )
+        self.groups = pd.Index(agg["group"].unique())
+        codes = self.groups.get_indexer(agg["group"])
+        self.keys = codes.astype(np.int64) * self.stride + (agg["season"].to_numpy(dtype=np.int64) - self.origin)
+        cumulative = agg.groupby("group", sort=False)[["total", "count", "weighted", "weight"]].cumsum()
+        self.cum = {name: cumulative[name].to_numpy(dtype=np.float64) for name in cumulative.columns}
+        return self
+
+    def asof(self, groups, seasons: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        各查询（分组, 季度）在该季度之前的 total / count / weighted / weight 累计值（没有历史为 0）。
+        """
+        if self.groups is None:
+            raise RuntimeError("GroupHistory 尚未 fit")
+        codes = self.groups.get_indexer(pd.Index(np.asarray(groups, dtype=object)))
+        offset = np.clip(np.asarray(seasons, dtype=np.int64) - self.origin, 0, self.stride - 1)
+        query = codes.astype(np.int64) * self.stride + offset
+        # side='left'：只取季度严格早于查询季度的行
+        idx = np.searchsorted(self.keys, query, side="left") - 1
+        safe = np.maximum(idx, 0)
+        found = (codes >= 0) & (idx >= 0) & (self.keys[safe] // self.stride == codes)
+        return {name: np.where(found, values[safe], 0.0) for name, values in self.cum.items()}
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    out = np.full(len(numerator), np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def clean_genres(genres: pd.Series) -> pd.Series:
+    """题材列表去掉训练集 "['A|B']" 格式拆分后残留的括号和引号"""
+    return genre_lists(genres).map(lambda items: [g.strip("[]'\" ") for g in items if g.strip("[]'\" ")])
+
+
+def _studio_members(studio) -> list:
+    """
+    工作室字符串的候选名称：原字符串本身，以及列表字面量 / 逗号分隔形式拆出的各个工作室。
+    逗号按 STUDIO_SEPARATOR 拆分，"Yamamura Animation, Inc." 这类名称不会拆出 "Inc."。
+    """
+    if not isinstance(studio, str) or not studio.strip():
+        return []
+    studio = studio.strip()
+    members = [studio]
+    if studio.startswith("[") and studio.endswith("]"):
+        try:
+            parsed = ast.literal_eval(studio)
+            if isinstance(parsed, list):
+                members += [str(s).strip() for s in parsed if str(s).strip()]
+        except Exception:
+            pass
+    elif "," in studio:
+        members += [s.strip() for s in re.split(STUDIO_SEPARATOR, studio) if s.strip()]
+    # 去重并保持顺序：不可拆分的名称拆出来与原字符串相同
+    return list(dict.fromkeys(members))
+
+
+class FeatureStore:
+    """
+    用法：
+        store = FeatureStore().fit(train_df)
+        features = store.materialize(train_df)                                 # 每个作品只看之前的季度
+        candidate_features = store.materialize(candidate_df, CANDIDATE_SCHEMA, season="WINTER 2026")
+    """
+
+    def __init__(self, half_life: float = HALF_LIFE_SEASONS):
+        self.studios = GroupHistory(half_life)
+        self.genres = GroupHistory(half_life)
+
+    def fit(self, train_df: pd.DataFrame, schema: dict = TRAIN_SCHEMA) -> "FeatureStore":
+        seasons = season_index(train_df)
+        popularity = pd.to_numeric(_column(train_df, "popularity", np.nan), errors="coerce").to_numpy(dtype=np.float64)
+        self.studios.fit(studio_column(train_df, schema).to_numpy(dtype=object), seasons, popularity)
+        exploded = pd.DataFrame({"genre": clean_genres(_column(train_df, schema["genres"], "")).to_numpy(),
+                                 "season": seasons, "popularity": popularity}).explode("genre")
+        self.genres.fit(exploded["genre"].to_numpy(dtype=object), exploded["season"].to_numpy(dtype=np.int64),
+                        exploded["popularity"].to_numpy(dtype=np.float64))
+        return self
+
+    def _studio_features(self, studios: pd.Series, seasons: np.ndarray) -> pd.DataFrame:
+        # 每个候选名称分别查询，取历史均值最高的一个（与 lookup_studio_popularity 对工作室列表取最大值一致）
+        members = pd.DataFrame({"studio": _map_unique(studios, _studio_members).to_numpy(), "season": seasons})
+        members = members.explode("studio").dropna(subset=["studio"])
+        stats = self.studios.asof(members["studio"].to_numpy(dtype=object), members["season"].to_numpy(dtype=np.int64))
+        members = members.assign(
+            studio_hist_mean=_ratio(stats["total"], stats["count"]),
+            studio_hist_count=stats["count"],
+            studio_hist_ewm=_ratio(stats["weighted"], stats["weight"]),
+        )
+        best = members.sort_values("studio_hist_mean", ascending=False, kind="stable", na_position="last")
+        best = best[~best.index.duplicated(keep="first")]
+        out = best.reindex(range(len(studios)))[STUDIO_FEATURES]
+        out["studio_hist_count"] = out["studio_hist_count"].fillna(0)
+        return out
+
+    def _genre_features(self, genres: pd.Series, seasons: np.ndarray) -> pd.DataFrame:
+        exploded = pd.DataFrame({"genre": genres.to_numpy(), "season": seasons}).explode("genre")
+        exploded = exploded.dropna(subset=["genre"])
+        stats = self.genres.asof(exploded["genre"].to_numpy(dtype=object), exploded["season"].to_numpy(dtype=np.int64))
+        exploded = exploded.assign(mean=_ratio(stats["total"], stats["count"]), **stats)
+        per_title = exploded.groupby(level=0).agg(
+            total=("total", "sum"), count=("count", "sum"), weighted=("weighted", "sum"),
+            weight=("weight", "sum"), genre_hist_max=("mean", "max"),
+        ).reindex(range(len(genres)))
+        per_title[["total", "count", "weighted", "weight"]] = per_title[["total", "count", "weighted", "weight"]].fillna(0)
+        return pd.DataFrame({
+            "genre_hist_mean": _ratio(per_title["total"].to_numpy(), per_title["count"].to_numpy()),
+            "genre_hist_max": per_title["genre_hist_max"].to_numpy(),
+            "genre_hist_count": per_title["count"].to_numpy(),
+            "genre_hist_ewm": _ratio(per_title["weighted"].to_numpy(), per_title["weight"].to_numpy()),
+        })
+
+    def materialize(self, df: pd.DataFrame, schema: dict = TRAIN_SCHEMA, season: Optional[str] = None) -> pd.DataFrame:
+        """
+        一次算出 df 所有行的 as-of 特征（行顺序与 df 一致）。
+
+        :param season: 形如 "WINTER 2026"；df 没有 season / seasonyear 列时（候选集）所有行都按这一季度查询
+        :return: 列 id / season_index + STORE_FEATURES
+        """
+        if season is not None:
+            name, year = season.split()
+            seasons = np.full(len(df), int(year) * 4 + SEASON_ORDER[name.upper()], dtype=np.int64)
+        else:
+            seasons = season_index(df)
+        studio = self._studio_features(studio_column(df, schema).reset_index(drop=True), seasons)
+        genre = self._genre_features(clean_genres(_column(df, schema["genres"], "")).reset_index(drop=True), seasons)
+        out = pd.concat([studio.reset_index(drop=True), genre], axis=1)
+        out.insert(0, "season_index", seasons)
+        out.insert(0, "id", _column(df, "id", np.nan).to_numpy())
+        return out
+
+
+def load_or_materialize(train_path: str, cache_dir: str = CACHE_DIR,
+                        half_life: float = HALF_LIFE_SEASONS) -> pd.DataFrame:
+    """训练集的 as-of 特征：按 训练数据内容 + STORE_VERSION + 半衰期 缓存，数据不变时直接读取"""
+    with open(train_path, "rb") as f:
+        h = hashlib.sha256(f.read())
+    h.update(f"{STORE_VERSION}:{half_life}".encode("utf-8"))
+    path = os.path.join(cache_dir, f"{h.hexdigest()[:16]}.csv")
+    if os.path.exists(path):
+        return pd.read_csv(path)
+    train_df = pd.read_csv(train_path)
+    features = FeatureStore(half_life).fit(train_df).materialize(train_df)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    features.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return features
+
+
+def asof_training_matrix(train_df: pd.DataFrame, features: pd.DataFrame):
+    """
+    用 as-of 特征替换 FeatureBuilder 中整表均值的 studio_popularity，并追加其余历史统计列。
+
+    :param features: materialize / load_or_materialize 的结果，按 id join
+    :return: (X, y, feature_names)
+    """
+    builder = FeatureBuilder().fit(train_df)
+    X, y = builder.training_matrix(train_df)
+    keep = pd.to_numeric(train_df["popularity"], errors="coerce").notna().to_numpy()
+    joined = train_df.loc[keep, ["id"]].merge(features, on="id", how="left", validate="one_to_one")
+    store = joined[STORE_FEATURES].to_numpy(dtype=np.float64)
+    X = X.copy()
+    X[:, NUMERIC_FEATURES.index("studio_popularity")] = np.nan_to_num(store[:, 0], nan=0.0)
+    # 没有历史的均值填 0（与 notebook 查不到工作室时的取值一致），由 *_count 列区分
+    X = np.hstack([X, np.nan_to_num(store[:, 1:], nan=0.0)])
+    return X, y, builder.feature_names + STORE_FEATURES[1:]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Materialize as-of studio/genre history features and compare R²")
+    parser.add_argument("--train", default="public/data/anilist_anime_2016_2025_cleaned.csv")
+    parser.add_argument("--half-life", type=float, default=HALF_LIFE_SEASONS)
+    args = parser.parse_args(argv)
+
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import r2_score
+    from sklearn.model_selection import train_test_split
+    from model.artifacts import DEFAULT_PARAMS, RANDOM_STATE
+
+    start = time.perf_counter()
+    features = load_or_materialize(args.train, half_life=args.half_life)
+    print(f"as-of 特征 {features.shape}，耗时 {time.perf_counter() - start:.2f}s")
+
+    train_df = pd.read_csv(args.train)
+    _, X_leaky, y, _ = build_features(train_df)
+    X_asof, _, _ = asof_training_matrix(train_df, features)
+    for name, X in [("整表均值（notebook）", X_leaky), ("as-of 历史", X_asof)]:
+        X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=0.2, random_state=RANDOM_STATE)
+        model = RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=-1, **DEFAULT_PARAMS).fit(X_fit, y_fit)
+        print(f"{name}：训练集 R² {r2_score(y_fit, model.predict(X_fit)):.4f}  "
+              f"验证集 R² {r2_score(y_val, model.predict(X_val)):.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,574 @@
+# model/features.py
+"""
+爆款预测的特征构建（与 DataAnalysisPart/anime_data_process.ipynb 中的特征工程逐列一致）。
+
+特征顺序：
+    is_sequel, studio_popularity, format, episodes, duration, average_score, 题材 one-hot（按题材名排序）
+    [, 标签哈希桶 tag_hash_0..dim-1[, tag_te_mean, tag_te_max]]   （可选，FeatureBuilder(tag_dim=...)）
+
+与 notebook 的逐行 iterrows 不同，这里所有列都一次性向量化计算：
+- 工作室热度：groupby 均值，查表只对去重后的工作室字符串做一次
+- 题材：去重后的 genres 字符串只解析一次，再拼成稀疏 0/1 矩阵（GenreBinarizer）
+- 播出形式：分类编码查表
+- 标签（可选）：哈希到固定维度的桶（TagHasher），不拟合词表；去重后的标签各只哈希一次
+"""
+import ast
+import re
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# 播出形式编码（训练集）；候选新番额外把 TV_SHORT 视为 TV
+FORMAT_CODES = {"TV": 1, "MOVIE": 2, "OVA": 3, "ONA": 4, "SPECIAL": 5}
+CANDIDATE_FORMAT_CODES = {**FORMAT_CODES, "TV_SHORT": 1}
+
+# 续作判断关键词（标题小写后做子串匹配；注意 '2' 会匹配任意含数字 2 的标题，与 notebook 保持一致）
+SEQUEL_KEYWORDS = ["2nd", "3rd", "2", "second", "third", "season 2", "season 3",
+                   "part 2", "part 3", "sequel", "続編", "第2期", "第3期"]
+
+# 特征定义的版本：特征顺序或编码规则变化时递增，旧的模型产物随之失效
+FEATURE_VERSION = 1
+
+SEASON_ORDER = {"WINTER": 0, "SPRING": 1, "SUMMER": 2, "FALL": 3}
+
+NUMERIC_FEATURES = ["is_sequel", "studio_popularity", "format", "episodes", "duration", "average_score"]
+
+# 两份数据的列名与少量规则不同：训练集来自清洗后的 2016–2025 数据，候选集来自 2026 冬季新番
+# - studio_fallback: 主工作室列为空字符串时改用的列
+# - fill_episodes: 集数缺失/为 0 时，有时长视为 1 集
+TRAIN_SCHEMA = {
+    "title": "title_romaji",
+    "studio": "mainstudio",
+    "studio_fallback": None,
+    "format": "format",
+    "episodes": "episodes",
+    "duration": "duration",
+    "score": "averagescore",
+    "genres": "genres",
+    "tags": "tags",
+    "format_codes": FORMAT_CODES,
+    "fill_episodes": False,
+}
+CANDIDATE_SCHEMA = {
+    "title": "title",
+    "studio": "studio",
+    "studio_fallback": "studio_list",
+    "format": "format",
+    "episodes": "episodes",
+    "duration": "durationmin",
+    "score": "average_score",
+    "genres": "genres",
+    # 当前候选集没有 tags 列：使用标签特征的模型给它打分时 ModelArtifact.features 会报错
+    "tags": "tags",
+    "format_codes": CANDIDATE_FORMAT_CODES,
+    "fill_episodes": True,
+}
+
+# 标签目标编码：桶内作品数达到 TAG_MIN_COUNT 才视为高频；编码向全局均值收缩，收缩强度相当于 TAG_SMOOTHING 部作品
+TAG_MIN_COUNT = 20
+TAG_SMOOTHING = 10.0
+TAG_FOLDS = 5
+
+
+# ---------------- 单值解析（与 notebook 中的同名函数行为一致） ----------------
+
+def extract_genres(genre_str) -> List[str]:
+    """
+    解析 genres 字段为题材列表。
+
+    - 含 '|' 时直接按 '|' 拆分（训练集形如 "['Action|Drama']"，拆分结果会带上括号和引号，与 notebook 一致）
+    - 否则形如 "['Action', 'Drama']" 时按 Python 字面量解析
+    - 其余情况返回空列表
+    """
+    if not isinstance(genre_str, str):
+        return []
+    if "|" in genre_str:
+        return [g.strip() for g in genre_str.split("|") if g.strip()]
+    if "[" in genre_str and "]" in genre_str:
+        try:
+            genres = ast.literal_eval(genre_str)
+        except Exception:
+            return []
+        if isinstance(genres, list):
+            return [str(g).strip() for g in genres if str(g).strip()]
+    return []
+
+
+def lookup_studio_popularity(studio, studio_popularity: Dict[str, float]) -> float:
+    """
+    查询工作室平均热度：名称去首尾空格后查表；形如 "['A', 'B']" 的列表取其中最高的热度；查不到为 0。
+    """
+    if studio is None or (not isinstance(studio, str) and pd.isna(studio)):
+        return 0
+    studio = str(studio).strip()
+    if "[" in studio and "]" in studio:
+        try:
+            studios = ast.literal_eval(studio)
+            if isinstance(studios, list):
+                return max([studio_popularity.get(s.strip(), 0) for s in studios if s.strip()])
+        except Exception:
+            # 解析失败、列表为空或元素不是字符串时，退回按原字符串查表
+            return studio_popularity.get(studio, 0)
+    return studio_popularity.get(studio, 0)
+
+
+# ---------------- 列级向量化 ----------------
+
+def _column(df: pd.DataFrame, name: Optional[str], default) -> pd.Series:
+    """取列；列不存在时返回全为 default 的列（对应 notebook 中 row.get(name, default) 的默认值）"""
+    if name is not None and name in df.columns:
+        return df[name]
+    return pd.Series(default, index=df.index, dtype=object)
+
+
+def _map_unique(values: pd.Series, func) -> pd.Series:
+    """对去重后的取值调用 func 再映射回整列（genres / 工作室字符串重复度很高）"""
+    mapping = {v: func(v) for v in pd.unique(values)}
+    return values.map(mapping)
+
+
+def studio_column(df: pd.DataFrame, schema: dict = TRAIN_SCHEMA) -> pd.Series:
+    """主工作室列；notebook 中为 `row.get('studio') or row.get('studio_list')`：只有空字符串才会取备用列"""
+    studios = _column(df, schema["studio"], "")
+    if schema["studio_fallback"]:
+        fallback = _column(df, schema["studio_fallback"], "")
+        studios = studios.where(studios != "", fallback)
+    return studios
+
+
+def season_index(df: pd.DataFrame) -> np.ndarray:
+    """季度序号 seasonyear * 4 + 季节（WINTER→FALL），缺失为 -1"""
+    year = pd.to_numeric(_column(df, "seasonyear", np.nan), errors="coerce")
+    index = year * 4 + _column(df, "season", None).map(SEASON_ORDER)
+    return index.fillna(-1).to_numpy(dtype=np.int64)
+
+
+def genre_lists(genres: pd.Series) -> pd.Series:
+    """整列解析题材，返回每行一个 list"""
+    return _map_unique(genres, extract_genres)
+
+
+def tag_lists(tags: pd.Series) -> pd.Series:
+    """整列解析标签（形如 "Isekai|Male Protagonist"），返回每行一个 list"""
+    return _map_unique(tags, lambda t: [x.strip() for x in t.split("|") if x.strip()] if isinstance(t, str) else [])
+
+
+def sequel_flags(titles: pd.Series) -> np.ndarray:
+    """标题是否命中续作关键词（0/1）"""
+    pattern = "|".join(re.escape(k) for k in SEQUEL_KEYWORDS)
+    lowered = titles.where(titles.isna(), titles.astype(str)).str.lower()
+    return lowered.str.contains(pattern, regex=True, na=False).to_numpy(dtype=np.int64)
+
+
+def compute_studio_popularity(studios: pd.Series, popularity: pd.Series) -> Dict[str, float]:
+    """
+    各工作室（原始 mainstudio 字符串）的平均 popularity，忽略工作室为空或热度缺失的行。
+    """
+    valid = studios.notna() & (studios != "") & popularity.notna()
+    values = pd.to_numeric(popularity[valid])
+    # 按 np.mean 逐组求均值（与 notebook 的浮点结果逐位一致）
+    grouped = values.groupby(studios[valid].to_numpy(), sort=False)
+    return {studio: float(np.mean(vals.to_numpy())) for studio, vals in grouped}
+
+
+def compute_studio_stats(studios: pd.Series, popularity: pd.Series) -> Dict[str, List[float]]:
+    """
+    各工作室的 [热度总和, 作品数]（增量更新 studio_popularity 用），过滤规则与 compute_studio_popularity 相同。
+    """
+    valid = studios.notna() & (studios != "") & popularity.notna()
+    values = pd.to_numeric(popularity[valid])
+    grouped = values.groupby(studios[valid].to_numpy(), sort=False).agg(["sum", "count"])
+    return {studio: [float(row["sum"]), int(row["count"])] for studio, row in grouped.iterrows()}
+
+
+def studio_popularity_feature(studios: pd.Series, studio_popularity: Dict[str, float]) -> np.ndarray:
+    return _map_unique(studios, lambda s: lookup_studio_popularity(s, studio_popularity)).to_numpy(dtype=np.float64)
+
+
+def format_codes(formats: pd.Series, codes: Dict[str, int]) -> np.ndarray:
+    """播出形式编码：去首尾空格后查表，未知（含缺失）为 0"""
+    as_str = formats.map(str).str.strip()
+    return as_str.map(codes).fillna(0).to_numpy(dtype=np.float64)
+
+
+def _numeric_or_zero(values: pd.Series) -> np.ndarray:
+    return pd.to_numeric(values, errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+
+# ---------------- 题材稀疏编码 ----------------
+
+class GenreBinarizer:
+    """
+    多标签 0/1 编码（不依赖 sklearn）：classes_ 为训练集中出现过的全部题材（排序），
+    transform 输出 CSR 矩阵，未见过的题材忽略。
+    """
+
+    def __init__(self, classes: Optional[List[str]] = None):
+        self.classes_ = None if classes is None else np.asarray(classes, dtype=object)
+
+    def fit(self, lists: pd.Series) -> "GenreBinarizer":
+        self.classes_ = np.asarray(sorted(set(lists.explode().dropna())), dtype=object)
+        return self
+
+    def transform(self, lists: pd.Series) -> sp.csr_matrix:
+        if self.classes_ is None:
+            raise RuntimeError("GenreBinarizer 尚未 fit")
+        exploded = lists.reset_index(drop=True).explode().dropna()
+        cols = pd.Index(self.classes_).get_indexer(exploded.to_numpy())
+        keep = cols >= 0
+        rows = exploded.index.to_numpy()[keep]
+        matrix = sp.csr_matrix(
+            (np.ones(int(keep.sum()), dtype=np.float64), (rows, cols[keep])),
+            shape=(len(lists), len(self.classes_)),
+        )
+        # 同一作品重复的题材只记一次
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return matrix
+
+
+# ---------------- 标签哈希编码 ----------------
+
+class TagHasher:
+    """
+    标签的哈希编码（hashing trick）：不拟合词表，每个标签按 crc32 落入 dim 个桶之一，输出 CSR 0/1 矩阵。
+    不同标签可能落入同一个桶（碰撞），dim 越大碰撞越少；维度固定，标签词表增长时内存不变。
+
+    encoding=True 时另加两列目标编码：按桶累计 [log1p(热度) 总和, 作品数]，作品数 ≥ min_count 的桶视为高频，
+    编码为向全局均值收缩的桶均值；每部作品取其高频桶编码的均值与最大值（没有高频桶时取全局均值）。
+    训练行使用 out-of-fold 编码（encode_oof），避免自身热度泄漏进特征。
+    拟合状态只有 dim 个桶的统计量，同样与词表大小无关。
+    """
+
+    def __init__(self, dim: int, encoding: bool = False, min_count: int = TAG_MIN_COUNT,
+                 smoothing: float = TAG_SMOOTHING):
+        self.dim = int(dim)
+        self.encoding = encoding
+        self.min_count = min_count
+        self.smoothing = smoothing
+        # 目标编码的统计量：各桶 [总和, 作品数] 与全局 [总和, 作品数]
+        self.sums: Optional[np.ndarray] = None
+        self.counts: Optional[np.ndarray] = None
+        self.total = [0.0, 0]
+
+    @property
+    def feature_names(self) -> List[str]:
+        names = [f"tag_hash_{i}" for i in range(self.dim)]
+        return names + ["tag_te_mean", "tag_te_max"] if self.encoding else names
+
+    def pairs(self, lists: pd.Series):
+        """
+        每行标签所在的桶（同一行落入同一个桶的标签只记一次）。
+
+        :return: (rows, buckets)  按行号排序
+        """
+        exploded = lists.reset_index(drop=True).explode().dropna()
+        buckets = _map_unique(exploded, lambda t: zlib.crc32(t.encode("utf-8")) % self.dim)
+        keys = np.unique(exploded.index.to_numpy(dtype=np.int64) * self.dim + buckets.to_numpy(dtype=np.int64))
+        return keys // self.dim, keys % self.dim
+
+    def transform(self, lists: pd.Series) -> sp.csr_matrix:
+        rows, buckets = self.pairs(lists)
+        return sp.csr_matrix((np.ones(len(rows), dtype=np.float64), (rows, buckets)), shape=(len(lists), self.dim))
+
+    def fit(self, lists: pd.Series, popularity: pd.Series) -> "TagHasher":
+        self.sums, self.counts, self.total = np.zeros(self.dim), np.zeros(self.dim, dtype=np.int64), [0.0, 0]
+        return self.partial_fit(lists, popularity)
+
+    def partial_fit(self, lists: pd.Series, popularity: pd.Series) -> "TagHasher":
+        """累加目标编码的统计量（热度缺失的行忽略）"""
+        y = pd.to_numeric(popularity, errors="coerce").to_numpy(dtype=np.float64)
+        keep = ~np.isnan(y)
+        lists, y = lists[keep], np.log1p(y[keep])
+        rows, buckets = self.pairs(lists)
+        self.sums += np.bincount(buckets, weights=y[rows], minlength=self.dim)
+        self.counts += np.bincount(buckets, minlength=self.dim)
+        self.total = [self.total[0] + float(y.sum()), self.total[1] + int(len(y))]
+        return self
+
+    def update_targets(self, lists: pd.Series, old: np.ndarray, new: np.ndarray) -> "TagHasher":
+        """已累加过的行热度由 old 变为 new：只把差值计入桶与全局的总和，作品数不变"""
+        delta = np.log1p(np.asarray(new, dtype=np.float64)) - np.log1p(np.asarray(old, dtype=np.float64))
+        rows, buckets = self.pairs(lists)
+        self.sums += np.bincount(buckets, weights=delta[rows], minlength=self.dim)
+        self.total = [self.total[0] + float(delta.sum()), self.total[1]]
+        return self
+
+    def _aggregate(self, n: int, rows: np.ndarray, sums: np.ndarray, counts: np.ndarray, prior) -> tuple:
+        """
+        (行, 桶) 对的统计量 → 每行 [高频桶编码均值, 最大值]；prior 为标量或每个对的全局均值。
+
+        :return: (encodings, empty)  empty 标记没有高频桶的行（由调用方填入全局均值）
+        """
+        prior = np.broadcast_to(np.asarray(prior, dtype=np.float64), rows.shape)
+        frequent = counts >= self.min_count
+        rows, prior_f = rows[frequent], prior[frequent]
+        enc = (sums[frequent] + self.smoothing * prior_f) / (counts[frequent] + self.smoothing)
+        n_frequent = np.bincount(rows, minlength=n)
+        mean = np.bincount(rows, weights=enc, minlength=n) / np.maximum(n_frequent, 1)
+        top = np.full(n, -np.inf)
+        np.maximum.at(top, rows, enc)
+        return np.column_stack([mean, top]), n_frequent == 0
+
+    def _prior(self, total_sum: float, total_count) -> float:
+        return total_sum / total_count if total_count else 0.0
+
+    def encode(self, lists: pd.Series) -> np.ndarray:
+        """用拟合的统计量编码（候选集 / 验证集），返回 (n, 2)"""
+        if self.sums is None:
+            raise RuntimeError("TagHasher 尚未 fit")
+        rows, buckets = self.pairs(lists)
+        prior = self._prior(*self.total)
+        out, empty = self._aggregate(len(lists), rows, self.sums[buckets], self.counts[buckets], prior)
+        out[empty] = prior
+        return out
+
+    def encode_oof(self, lists: pd.Series, popularity: np.ndarray, n_folds: int = TAG_FOLDS,
+                   seed: int = 42) -> np.ndarray:
+        """
+        训练行的 out-of-fold 编码：行随机分成 n_folds 折，每折只用其余各折的统计量（包括全局均值）编码。
+        统计量只取自传入的行，返回 (n, 2)。
+        """
+        n = len(lists)
+        y = np.log1p(np.asarray(popularity, dtype=np.float64))
+        fold = np.random.default_rng(seed).permutation(n) % n_folds
+        rows, buckets = self.pairs(lists)
+        keys = fold[rows] * self.dim + buckets
+        fold_sums = np.bincount(keys, weights=y[rows], minlength=n_folds * self.dim)
+        fold_counts = np.bincount(keys, minlength=n_folds * self.dim)
+        sums = fold_sums.reshape(n_folds, self.dim).sum(axis=0)[buckets] - fold_sums[keys]
+        counts = fold_counts.reshape(n_folds, self.dim).sum(axis=0)[buckets] - fold_counts[keys]
+        rest = n - np.bincount(fold, minlength=n_folds)
+        row_prior = ((y.sum() - np.bincount(fold, weights=y, minlength=n_folds)) / np.maximum(rest, 1))[fold]
+        out, empty = self._aggregate(n, rows, sums, counts, row_prior[rows])
+        out[empty] = row_prior[empty, None]
+        return out
+
+    def to_state(self) -> dict:
+        state = {"dim": self.dim, "encoding": self.encoding}
+        if self.encoding:
+            state.update(min_count=self.min_count, smoothing=self.smoothing, sums=self.sums.tolist(),
+                         counts=self.counts.tolist(), total=list(self.total))
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> "TagHasher":
+        hasher = cls(state["dim"], state["encoding"], state.get("min_count", TAG_MIN_COUNT),
+                     state.get("smoothing", TAG_SMOOTHING))
+        if hasher.encoding:
+            hasher.sums = np.asarray(state["sums"], dtype=np.float64)
+            hasher.counts = np.asarray(state["counts"], dtype=np.int64)
+            hasher.total = list(state["total"])
+        return hasher
+
+
+# ---------------- 特征构建 ----------------
+
+class FeatureBuilder:
+    """
+    用法：
+        builder = FeatureBuilder().fit(train_df)
+        X, y = builder.training_matrix(train_df)
+        X_new = builder.transform(candidate_df, schema=CANDIDATE_SCHEMA)
+
+    fit 学到的状态只有两项：studio_popularity（工作室 → 平均热度）与题材词表。
+    studio_stats 记录每个工作室的 [热度总和, 作品数]，新一季数据到来时 partial_fit 只更新涉及的工作室。
+
+    tag_dim > 0 时追加 tag_dim 列标签哈希特征，tag_encoding=True 时再加两列标签目标编码（见 TagHasher）；
+    默认不启用，特征与 notebook 一致。
+    """
+
+    def __init__(self, tag_dim: int = 0, tag_encoding: bool = False):
+        self.studio_popularity: Optional[Dict[str, float]] = None
+        self.studio_stats: Optional[Dict[str, List[float]]] = None
+        self.genres = GenreBinarizer()
+        self.tags = TagHasher(tag_dim, tag_encoding) if tag_dim > 0 else None
+
+    @property
+    def config(self) -> dict:
+        """构造参数（重新训练时沿用）；未启用标签特征时为空"""
+        if self.tags is None:
+            return {}
+        return {"tag_dim": self.tags.dim, "tag_encoding": self.tags.encoding}
+
+    def fit(self, train_df: pd.DataFrame, schema: dict = TRAIN_SCHEMA) -> "FeatureBuilder":
+        studios = _column(train_df, schema["studio"], "")
+        popularity = _column(train_df, "popularity", 0)
+        self.studio_popularity = compute_studio_popularity(studios, popularity)
+        self.studio_stats = compute_studio_stats(studios, popularity)
+        # 题材词表取自全部训练行（包括热度缺失、不参与训练的行）
+        self.genres.fit(genre_lists(_column(train_df, schema["genres"], "")))
+        if self.tags is not None and self.tags.encoding:
+            self.tags.fit(tag_lists(_column(train_df, schema["tags"], "")), popularity)
+        return self
+
+    def partial_fit(self, new_df: pd.DataFrame, schema: dict = TRAIN_SCHEMA) -> List[str]:
+        """
+        用新增的训练行增量更新工作室热度（总和 / 作品数），只重算涉及的工作室。
+
+        题材词表不变（特征维度必须与已训练的树一致），新出现的题材在 transform 时被忽略；
+        标签没有词表，新标签直接哈希，目标编码的桶统计量一并累加。
+
+        :return: 热度被更新的工作室
+        :raises RuntimeError: 尚未 fit，或状态来自没有 studio_stats 的旧产物
+        """
+        if self.studio_stats is None:
+            raise RuntimeError("FeatureBuilder 没有 studio_stats，无法增量更新，请完整重新训练")
+        new_stats = compute_studio_stats(
+            _column(new_df, schema["studio"], ""), _column(new_df, "popularity", 0)
+        )
+        for studio, (total, count) in new_stats.items():
+            old_total, old_count = self.studio_stats.get(studio, (0.0, 0))
+            self.studio_stats[studio] = [old_total + total, old_count + count]
+            self.studio_popularity[studio] = (old_total + total) / (old_count + count)
+        if self.tags is not None and self.tags.encoding:
+            self.tags.partial_fit(tag_lists(_column(new_df, schema["tags"], "")), _column(new_df, "popularity", 0))
+        return list(new_stats)
+
+    def update_targets(self, changed_df: pd.DataFrame, old_popularity: np.ndarray,
+                       schema: dict = TRAIN_SCHEMA) -> List[str]:
+        """
+        已参与 fit / partial_fit 的行热度发生变化（AniList 每次同步都会更新）：把 新值 − 旧值 计入涉及的
+        工作室总和与标签目标编码的桶总和，作品数不变，结果与按新热度重新 fit 相同（浮点舍入以内）。
+        这些行的工作室 / 标签必须与累加时相同（由调用方用 state_columns 的哈希保证）。
+
+        :param old_popularity: 与 changed_df 行对应的、上次累加时的热度
+        :return: 热度被更新的工作室
+        """
+        if self.studio_stats is None:
+            raise RuntimeError("FeatureBuilder 没有 studio_stats，无法增量更新，请完整重新训练")
+        studios = _column(changed_df, schema["studio"], "")
+        new = pd.to_numeric(_column(changed_df, "popularity", 0), errors="coerce").to_numpy(dtype=np.float64)
+        old = np.asarray(old_popularity, dtype=np.float64)
+        delta = pd.Series(new - old, index=changed_df.index)
+        valid = studios.notna() & (studios != "")
+        updated = []
+        for studio, d in delta[valid].groupby(studios[valid].to_numpy(), sort=False).sum().items():
+            total, count = self.studio_stats[studio]
+            self.studio_stats[studio] = [total + float(d), count]
+            self.studio_popularity[studio] = (total + float(d)) / count
+            updated.append(studio)
+        if self.tags is not None and self.tags.encoding:
+            self.tags.update_targets(tag_lists(_column(changed_df, schema["tags"], "")), old, new)
+        return updated
+
+    def state_columns(self, schema: dict = TRAIN_SCHEMA) -> List[str]:
+        """除 popularity 外决定拟合状态的列：工作室，启用标签目标编码时还有标签"""
+        columns = [schema["studio"]]
+        if self.tags is not None and self.tags.encoding:
+            columns.append(schema["tags"])
+        return columns
+
+    def unseen_genres(self, df: pd.DataFrame, schema: dict = TRAIN_SCHEMA) -> List[str]:
+        """df 中出现、但不在题材词表里的题材（增量训练时无法使用，需要完整重新训练才能加入）"""
+        found = set(genre_lists(_column(df, schema["genres"], "")).explode().dropna())
+        return sorted(found - set(self.genres.classes_))
+
+    def to_state(self) -> dict:
+        """可 JSON 序列化的拟合状态（保存模型产物时使用）"""
+        if self.studio_popularity is None:
+            raise RuntimeError("FeatureBuilder 尚未 fit")
+        state = {
+            "feature_version": FEATURE_VERSION,
+            "studio_popularity": self.studio_popularity,
+            "studio_stats": self.studio_stats,
+            "genres": [str(g) for g in self.genres.classes_],
+        }
+        if self.tags is not None:
+            state["tags"] = self.tags.to_state()
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> "FeatureBuilder":
+        if state.get("feature_version") != FEATURE_VERSION:
+            raise ValueError(
+                f"特征版本不一致：产物为 {state.get('feature_version')}，当前代码为 {FEATURE_VERSION}，请重新训练"
+            )
+        builder = cls()
+        builder.studio_popularity = dict(state["studio_popularity"])
+        # 较早保存的产物没有 studio_stats，只能完整重新训练
+        stats = state.get("studio_stats")
+        builder.studio_stats = {k: list(v) for k, v in stats.items()} if stats is not None else None
+        builder.genres = GenreBinarizer(state["genres"])
+        if state.get("tags") is not None:
+            builder.tags = TagHasher.from_state(state["tags"])
+        return builder
+
+    @property
+    def feature_names(self) -> List[str]:
+        names = NUMERIC_FEATURES + [f"genre_{g}" for g in self.genres.classes_]
+        return names + self.tags.feature_names if self.tags is not None else names
+
+    def transform(self, df: pd.DataFrame, schema: dict = TRAIN_SCHEMA, sparse: bool = False):
+        """
+        构建特征矩阵（行顺序与 df 一致）。
+
+        :param schema: TRAIN_SCHEMA 或 CANDIDATE_SCHEMA
+        :param sparse: True 返回 CSR 矩阵，否则返回稠密 float64 数组（与 notebook 的 np.array 相同）；
+                       标签哈希维度较大时建议用稀疏矩阵
+        """
+        return self._transform(df, schema, sparse)
+
+    def _transform(self, df: pd.DataFrame, schema: dict, sparse: bool, tag_popularity: Optional[np.ndarray] = None):
+        # tag_popularity 不为 None 时标签目标编码取 out-of-fold 值（训练行）
+        if self.studio_popularity is None:
+            raise RuntimeError("FeatureBuilder 尚未 fit")
+
+        studios = studio_column(df, schema)
+        episodes = _numeric_or_zero(_column(df, schema["episodes"], 0))
+        duration = _numeric_or_zero(_column(df, schema["duration"], 0))
+        if schema["fill_episodes"]:
+            episodes = np.where(episodes == 0, (duration > 0).astype(np.float64), episodes)
+
+        numeric = np.column_stack([
+            sequel_flags(_column(df, schema["title"], "")),
+            studio_popularity_feature(studios, self.studio_popularity),
+            format_codes(_column(df, schema["format"], "TV"), schema["format_codes"]),
+            episodes,
+            duration,
+            _numeric_or_zero(_column(df, schema["score"], 0)),
+        ]).astype(np.float64)
+        blocks = [sp.csr_matrix(numeric), self.genres.transform(genre_lists(_column(df, schema["genres"], "")))]
+        if self.tags is not None:
+            tags = tag_lists(_column(df, schema.get("tags"), ""))
+            blocks.append(self.tags.transform(tags))
+            if self.tags.encoding:
+                encoded = self.tags.encode(tags) if tag_popularity is None else self.tags.encode_oof(tags, tag_popularity)
+                blocks.append(sp.csr_matrix(encoded))
+
+        if sparse:
+            return sp.hstack(blocks, format="csr")
+        return np.hstack([numeric] + [b.toarray() for b in blocks[1:]])
+
+    def training_matrix(self, train_df: pd.DataFrame, sparse: bool = False, out_of_fold: bool = True):
+        """
+        训练集特征与目标：跳过 popularity 缺失的行。
+
+        :param out_of_fold: 启用标签目标编码时，用 train_df 自身的 out-of-fold 编码（训练行）；
+                            False 时用拟合的统计量（留出的验证 / 新增行）
+        :return: (X, y)
+        """
+        popularity = pd.to_numeric(_column(train_df, "popularity", 0), errors="coerce")
+        keep = popularity.notna().to_numpy()
+        y = popularity.to_numpy(dtype=np.float64)[keep]
+        X = self._transform(train_df.loc[keep], TRAIN_SCHEMA, sparse, y if out_of_fold else None)
+        return X, y
+
+
+def build_features(train_df: pd.DataFrame, candidate_df: Optional[pd.DataFrame] = None, sparse: bool = False,
+                   **config):
+    """
+    一次构建训练与候选特征。
+
+    :param config: FeatureBuilder 的构造参数（tag_dim / tag_encoding）
+    :return: (builder, X_train, y_train, X_candidates)；未提供 candidate_df 时 X_candidates 为 None
+    """
+    builder = FeatureBuilder(**config).fit(train_df)
+    X_train, y_train = builder.training_matrix(train_df, sparse=sparse)
+    X_candidates = None
+    if candidate_df is not None:
+        X_candidates = builder.transform(candidate_df, schema=CANDIDATE_SCHEMA, sparse=sparse)
+    return builder, X_train, y_train, X_candidates
@@ -0,0 +1,207 @@
+# model/flat_forest.py
+"""
+把训练好的 RandomForestRegressor 拉平成连续的 NumPy 数组，推理时只依赖 NumPy（不导入 sklearn）。
+
+所有树的节点首尾相接存放，子节点编号为全局编号：
+    feature            int32    分裂特征（叶子为负数）
+    threshold          float64  分裂阈值：x <= threshold 走左子树
+    children           int32    形状 (n_nodes, 2)：[左子节点, 右子节点]，叶子为 -1
+    missing_go_to_left uint8    特征缺失（NaN）时是否走左子树
+    value              float64  节点预测值（回归树的叶子均值）
+    roots              int32    每棵树根节点的全局编号
+
+每个数组单独保存为 .npy，加载时可用 mmap_mode='r' 直接映射，多个服务进程共享同一份页缓存。
+
+与 sklearn 逐位一致的要点：
+- sklearn 预测前把 X 转成 float32，再与 float64 阈值比较，这里同样先转 float32
+- 森林的输出是各树预测按树的顺序逐棵累加后除以树数（n_jobs=1 时 sklearn 的累加顺序）
+"""
+import json
+import os
+
+import numpy as np
+
+ARRAYS = ["feature", "threshold", "children", "missing_go_to_left", "value", "roots"]
+FORMAT_VERSION = 1
+TREE_LEAF = -1
+
+
+def flatten_forest(model) -> dict:
+    """把 sklearn 森林回归模型转换成数组字典（只读取 estimators_ 的 tree_ 属性）"""
+    if getattr(model, "n_outputs_", 1) != 1:
+        raise ValueError("只支持单输出回归森林")
+    parts = {name: [] for name in ARRAYS if name != "roots"}
+    roots, offset, max_depth = [], 0, 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        children = np.stack([tree.children_left, tree.children_right], axis=1).astype(np.int64)
+        parts["feature"].append(tree.feature.astype(np.int32))
+        parts["threshold"].append(tree.threshold.astype(np.float64))
+        parts["children"].append(np.where(children == TREE_LEAF, TREE_LEAF, children + offset).astype(np.int32))
+        missing = getattr(tree, "missing_go_to_left", None)
+        parts["missing_go_to_left"].append(
+            np.zeros(n, dtype=np.uint8) if missing is None else np.asarray(missing, dtype=np.uint8)
+        )
+        parts["value"].append(tree.value[:, 0, 0].astype(np.float64))
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, int(tree.max_depth))
+
+    arrays = {name: np.ascontiguousarray(np.concatenate(chunks)) for name, chunks in parts.items()}
+    arrays["roots"] = np.asarray(roots, dtype=np.int32)
+    arrays["meta"] = {
+        "format_version": FORMAT_VERSION,
+        "n_trees": len(roots),
+        "n_nodes": offset,
+        "n_features": int(model.n_features_in_),
+        "max_depth": max_depth,
+    }
+    return arrays
+
+
+class FlatForest:
+    """纯 NumPy 的森林推理：所有树、一批样本同时逐层下降"""
+
+    def __init__(self, arrays: dict):
+        self.meta = arrays["meta"]
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def from_model(cls, model) -> "FlatForest":
+        return cls(flatten_forest(model))
+
+    @property
+    def n_features(self) -> int:
+        return self.meta["n_features"]
+
+    def save(self, path: str):
+        """保存到目录 path（每个数组一个 .npy + meta.json）"""
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "FlatForest":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"{path} 的格式版本 {meta.get('format_version')} 与当前代码 {FORMAT_VERSION} 不一致")
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in ARRAYS}
+        arrays["meta"] = meta
+        return cls(arrays)
+
+    def _check(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"特征数应为 {self.n_features}，实际为 {X.shape}")
+        return X
+
+    def _walk(self, X: np.ndarray, trees: np.ndarray, samples: np.ndarray, on_step=None) -> np.ndarray:
+        """
+        (树, 样本) 对同时逐层下降到叶子，返回每对落到的叶子（全局节点编号）。
+
+        :param on_step: 每下降一层调用 on_step(positions, current, child)：positions 为这一层仍在下降的对的下标，
+                        current / child 为它们的当前节点与下一节点
+        """
+        n_features = X.shape[1]
+        flat_x = X.ravel()
+        # node 为当前节点，row_offset 为该样本在 flat_x 中的起点
+        node = self.roots[trees].astype(np.int64)
+        row_offset = samples.astype(np.int64) * n_features
+        # 只对尚未到达叶子的位置继续下降，活跃集合逐层缩小
+        active = np.flatnonzero(self.feature[node] >= 0)
+        while active.size:
+            current = node[active]
+            x = flat_x[row_offset[active] + self.feature[current]]
+            go_right = ~(x <= self.threshold[current])
+            missing = np.isnan(x)
+            if missing.any():
+                go_right[missing] = self.missing_go_to_left[current[missing]] == 0
+            child = self.children[current, go_right.view(np.uint8)]
+            if on_step is not None:
+                on_step(active, current, child)
+            node[active] = child
+            active = active[self.feature[child] >= 0]
+        return node
+
+    def _all_pairs(self, n_samples: int):
+        # (树, 样本) 按树优先展平
+        trees = np.repeat(np.arange(len(self.roots)), n_samples)
+        samples = np.tile(np.arange(n_samples), len(self.roots))
+        return trees, samples
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """
+        每个样本在每棵树中落到的叶子（全局节点编号），形状 (n_trees, n_samples)。
+        """
+        X = self._check(X)
+        trees, samples = self._all_pairs(X.shape[0])
+        return self._walk(X, trees, samples).reshape(len(self.roots), X.shape[0])
+
+    def apply_pairs(self, X: np.ndarray, trees: np.ndarray, samples: np.ndarray) -> np.ndarray:
+        """只对给定的 (树, 样本) 对下降，返回各对落到的叶子"""
+        return self._walk(self._check(X), np.asarray(trees), np.asarray(samples))
+
+    def path_groups(self, X: np.ndarray, feature_group: np.ndarray) -> np.ndarray:
+        """
+        每个样本在每棵树的决策路径上用到了哪些特征组，按位记录（第 g 位为 1 表示路径上有分裂在第 g 组特征上），
+        形状 (n_trees, n_samples)，dtype uint64。
+
+        :param feature_group: 每个特征所属的组号（0–63）
+        """
+        X = self._check(X)
+        bits = np.left_shift(np.uint64(1), np.asarray(feature_group, dtype=np.uint64))
+        masks = np.zeros(len(self.roots) * X.shape[0], dtype=np.uint64)
+
+        def record(positions, current, child):
+            masks[positions] |= bits[self.feature[current]]
+
+        self._walk(X, *self._all_pairs(X.shape[0]), on_step=record)
+        return masks.reshape(len(self.roots), X.shape[0])
+
+    def contributions(self, X: np.ndarray):
+        """
+        决策路径分解：预测 = bias + Σ 各特征贡献。每经过一个分裂节点，子节点与当前节点的取值之差
+        记到该节点的分裂特征上，再对所有树取平均。
+
+        :return: (bias, contributions)  bias 形状 (n_samples,)，contributions 形状 (n_samples, n_features)
+        """
+        X = self._check(X)
+        n_samples, n_features = X.shape
+        trees, samples = self._all_pairs(n_samples)
+        total = np.zeros(n_samples * n_features, dtype=np.float64)
+
+        def record(positions, current, child):
+            delta = self.value[child] - self.value[current]
+            cells = samples[positions] * n_features + self.feature[current]
+            total[:] += np.bincount(cells, weights=delta, minlength=total.size)
+
+        self._walk(X, trees, samples, on_step=record)
+        n_trees = len(self.roots)
+        bias = np.full(n_samples, np.asarray(self.value[self.roots], dtype=np.float64).mean())
+        return bias, total.reshape(n_samples, n_features) / n_trees
+
+    def predict_per_tree(self, X: np.ndarray) -> np.ndarray:
+        """各树的预测，形状 (n_trees, n_samples)"""
+        return self.value[self.apply(X)]
+
+    def predict(self, X: np.ndarray, batch_size: int = 4096) -> np.ndarray:
+        """
+        森林预测（与 RandomForestRegressor.predict 逐位一致）。样本按 batch_size 分批，控制中间数组大小。
+        """
+        X = np.asarray(X)
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], batch_size):
+            per_tree = self.predict_per_tree(X[start:start + batch_size])
+            # 按树的顺序逐棵累加（与 sklearn 的累加顺序一致），再除以树数
+            total = np.zeros(per_tree.shape[1], dtype=np.float64)
+            for row in per_tree:
+                total += row
+            total /= per_tree.shape[0]
+            out[start:start + batch_size] = total
+        return out
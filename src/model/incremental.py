@@ -0,0 +1,257 @@
+# model/incremental.py
+"""
+新一季数据到来时的模型刷新：默认增量追加树，只有漂移过大时才完整重训。
+
+refresh_artifact 的流程：
+1. 读取最新产物（sklearn 后端，warm_start 需要原始模型）与当前训练数据，按 train_ids 找出新增的行；
+   训练数据与产物训练时完全相同（train_sha256 一致）时直接返回，不重训也不保存新版本
+2. 已训练行的热度变化（AniList 每次同步都会更新）：与 train_targets 比较，
+   相对变化超过 CHANGED_TOLERANCE 的行占已训练行的比例超过 max_changed_fraction 时完整重训
+   （旧树学的目标整体过时）；否则这些变化作为差值计入工作室热度与标签目标编码（FeatureBuilder.update_targets）
+3. 漂移检测：旧模型先对新增行打分（相当于一次向前验证），R² 与最近一次完整训练记录的
+   向前验证 R²（metadata['forward_r2']）比较，下降超过 drift_threshold 时完整重训。以下情况同样完整重训：
+   - 已训练的行被删除，或工作室 / 标签有改动（metadata['train_keys_sha256'] 不一致）：
+     编码器只记录了各工作室 / 标签桶的总和，无法撤回旧取值
+   - 新增行少于 2 行（或目标全部相同），R² 无定义，无法判断漂移
+   - 新增行出现题材词表以外的题材（特征维度必须与已训练的树一致）
+   - 增量追加的树累计超过原森林的 MAX_INCREMENTAL_FRACTION
+   - 旧产物缺少 train_ids / train_targets / studio_stats / forward_r2 / train_keys_sha256
+4. 否则增量刷新：
+   - FeatureBuilder.partial_fit 按 总和 / 作品数 更新涉及的工作室热度
+   - 标准化参数保持不变
+   - warm_start 追加 new_trees 棵树，在最近 window_seasons 个季度（含新增季度）的行与热度明显变化的旧行上训练
+   - 没有新增行时只更新编码器，不追加树
+
+注意：工作室热度更新后，旧树看到的 studio_popularity 取值也随之变化，而旧树的分裂阈值按旧取值学到；
+每次刷新的新增行只占一小部分，影响有限，累计漂移由第 2 步兜底。
+
+命令行（在仓库根目录执行）：
+    PYTHONPATH=src python -m model.incremental                 # 按当前训练数据刷新最新产物
+    PYTHONPATH=src python -m model.incremental --full          # 强制完整重训
+"""
+import argparse
+import hashlib
+import math
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from model.artifacts import (
+    ARTIFACT_DIR, DEFAULT_PARAMS, TRAIN_PATH, ModelArtifact, _artifact_version, decode_target, encode_target,
+    load_artifact, save_artifact, scale_features, train_artifact, trained_keys_sha256, trained_rows,
+)
+from model.features import season_index
+from util.lazy_import import lazy_import
+
+metrics = lazy_import("sklearn.metrics")
+
+# 新增行上的 R² 比最近一次完整训练的向前验证 R² 低超过该值时完整重训。
+# 单季只有约 100 行，逐季的向前 R² 本身波动很大（2024 FALL–2025 FALL 依次约为 0.01 / 0.08 / -2.00 / -0.62 / -1.17），
+# 阈值取在这一波动之上
+DRIFT_THRESHOLD = 1.0
+# 每次增量至少追加的树数；默认按 新增行 / 已训练行 的比例从原森林规模中折算
+MIN_NEW_TREES = 10
+# 增量追加的树累计超过原森林的这一比例时完整重训，避免森林无限增长
+MAX_INCREMENTAL_FRACTION = 0.5
+# 新树的训练窗口：最近若干个季度（含新增季度）
+WINDOW_SEASONS = 4
+# 已训练行的热度相对变化超过该值视为明显变化（计入 max_changed_fraction，并加入新树的训练窗口）；
+# 热度是累计的关注人数，已完结作品每周的增长通常只有百分之几
+CHANGED_TOLERANCE = 0.1
+# 明显变化的已训练行超过该比例时完整重训
+MAX_CHANGED_FRACTION = 0.2
+
+
+def new_rows(train_df: pd.DataFrame, train_ids: np.ndarray) -> pd.Series:
+    """尚未参与训练、且 popularity 非缺失的行"""
+    return trained_rows(train_df) & ~train_df["id"].isin(train_ids)
+
+
+def target_changes(train_df: pd.DataFrame, train_ids: np.ndarray, train_targets: np.ndarray,
+                   tolerance: float = CHANGED_TOLERANCE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    已训练行当前的热度与训练时的比较。train_ids 须全部仍是训练行（由 train_keys_sha256 保证）。
+
+    :return: (current, changed, material)  current 与 train_ids 对应；changed 为热度有任何变化，
+             material 为相对变化超过 tolerance
+    """
+    rows = train_df[trained_rows(train_df)].drop_duplicates("id")
+    current = pd.to_numeric(rows.set_index("id")["popularity"]).reindex(train_ids).to_numpy(dtype=np.float64)
+    changed = current != train_targets
+    material = np.abs(current - train_targets) > tolerance * np.maximum(train_targets, 1.0)
+    return current, changed, material
+
+
+def _scaled(artifact: ModelArtifact, df: pd.DataFrame, out_of_fold: bool = True):
+    """用产物的编码器与标准化参数构建训练行的 (X, y)；启用标签特征时 X 为 CSR（与 train_artifact 一致）"""
+    X, y = artifact.builder.training_matrix(df, sparse=artifact.builder.tags is not None, out_of_fold=out_of_fold)
+    return scale_features(X, artifact.scaler_mean, artifact.scaler_scale), y
+
+
+def _full_rebuild(base: Optional[ModelArtifact], train_path: str, root: str, reason: str) -> Tuple[ModelArtifact, dict]:
+    params = base.metadata.get("params", DEFAULT_PARAMS) if base is not None else DEFAULT_PARAMS
+    if base is None:
+        artifact = train_artifact(train_path, params)
+    else:
+        artifact = train_artifact(train_path, params, target=base.target, feature_config=base.builder.config)
+    entry = artifact.metadata["history"][-1]
+    entry["reason"] = reason
+    if base is not None:
+        artifact.metadata["parent"] = base.version
+        artifact.metadata["history"] = base.metadata.get("history", []) + [entry]
+    save_artifact(artifact, root)
+    return artifact, dict(entry, version=artifact.version)
+
+
+def refresh_artifact(root: str = ARTIFACT_DIR, train_path: str = TRAIN_PATH,
+                     drift_threshold: float = DRIFT_THRESHOLD, new_trees: Optional[int] = None,
+                     window_seasons: int = WINDOW_SEASONS, force_full: bool = False,
+                     max_changed_fraction: float = MAX_CHANGED_FRACTION) -> Tuple[ModelArtifact, dict]:
+    """
+    按当前训练数据刷新最新产物（增量或完整重训），保存为新版本。
+
+    :param new_trees: 增量追加的树数；None 时为 max(MIN_NEW_TREES, 原树数 × 新增行 / 已训练行)
+    :param max_changed_fraction: 热度明显变化的已训练行超过该比例时完整重训
+    :return: (artifact, report)  report 同时追加到 metadata['history']；
+             训练数据与最新产物训练时相同时原样返回最新产物，report['mode'] 为 'unchanged'，不保存新版本
+    """
+    try:
+        base = load_artifact(root, backend="sklearn")
+    except (FileNotFoundError, ValueError):
+        return _full_rebuild(None, train_path, root, "no usable artifact")
+    if force_full:
+        return _full_rebuild(base, train_path, root, "forced")
+    with open(train_path, "rb") as f:
+        raw = f.read()
+    if hashlib.sha256(raw).hexdigest() == base.metadata.get("train_sha256"):
+        # 训练数据与产物训练时相同：什么都不做，不保存新版本
+        return base, {"mode": "unchanged", "version": base.version, "fit_seconds": 0.0}
+    if (base.train_ids is None or base.train_targets is None or base.builder.studio_stats is None
+            or base.metadata.get("forward_r2") is None or base.metadata.get("train_keys_sha256") is None):
+        return _full_rebuild(base, train_path, root, "artifact lacks incremental state")
+
+    train_df = pd.read_csv(train_path)
+    if trained_keys_sha256(train_df, base.train_ids, base.builder) != base.metadata["train_keys_sha256"]:
+        return _full_rebuild(base, train_path, root, "trained rows removed or their studio/tags changed")
+    current, changed, material = target_changes(train_df, base.train_ids, base.train_targets)
+    if material.mean() > max_changed_fraction:
+        return _full_rebuild(base, train_path, root,
+                             f"popularity of {material.mean():.0%} of trained rows changed by more than "
+                             f"{CHANGED_TOLERANCE:.0%}")
+    is_new = new_rows(train_df, base.train_ids)
+    new_df = train_df[is_new]
+    unseen = base.builder.unseen_genres(new_df)
+    if unseen:
+        return _full_rebuild(base, train_path, root, f"unseen genres: {', '.join(unseen)}")
+
+    # 漂移检测：旧模型（旧编码器）对新增行的 R²；没有新增行时不追加树，也无需检测
+    forward_r2 = drift = None
+    if not new_df.empty:
+        X_new, y_new = _scaled(base, new_df, out_of_fold=False)
+        pred_new = decode_target(base.model.predict(X_new), base.target)
+        forward_r2 = float(metrics.r2_score(y_new, pred_new)) if len(y_new) > 1 else float("nan")
+        if not math.isfinite(forward_r2):
+            return _full_rebuild(base, train_path, root, f"cannot assess drift on {len(y_new)} new rows")
+        drift = base.metadata["forward_r2"] - forward_r2
+        if drift > drift_threshold:
+            return _full_rebuild(base, train_path, root, f"drift {drift:.3f} > {drift_threshold}")
+
+    model = base.model
+    params = base.metadata.get("params", DEFAULT_PARAMS)
+    n_old = len(base.train_ids)
+    if new_df.empty:
+        new_trees = 0
+    elif new_trees is None:
+        new_trees = max(MIN_NEW_TREES, math.ceil(params["n_estimators"] * len(new_df) / n_old))
+    if model.n_estimators + new_trees > params["n_estimators"] * (1 + MAX_INCREMENTAL_FRACTION):
+        return _full_rebuild(base, train_path, root, "incremental trees exceed limit")
+
+    start = time.perf_counter()
+    # 先把已训练行的热度变化计入编码器，再累加新增行
+    changed_ids = base.train_ids[changed]
+    changed_df = train_df[trained_rows(train_df) & train_df["id"].isin(changed_ids)].drop_duplicates("id")
+    old_targets = pd.Series(base.train_targets, index=base.train_ids).reindex(changed_df["id"]).to_numpy()
+    base.builder.update_targets(changed_df, old_targets)
+    base.builder.partial_fit(new_df)
+    n_window = 0
+    if new_trees:
+        seasons = season_index(train_df)
+        window_start = seasons[is_new.to_numpy()].max() - window_seasons + 1
+        window = trained_rows(train_df) & ((seasons >= window_start) | is_new
+                                           | train_df["id"].isin(base.train_ids[material]))
+        X_window, y_window = _scaled(base, train_df[window])
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + new_trees)
+        model.fit(X_window, encode_target(y_window, base.target))
+        model.set_params(warm_start=False)
+        n_window = len(y_window)
+    fit_seconds = time.perf_counter() - start
+
+    report = {
+        "mode": "incremental",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "n_new": int(len(new_df)),
+        "n_changed": int(changed.sum()),
+        "n_material": int(material.sum()),
+        "n_window": int(n_window),
+        "new_trees": int(new_trees),
+        "n_trees": int(model.n_estimators),
+        "forward_r2": forward_r2,
+        "drift": drift,
+        "fit_seconds": fit_seconds,
+    }
+    metadata = dict(base.metadata)
+    metadata.update({
+        "version": _artifact_version(raw, params, parent=base.version, target=base.target,
+                                     feature_config=base.builder.config),
+        "created_at": report["created_at"],
+        "train_sha256": hashlib.sha256(raw).hexdigest(),
+        "n_train": n_old + int(len(new_df)),
+        "mode": "incremental",
+        "parent": base.version,
+        "n_trees": int(model.n_estimators),
+        "history": base.metadata.get("history", []) + [report],
+    })
+    train_ids = np.concatenate([base.train_ids, new_df["id"].to_numpy(dtype=np.int64)])
+    train_targets = np.concatenate([current, pd.to_numeric(new_df["popularity"]).to_numpy(dtype=np.float64)])
+    metadata["train_keys_sha256"] = trained_keys_sha256(train_df, train_ids, base.builder)
+    artifact = ModelArtifact(model, base.builder, base.scaler_mean, base.scaler_scale, metadata, train_ids,
+                             train_targets)
+    save_artifact(artifact, root)
+    return artifact, dict(report, version=artifact.version)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the hit-prediction model after new seasons land")
+    parser.add_argument("--train", default=TRAIN_PATH)
+    parser.add_argument("--root", default=ARTIFACT_DIR)
+    parser.add_argument("--drift-threshold", type=float, default=DRIFT_THRESHOLD)
+    parser.add_argument("--new-trees", type=int, default=None)
+    parser.add_argument("--window-seasons", type=int, default=WINDOW_SEASONS)
+    parser.add_argument("--max-changed-fraction", type=float, default=MAX_CHANGED_FRACTION,
+                        help="full rebuild when more than this share of trained rows changed popularity materially")
+    parser.add_argument("--full", action="store_true", help="force a full rebuild")
+    args = parser.parse_args(argv)
+
+    _, report = refresh_artifact(args.root, args.train, args.drift_threshold, args.new_trees,
+                                 args.window_seasons, force_full=args.full,
+                                 max_changed_fraction=args.max_changed_fraction)
+    print(f"版本 {report['version']}（{report['mode']}）")
+    if report["mode"] == "unchanged":
+        print("训练数据与该版本训练时相同，无需刷新")
+        return 0
+    if report["mode"] == "incremental":
+        print(f"已训练行热度变化 {report['n_changed']} 行（明显变化 {report['n_material']} 行），已计入编码器")
+        if report["new_trees"]:
+            print(f"新增 {report['n_new']} 行，追加 {report['new_trees']} 棵树（共 {report['n_trees']} 棵），"
+                  f"新增行 R²：{report['forward_r2']:.4f}，漂移：{report['drift']:.4f}")
+        else:
+            print("没有新增行，未追加树")
+    else:
+        print(f"完整重训（{report.get('reason')}），验证集 R²：{report['validation_r2']:.4f}")
+    print(f"耗时 {report['fit_seconds']:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
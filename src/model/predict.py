@@ -0,0 +1,85 @@
+# model/predict.py
+"""
+候选集打分：点预测 + 由各树预测得到的分位数区间与排名稳定性。
+
+随机森林每棵树都是一个独立的预测，(树 × 作品) 的预测矩阵由 FlatForest 一次向量化下降得到：
+- 区间：每部作品各树预测的 interval 分位数（默认 10% / 90%）
+- 排名区间：每棵树各自给候选作品排名，取排名的分位数；p_top_n 为该作品排进前 top_n 的树所占比例
+区间反映的是森林内部的分歧（树之间的离散程度），不是严格的预测区间；长尾作品的排名区间通常很宽。
+
+命令行（在仓库根目录执行），把最新模型对候选集的预测连同区间写入 CSV：
+    PYTHONPATH=src python -m model.predict --out 2026_winter_predictions.csv
+"""
+import argparse
+import os
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+from model.artifacts import ARTIFACT_DIR, ModelArtifact, load_artifact
+
+CANDIDATE_PATH = "public/data/anime_winter_2026_cleaned.csv"
+RESULT_COLUMNS = ["id", "title", "predicted_popularity", "studio", "genres", "format", "start_date"]
+INTERVAL_COLUMNS = ["popularity_low", "popularity_high", "rank_low", "rank_high", "p_top_n"]
+INTERVAL = (0.1, 0.9)
+TOP_N = 10
+
+
+def tree_ranks(per_tree: np.ndarray) -> np.ndarray:
+    """每棵树内各作品的名次（1 为该树预测最高），形状同 per_tree"""
+    order = np.argsort(-per_tree, axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, per_tree.shape[1] + 1)[None, :], axis=1)
+    return ranks
+
+
+def prediction_intervals(per_tree: np.ndarray, interval: Sequence[float] = INTERVAL, top_n: int = TOP_N) -> pd.DataFrame:
+    """
+    由 (树 × 作品) 预测矩阵一次算出区间列。
+
+    :return: 列 popularity_low / popularity_high / rank_low / rank_high / p_top_n，行与作品对应
+    """
+    low, high = np.quantile(per_tree, interval, axis=0)
+    ranks = tree_ranks(per_tree)
+    # 名次越小越好：名次的低分位数是乐观端
+    rank_low, rank_high = np.quantile(ranks, interval, axis=0, method="nearest")
+    return pd.DataFrame({
+        "popularity_low": low,
+        "popularity_high": high,
+        "rank_low": rank_low.astype(np.int64),
+        "rank_high": rank_high.astype(np.int64),
+        "p_top_n": (ranks <= top_n).mean(axis=0),
+    })
+
+
+def predict_table(artifact: ModelArtifact, candidates: pd.DataFrame, interval: Sequence[float] = INTERVAL,
+                  top_n: int = TOP_N) -> pd.DataFrame:
+    """候选集的预测表（行顺序与 candidates 一致）：RESULT_COLUMNS + INTERVAL_COLUMNS"""
+    results = candidates.reindex(columns=RESULT_COLUMNS).reset_index(drop=True)
+    results["predicted_popularity"] = artifact.predict(candidates)
+    if len(candidates) == 0:
+        return results.reindex(columns=RESULT_COLUMNS + INTERVAL_COLUMNS)
+    intervals = prediction_intervals(artifact.predict_per_tree(candidates), interval, top_n)
+    return pd.concat([results, intervals], axis=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score candidates with the latest model, including per-tree intervals")
+    parser.add_argument("--root", default=ARTIFACT_DIR)
+    parser.add_argument("--candidates", default=CANDIDATE_PATH)
+    parser.add_argument("--out", default=None, help="output CSV (default: predictions.csv in the artifact directory)")
+    parser.add_argument("--interval", type=float, nargs=2, default=list(INTERVAL), metavar=("LOW", "HIGH"))
+    parser.add_argument("--top-n", type=int, default=TOP_N)
+    args = parser.parse_args(argv)
+
+    artifact = load_artifact(args.root)
+    table = predict_table(artifact, pd.read_csv(args.candidates), args.interval, args.top_n)
+    table = table.sort_values("predicted_popularity", ascending=False, kind="stable")
+    out = args.out or os.path.join(args.root, artifact.version, "predictions.csv")
+    table.to_csv(out, index=False)
+    print(f"模型版本 {artifact.version}（训练目标 {artifact.target}），{len(table)} 部作品 → {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
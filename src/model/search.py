@@ -0,0 +1,342 @@
+# model/search.py
+"""
+RandomForest 超参数搜索：多进程 + 逐轮减半（successive halving）+ 可续跑的结果日志。
+
+与 notebook 中 GridSearchCV 的区别：
+- 候选参数先用少量资源（树的数量或训练样本数）评估，每轮只保留前 1/eta 进入下一轮，资源乘以 eta
+- 每个 (候选参数, 折) 是一个独立任务，分发到进程池；X / y / 折索引在每个工作进程初始化时只传一次
+- 交叉验证折索引在第一次运行时生成并保存在日志目录，续跑与后续运行复用同一组折
+- 每评估完一个候选就往 JSONL 日志追加一行，中断后重新运行会跳过已完成的评估
+
+命令行（在仓库根目录执行）：
+    PYTHONPATH=src python -m model.search --budget trees --jobs 8
+    PYTHONPATH=src python -m model.search --budget samples --log .cache/search/samples
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from util.lazy_import import lazy_import
+
+ensemble = lazy_import("sklearn.ensemble")
+metrics = lazy_import("sklearn.metrics")
+
+# notebook 中的参数网格
+PARAM_GRID = {
+    "n_estimators": [50, 100, 150, 200],
+    "max_depth": [10, 15, 20, 25, None],
+    "min_samples_split": [2, 5, 10],
+    "min_samples_leaf": [1, 2, 4],
+    "max_features": ["sqrt", "log2", 0.5, 0.7],
+    "bootstrap": [True, False],
+}
+RANDOM_STATE = 42
+LOG_DIR = ".cache/search"
+LOG_NAME = "results.jsonl"
+FOLDS_NAME = "folds.npz"
+
+
+# ---------------- 参数网格与资源调度 ----------------
+
+def expand_grid(param_grid: Dict[str, list]) -> List[dict]:
+    """网格 → 参数字典列表（顺序与 sklearn ParameterGrid 一致：按参数名排序后做笛卡尔积）"""
+    keys = sorted(param_grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+
+
+def halving_schedule(n_candidates: int, min_resource: int, max_resource: int, eta: int = 3):
+    """
+    逐轮减半的调度：返回 [(本轮候选数, 本轮资源), ...]。
+
+    轮数取“候选数减到 1 所需轮数”与“资源从 min 增长到 max 所需轮数”中较小者 + 1，
+    最后一轮固定使用 max_resource。
+    """
+    if min_resource > max_resource:
+        raise ValueError("min_resource 不能大于 max_resource")
+    by_candidates = math.ceil(math.log(max(n_candidates, 1), eta)) if n_candidates > 1 else 0
+    by_resource = int(math.floor(math.log(max_resource / min_resource, eta) + 1e-9))
+    n_rungs = min(by_candidates, by_resource) + 1
+    schedule = []
+    for i in range(n_rungs):
+        n_i = max(1, math.ceil(n_candidates / eta ** i))
+        r_i = max_resource if i == n_rungs - 1 else min(max_resource, int(min_resource * eta ** i))
+        schedule.append((n_i, r_i))
+    return schedule
+
+
+# ---------------- 折索引缓存 ----------------
+
+def make_folds(n_samples: int, n_splits: int = 5) -> List[np.ndarray]:
+    """KFold（不打乱，与 GridSearchCV(cv=5) 对回归任务的默认行为一致），返回每折的验证集行号"""
+    sizes = np.full(n_splits, n_samples // n_splits, dtype=np.int64)
+    sizes[: n_samples % n_splits] += 1
+    bounds = np.concatenate([[0], np.cumsum(sizes)])
+    return [np.arange(bounds[i], bounds[i + 1]) for i in range(n_splits)]
+
+
+def load_or_create_folds(log_dir: str, n_samples: int, n_splits: int = 5):
+    """
+    读取日志目录中的折索引；不存在时生成并保存。同时保存一组固定的样本顺序，
+    按样本数减半（budget='samples'）时每折取该顺序下的前 r 个训练样本。
+
+    :return: (folds, sample_order)
+    """
+    path = os.path.join(log_dir, FOLDS_NAME)
+    if os.path.exists(path):
+        with np.load(path) as data:
+            folds = [data[f"fold_{i}"] for i in range(int(data["n_splits"]))]
+            sample_order = data["sample_order"]
+        if int(sum(len(f) for f in folds)) != n_samples or len(folds) != n_splits:
+            raise ValueError(f"{path} 中的折索引与当前数据不一致，请换一个日志目录或删除该文件")
+        return folds, sample_order
+
+    folds = make_folds(n_samples, n_splits)
+    sample_order = np.random.RandomState(RANDOM_STATE).permutation(n_samples)
+    os.makedirs(log_dir, exist_ok=True)
+    np.savez(path, n_splits=n_splits, sample_order=sample_order,
+             **{f"fold_{i}": f for i, f in enumerate(folds)})
+    return folds, sample_order
+
+
+# ---------------- 结果日志 ----------------
+
+def data_fingerprint(X: np.ndarray, y: np.ndarray) -> str:
+    h = hashlib.sha256()
+    h.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+
+def evaluation_key(params: dict, budget: str, resource: int) -> str:
+    return json.dumps({"params": params, "budget": budget, "resource": resource}, sort_keys=True)
+
+
+def read_log(path: str, fingerprint: str) -> Dict[str, dict]:
+    """读取已有日志：{evaluation_key: 记录}；数据指纹不一致时拒绝续跑，避免混入旧数据的结果"""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 进程被杀时最后一行可能没写完，忽略即可
+                continue
+            if record.get("fingerprint") != fingerprint:
+                raise ValueError(f"{path} 是在另一份训练数据上生成的，请换一个日志目录")
+            done[evaluation_key(record["params"], record["budget"], record["resource"])] = record
+    return done
+
+
+def _append_log(path: str, record: dict):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# ---------------- 工作进程 ----------------
+
+_worker_state = {}
+
+
+def _init_worker(X, y, folds, sample_order):
+    _worker_state.update(X=X, y=y, folds=folds, sample_order=sample_order)
+
+
+def _fit_fold(params: dict, budget: str, resource: int, fold: int):
+    """在一个工作进程中训练并评估一折，返回 (fold, R², 训练耗时)"""
+    X, y = _worker_state["X"], _worker_state["y"]
+    folds, sample_order = _worker_state["folds"], _worker_state["sample_order"]
+    test_idx = folds[fold]
+    in_test = np.zeros(len(y), dtype=bool)
+    in_test[test_idx] = True
+    if budget == "samples":
+        # 固定样本顺序下前 resource 个训练样本（各候选、各轮一致）
+        train_idx = sample_order[~in_test[sample_order]][:resource]
+    else:
+        train_idx = np.flatnonzero(~in_test)
+
+    model_params = dict(params)
+    if budget == "trees":
+        model_params["n_estimators"] = resource
+    model = ensemble.RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=1, **model_params)
+    start = time.perf_counter()
+    model.fit(X[train_idx], y[train_idx])
+    fit_time = time.perf_counter() - start
+    score = metrics.r2_score(y[test_idx], model.predict(X[test_idx]))
+    return fold, float(score), fit_time
+
+
+# ---------------- 搜索 ----------------
+
+def successive_halving_search(X: np.ndarray, y: np.ndarray, param_grid: Dict[str, list] = None,
+                              budget: str = "trees", eta: int = 3, min_resource: Optional[int] = None,
+                              n_splits: int = 5, n_jobs: int = None, log_dir: str = LOG_DIR,
+                              verbose: bool = True) -> pd.DataFrame:
+    """
+    逐轮减半搜索 RandomForestRegressor 超参数（评分为 R²）。
+
+    :param budget: 'trees'（资源为 n_estimators，网格中的 n_estimators 只用于确定上限）
+                   或 'samples'（资源为每折训练样本数）
+    :param eta: 每轮保留 1/eta 的候选，资源乘以 eta
+    :param min_resource: 第一轮的资源；默认 trees 为 max_trees/eta²，samples 为 max_samples/eta³
+    :param n_jobs: 工作进程数，默认 CPU 核数
+    :param log_dir: 折索引与结果日志所在目录；同一目录再次运行会续跑
+    :return: 每轮每个候选一行的结果表，列 rung / resource / params / mean_score / std_score / fit_time，
+             最后一轮按 mean_score 降序排在最前
+    """
+    if budget not in ("trees", "samples"):
+        raise ValueError("budget 只能是 'trees' 或 'samples'")
+    param_grid = dict(param_grid or PARAM_GRID)
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.ascontiguousarray(y, dtype=np.float64)
+
+    folds, sample_order = load_or_create_folds(log_dir, len(y), n_splits)
+    fingerprint = data_fingerprint(X, y)
+    log_path = os.path.join(log_dir, LOG_NAME)
+    done = read_log(log_path, fingerprint)
+
+    if budget == "trees":
+        max_resource = max(param_grid.pop("n_estimators", [100]))
+        default_min = max_resource // eta ** 2
+    else:
+        max_resource = len(y) - max(len(f) for f in folds)
+        default_min = max_resource // eta ** 3
+    min_resource = max(1, min_resource or default_min)
+
+    candidates = expand_grid(param_grid)
+    schedule = halving_schedule(len(candidates), min_resource, max_resource, eta)
+    if verbose:
+        print(f"{len(candidates)} 组候选参数，{len(schedule)} 轮：" +
+              " → ".join(f"{n}×{r}" for n, r in schedule))
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(X, y, folds, sample_order)) as pool:
+        for rung, (n_keep, resource) in enumerate(schedule):
+            candidates = candidates[:n_keep]
+            results = {}
+            pending = {}
+            for i, params in enumerate(candidates):
+                record = done.get(evaluation_key(params, budget, resource))
+                if record is not None:
+                    results[i] = record
+                    continue
+                for fold in range(n_splits):
+                    pending[pool.submit(_fit_fold, params, budget, resource, fold)] = i
+
+            fold_scores = {}
+            for future in as_completed(pending):
+                i = pending[future]
+                fold, score, fit_time = future.result()
+                fold_scores.setdefault(i, {})[fold] = (score, fit_time)
+                if len(fold_scores[i]) == n_splits:
+                    scores = [fold_scores[i][k][0] for k in range(n_splits)]
+                    record = {
+                        "fingerprint": fingerprint,
+                        "budget": budget,
+                        "resource": resource,
+                        "params": candidates[i],
+                        "scores": scores,
+                        "mean_score": float(np.mean(scores)),
+                        "std_score": float(np.std(scores)),
+                        "fit_time": float(sum(t for _, t in fold_scores[i].values())),
+                    }
+                    _append_log(log_path, record)
+                    done[evaluation_key(candidates[i], budget, resource)] = record
+                    results[i] = record
+
+            # 按平均得分降序（并列时保持网格顺序），下一轮只评估前 1/eta
+            order = sorted(range(len(candidates)), key=lambda k: (-results[k]["mean_score"], k))
+            for i in order:
+                rows.append({"rung": rung, "resource": resource, "params": candidates[i],
+                             "mean_score": results[i]["mean_score"], "std_score": results[i]["std_score"],
+                             "fit_time": results[i]["fit_time"]})
+            candidates = [candidates[i] for i in order]
+            if verbose:
+                best = results[order[0]]
+                print(f"第 {rung + 1} 轮（资源 {resource}）：评估 {len(candidates)} 组，"
+                      f"新训练 {len(pending) // n_splits} 组，最佳 R² {best['mean_score']:.4f}")
+
+    table = pd.DataFrame(rows).sort_values(["rung", "mean_score"], ascending=[False, False], kind="stable")
+    return table.reset_index(drop=True)
+
+
+def best_params(table: pd.DataFrame, budget: str = "trees") -> dict:
+    """搜索结果中最后一轮得分最高的参数；budget='trees' 时补回 n_estimators"""
+    top = table.iloc[0]
+    params = dict(top["params"])
+    if budget == "trees":
+        params["n_estimators"] = int(top["resource"])
+    return params
+
+
+def best_params_from_log(log_dir: str) -> dict:
+    """
+    不重新运行搜索，直接从日志中取最佳参数：资源最大的一轮中平均得分最高的记录。
+    """
+    path = os.path.join(log_dir, LOG_NAME)
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    if not records:
+        raise ValueError(f"{path} 中没有搜索结果")
+    top_resource = max(r["resource"] for r in records)
+    top = max((r for r in records if r["resource"] == top_resource), key=lambda r: r["mean_score"])
+    params = dict(top["params"])
+    if top["budget"] == "trees":
+        params["n_estimators"] = int(top["resource"])
+    return params
+
+
+def main(argv=None):
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+    from model.features import build_features
+
+    parser = argparse.ArgumentParser(description="Successive-halving RandomForest search for the hit-prediction model")
+    parser.add_argument("--train", default="public/data/anilist_anime_2016_2025_cleaned.csv")
+    parser.add_argument("--budget", choices=["trees", "samples"], default="trees")
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--min-resource", type=int, default=None)
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--log", default=None, help=f"log directory (default: {LOG_DIR}/<budget>)")
+    args = parser.parse_args(argv)
+
+    # 与 notebook 一致：标准化后留出 20% 作为验证集，只在其余 80% 上做交叉验证搜索
+    _, X, y, _ = build_features(pd.read_csv(args.train))
+    X = StandardScaler().fit_transform(X)
+    X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=0.2, random_state=RANDOM_STATE)
+
+    table = successive_halving_search(
+        X_fit, y_fit, budget=args.budget, eta=args.eta, min_resource=args.min_resource,
+        n_jobs=args.jobs, log_dir=args.log or os.path.join(LOG_DIR, args.budget),
+    )
+    params = best_params(table, args.budget)
+    model = ensemble.RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=args.jobs or -1, **params)
+    model.fit(X_fit, y_fit)
+    print(f"最佳参数：{params}")
+    print(f"交叉验证 R²：{table.iloc[0]['mean_score']:.4f}")
+    print(f"验证集 R²：{metrics.r2_score(y_val, model.predict(X_val)):.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
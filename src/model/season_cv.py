@@ -0,0 +1,214 @@
+# model/season_cv.py
+"""
+按季度分组的时间序列交叉验证：扩展窗口，每一折用某一季度之前的全部季度训练、对该季度打分。
+
+随机划分会把未来季度的作品混入训练集（工作室热度也按整表均值计算），验证分数偏乐观；
+这里每一折都按线上流程重新拟合 FeatureBuilder（工作室热度、题材词表只取自训练季度），
+报告每个季度的 R² 与 top-k 精度（预测前 k 名中真正位列该季度前 k 名的比例）。
+
+并行：
+- 各折的特征在主进程一次构建，拼成一个 .npy 写入 CACHE_DIR（按 训练数据 + 折设置 + 特征配置 缓存）
+- 工作进程以只读内存映射打开这一份数组，按偏移量切出自己那一折，不随任务 pickle 数组
+- 训练集最大的折最先提交，避免最后只剩一个大任务在跑
+
+命令行（在仓库根目录执行）：
+    PYTHONPATH=src python -m model.season_cv --folds 8 --jobs 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from model.artifacts import DEFAULT_PARAMS, RANDOM_STATE, TRAIN_PATH, decode_target, encode_target, trained_rows
+from model.features import FEATURE_VERSION, SEASON_ORDER, FeatureBuilder, season_index
+from util.lazy_import import lazy_import
+
+ensemble = lazy_import("sklearn.ensemble")
+metrics = lazy_import("sklearn.metrics")
+
+CACHE_DIR = ".cache/season_cv"
+N_FOLDS = 8
+TOP_K = 10
+_SEASON_NAMES = {v: k for k, v in SEASON_ORDER.items()}
+
+
+def season_label(index: int) -> str:
+    """季度序号 → 形如 "FALL 2025" """
+    return f"{_SEASON_NAMES[int(index) % 4]} {int(index) // 4}"
+
+
+def season_folds(seasons: np.ndarray, n_folds: int = N_FOLDS) -> list:
+    """
+    扩展窗口的折：最近 n_folds 个季度依次作为验证季度，训练集为它之前的所有季度（季度缺失的行不参与）。
+
+    :return: [(验证季度序号, 训练行号, 验证行号)]，按验证季度升序
+    """
+    unique = np.unique(seasons[seasons >= 0])
+    if len(unique) < 2:
+        raise ValueError("至少需要两个季度的数据")
+    folds = []
+    for season in unique[-min(n_folds, len(unique) - 1):]:
+        folds.append((int(season), np.flatnonzero((seasons >= 0) & (seasons < season)),
+                      np.flatnonzero(seasons == season)))
+    return folds
+
+
+def precision_at_k(y_true: np.ndarray, y_pred: np.ndarray, k: int = TOP_K) -> float:
+    """预测前 k 名与实际前 k 名的重合比例"""
+    k = min(k, len(y_true))
+    top_true = np.argsort(-y_true, kind="stable")[:k]
+    top_pred = np.argsort(-y_pred, kind="stable")[:k]
+    return len(np.intersect1d(top_true, top_pred)) / k
+
+
+def materialize_folds(train_path: str = TRAIN_PATH, n_folds: int = N_FOLDS, feature_config: Optional[dict] = None,
+                      cache_dir: str = CACHE_DIR) -> str:
+    """
+    构建各折的特征并写入缓存目录（已存在时直接复用）：
+        X.npy / y.npy   各折的 [训练行; 验证行] 依次拼接
+        folds.json      每折的验证季度与在 X 中的偏移 [start, n_train, n_test]
+
+    :return: 缓存目录
+    """
+    with open(train_path, "rb") as f:
+        h = hashlib.sha256(f.read())
+    # 特征代码变化（FEATURE_VERSION 递增）时旧的折矩阵随之失效
+    h.update(json.dumps({"n_folds": n_folds, "features": feature_config or {}, "feature_version": FEATURE_VERSION},
+                        sort_keys=True).encode("utf-8"))
+    path = os.path.join(cache_dir, h.hexdigest()[:16])
+    if os.path.exists(os.path.join(path, "folds.json")):
+        return path
+
+    train_df = pd.read_csv(train_path)
+    train_df = train_df[trained_rows(train_df)].reset_index(drop=True)
+    blocks, meta, start = [], [], 0
+    for season, train_idx, test_idx in season_folds(season_index(train_df), n_folds):
+        past, held = train_df.iloc[train_idx], train_df.iloc[test_idx]
+        builder = FeatureBuilder(**(feature_config or {})).fit(past)
+        X_train, y_train = builder.training_matrix(past)
+        X_test, y_test = builder.training_matrix(held, out_of_fold=False)
+        blocks.append((X_train, y_train, X_test, y_test))
+        meta.append({"season": season, "start": start, "n_train": len(y_train), "n_test": len(y_test)})
+        start += len(y_train) + len(y_test)
+
+    # 各折题材词表不同，特征列数可能不同：按最大列数补零（每折只读取自己的前 n_features 列）
+    n_features = max(b[0].shape[1] for b in blocks)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    X = np.lib.format.open_memmap(os.path.join(tmp, "X.npy"), mode="w+", dtype=np.float64, shape=(start, n_features))
+    y = np.lib.format.open_memmap(os.path.join(tmp, "y.npy"), mode="w+", dtype=np.float64, shape=(start,))
+    for (X_train, y_train, X_test, y_test), m in zip(blocks, meta):
+        rows = slice(m["start"], m["start"] + m["n_train"] + m["n_test"])
+        m["n_features"] = X_train.shape[1]
+        X[rows, :m["n_features"]] = np.vstack([X_train, X_test])
+        X[rows, m["n_features"]:] = 0
+        y[rows] = np.concatenate([y_train, y_test])
+    X.flush()
+    y.flush()
+    del X, y
+    with open(os.path.join(tmp, "folds.json"), "w", encoding="utf-8") as f:
+        json.dump({"train_path": train_path, "feature_config": feature_config or {}, "folds": meta}, f)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # 另一个进程已经写好了同一份缓存
+        shutil.rmtree(tmp, ignore_errors=True)
+    return path
+
+
+# ---------------- 工作进程 ----------------
+
+_worker_state = {}
+
+
+def _init_worker(path: str):
+    # 只读内存映射：各进程共享同一份页缓存
+    _worker_state.update(X=np.load(os.path.join(path, "X.npy"), mmap_mode="r"),
+                         y=np.load(os.path.join(path, "y.npy"), mmap_mode="r"))
+
+
+def _fit_fold(fold: dict, params: dict, target: str, top_k: int) -> dict:
+    """训练并评估一折，返回该折的结果行"""
+    X, y = _worker_state["X"], _worker_state["y"]
+    split = fold["start"] + fold["n_train"]
+    end = split + fold["n_test"]
+    columns = slice(0, fold["n_features"])
+    model = ensemble.RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=1, **params)
+    start = time.perf_counter()
+    model.fit(X[fold["start"]:split, columns], encode_target(y[fold["start"]:split], target))
+    fit_seconds = time.perf_counter() - start
+    y_test = np.asarray(y[split:end])
+    pred = decode_target(model.predict(X[split:end, columns]), target)
+    return {
+        "season": season_label(fold["season"]),
+        "n_train": fold["n_train"],
+        "n_test": fold["n_test"],
+        "r2": float(metrics.r2_score(y_test, pred)) if len(y_test) > 1 else float("nan"),
+        f"precision_at_{top_k}": precision_at_k(y_test, pred, top_k),
+        "fit_seconds": fit_seconds,
+        "_order": fold["season"],
+    }
+
+
+def season_cross_validate(train_path: str = TRAIN_PATH, params: Optional[dict] = None, n_folds: int = N_FOLDS,
+                          target: str = "raw", feature_config: Optional[dict] = None, top_k: int = TOP_K,
+                          n_jobs: Optional[int] = None, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """
+    扩展窗口交叉验证。
+
+    :param n_jobs: 工作进程数，默认 CPU 核数
+    :return: 每个验证季度一行，列 season / n_train / n_test / r2 / precision_at_<k> / fit_seconds，按季度升序
+    """
+    params = dict(params or DEFAULT_PARAMS)
+    path = materialize_folds(train_path, n_folds, feature_config, cache_dir)
+    with open(os.path.join(path, "folds.json"), encoding="utf-8") as f:
+        folds = json.load(f)["folds"]
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(path,)) as pool:
+        pending = [pool.submit(_fit_fold, fold, params, target, top_k)
+                   for fold in sorted(folds, key=lambda m: m["n_train"], reverse=True)]
+        for future in as_completed(pending):
+            rows.append(future.result())
+    table = pd.DataFrame(rows).sort_values("_order", kind="stable").drop(columns="_order")
+    return table.reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Season-grouped expanding-window cross-validation")
+    parser.add_argument("--train", default=TRAIN_PATH)
+    parser.add_argument("--folds", type=int, default=N_FOLDS, help="number of most recent seasons to validate on")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--target", choices=("raw", "log1p"), default="raw")
+    parser.add_argument("--tag-dim", type=int, default=0)
+    parser.add_argument("--tag-encoding", action="store_true")
+    parser.add_argument("--search-log", default=None, help="use the best parameters from a model.search log directory")
+    args = parser.parse_args(argv)
+    if args.tag_encoding and args.tag_dim <= 0:
+        parser.error("--tag-encoding requires --tag-dim > 0")
+
+    params = DEFAULT_PARAMS
+    if args.search_log:
+        from model.search import best_params_from_log
+        params = best_params_from_log(args.search_log)
+    feature_config = {"tag_dim": args.tag_dim, "tag_encoding": args.tag_encoding} if args.tag_dim > 0 else None
+
+    start = time.perf_counter()
+    table = season_cross_validate(args.train, params, args.folds, args.target, feature_config, args.top_k, args.jobs)
+    wall = time.perf_counter() - start
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    precision = f"precision_at_{args.top_k}"
+    print(f"平均 R²：{table['r2'].mean():.4f}  平均 top-{args.top_k} 精度：{table[precision].mean():.3f}")
+    print(f"训练耗时合计 {table['fit_seconds'].sum():.1f}s，墙钟 {wall:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,236 @@
+# model/whatif.py
+"""
+What-if 情景打分：把 工作室 × 播出形式 × 集数 × 时长 × 评分 × 是否续作 × 题材组合 的取值范围展开成笛卡尔网格，
+一次算出整个网格的预测热度，返回排名表与各取值的边际效应。
+
+用法：
+    spec = {"studio": ["MAPPA", "ufotable"], "format": ["TV", "MOVIE"], "episodes": [12, 24],
+            "duration": [24], "average_score": [70], "is_sequel": [0],
+            "genres": genre_combinations(["Action", "Fantasy", "Romance"], sizes=(1, 2))}
+    ranked, effects = score_scenarios(artifact, spec)
+
+注意：模型特征里没有原作类型（source），因此情景中也没有这一维；
+情景中也没有标签，启用了标签特征（--tag-dim）的模型不能做情景打分（会抛出 ValueError），
+否则全部情景都按“无标签”打分，预测整体偏低。
+
+网格打分不逐个情景下降树，而是利用网格的乘积结构：
+- 每棵树的叶子对应一个特征区间的乘积；自上而下算出每一维（轴）的每个取值能否到达每个叶子
+  （只看分裂在本轴特征上的节点），得到 0/1 矩阵 M_axis（叶子 × 取值）
+- 网格上某一点落在某叶子 ⇔ 各轴的取值都能到达该叶子，因此
+      预测张量 = Σ_叶子 value · M_1[叶子] ⊗ M_2[叶子] ⊗ …  / 树数
+- 把轴分成前后两组，各自做行内 Kronecker 积，整个张量就是一次矩阵乘法；
+  遍历时某一轴已没有取值可达的子树直接剪掉，网格覆盖不到的叶子不参与计算
+分裂比较与 FlatForest 相同（标准化后转 float32 再与阈值比较），落到的叶子完全一致；
+只是累加顺序不同，与逐行预测的差异在浮点舍入量级（约 1e-12 相对误差）。
+"""
+import itertools
+import json
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+from model.artifacts import decode_target
+from model.features import CANDIDATE_FORMAT_CODES, NUMERIC_FEATURES
+from model.flat_forest import FlatForest
+
+# 网格各轴（也是排名表的列顺序）；numeric 轴对应 NUMERIC_FEATURES 中的同名列
+WHATIF_AXES = ["studio", "format", "episodes", "duration", "average_score", "is_sequel", "genres"]
+_AXIS_FEATURES = {
+    "studio": "studio_popularity",
+    "format": "format",
+    "episodes": "episodes",
+    "duration": "duration",
+    "average_score": "average_score",
+    "is_sequel": "is_sequel",
+}
+# 矩阵乘法时每块叶子的元素上限，控制中间数组大小
+_CHUNK_ELEMENTS = 4_000_000
+
+
+def genre_combinations(genres: Sequence[str], sizes: Sequence[int] = (1, 2)) -> List[List[str]]:
+    """由题材列表生成题材组合（按组合大小、再按 genres 中的顺序）"""
+    return [list(combo) for size in sizes for combo in itertools.combinations(genres, size)]
+
+
+def normalize_spec(spec: dict) -> dict:
+    """
+    检查并规范化情景范围：每一轴都必须给出非空取值列表。
+
+    :raises ValueError: 缺少轴、出现模型没有的维度（如 source）或某轴为空
+    """
+    unknown = set(spec) - set(WHATIF_AXES)
+    if unknown:
+        raise ValueError(f"模型没有这些特征，不能作为情景维度：{sorted(unknown)}")
+    missing = [axis for axis in WHATIF_AXES if not spec.get(axis)]
+    if missing:
+        raise ValueError(f"以下维度没有取值：{missing}")
+    normalized = {axis: list(spec[axis]) for axis in WHATIF_AXES}
+    normalized["genres"] = [sorted(set(combo)) for combo in normalized["genres"]]
+    return normalized
+
+
+def spec_key(spec: dict) -> str:
+    """情景范围的缓存键（规范化后的 JSON）"""
+    return json.dumps(normalize_spec(spec), sort_keys=True, ensure_ascii=False)
+
+
+def scenario_count(spec: dict) -> int:
+    return int(np.prod([len(spec[axis]) for axis in WHATIF_AXES]))
+
+
+def _axis_matrices(artifact, spec: dict):
+    """
+    各轴取值对应的（未标准化）特征值。
+
+    :return: [(特征列下标, 取值矩阵 (取值数 × 特征数))]，顺序同 WHATIF_AXES；所有特征列恰好被覆盖一次
+    :raises ValueError: 模型启用了标签特征，或取值不在模型的词表中
+    """
+    builder = artifact.builder
+    if builder.tags is not None:
+        raise ValueError(f"模型版本 {artifact.version} 使用了标签特征，情景中没有标签维度，不能做情景打分")
+    axes = []
+    for axis in WHATIF_AXES[:-1]:
+        values = spec[axis]
+        if axis == "studio":
+            values = [builder.studio_popularity.get(name, 0) for name in values]
+        elif axis == "format":
+            unknown = [f for f in values if f not in CANDIDATE_FORMAT_CODES]
+            if unknown:
+                raise ValueError(f"未知的播出形式：{unknown}")
+            values = [CANDIDATE_FORMAT_CODES[f] for f in values]
+        column = NUMERIC_FEATURES.index(_AXIS_FEATURES[axis])
+        axes.append((np.array([column]), np.asarray(values, dtype=np.float64)[:, None]))
+
+    vocab = pd.Index(builder.genres.classes_)
+    onehot = np.zeros((len(spec["genres"]), len(vocab)), dtype=np.float64)
+    for i, combo in enumerate(spec["genres"]):
+        cols = vocab.get_indexer(combo)
+        if (cols < 0).any():
+            raise ValueError(f"题材不在模型的题材词表中：{[g for g, c in zip(combo, cols) if c < 0]}")
+        onehot[i, cols] = 1
+    axes.append((len(NUMERIC_FEATURES) + np.arange(len(vocab)), onehot))
+    return axes
+
+
+def _reach(forest: FlatForest, values: np.ndarray, blocks: np.ndarray):
+    """
+    所有轴的每个取值能否到达每个叶子：各轴取值并排作为列，自上而下一次遍历所有树。
+
+    节点只在分裂特征所属的轴上更新可达性；某一轴已没有任何取值可达的节点整棵子树剪掉
+    （网格上没有任何点能落进去）。
+
+    :param values: (列 × 特征) 的 float32 取值表：列为各轴取值并排，不属于该列所在轴的特征为 NaN
+    :param blocks: 各轴在列中的起点
+    :return: (叶子节点编号, 布尔矩阵 叶子 × 列)
+    """
+    nodes = np.asarray(forest.roots, dtype=np.int64)
+    reach = np.ones((len(nodes), values.shape[0]), dtype=bool)
+    leaves, reach_at_leaves = [], []
+    while nodes.size:
+        feature = np.asarray(forest.feature[nodes], dtype=np.int64)
+        is_leaf = feature < 0
+        leaves.append(nodes[is_leaf])
+        reach_at_leaves.append(reach[is_leaf])
+
+        split = np.flatnonzero(~is_leaf)
+        parents, feature = nodes[split], feature[split]
+        # 分裂特征不属于某列所在的轴时该列取值为 NaN：左右子节点都可达
+        x = values[:, feature].T
+        left = x <= np.asarray(forest.threshold[parents])[:, None]
+        missing = np.isnan(x)
+        children = np.asarray(forest.children[parents], dtype=np.int64)
+        nodes = np.concatenate([children[:, 0], children[:, 1]])
+        reach = np.concatenate([reach[split] & (left | missing), reach[split] & (~left | missing)])
+        # 剪枝：任一轴没有可达取值的节点
+        alive = np.logical_and.reduce(np.logical_or.reduceat(reach, blocks, axis=1), axis=1)
+        nodes, reach = nodes[alive], reach[alive]
+    return np.concatenate(leaves), np.concatenate(reach_at_leaves)
+
+
+def _kron_rows(matrices: List[np.ndarray]) -> np.ndarray:
+    """逐行 Kronecker 积：(L × a), (L × b), … → (L × a·b·…)，列按 C 顺序展开"""
+    out = matrices[0].astype(np.float64)
+    for m in matrices[1:]:
+        out = (out[:, :, None] * m[:, None, :]).reshape(len(out), -1)
+    return out
+
+
+def predict_grid(artifact, spec: dict) -> np.ndarray:
+    """
+    整个网格的预测热度，形状为各轴取值数（顺序同 WHATIF_AXES）。
+    """
+    spec = normalize_spec(spec)
+    forest = artifact.forest
+
+    # 各轴取值并排成一张 (列 × 特征) 的取值表，已标准化并转为 float32（与 FlatForest.apply 相同）
+    axes = _axis_matrices(artifact, spec)
+    values = np.full((sum(len(v) for _, v in axes), forest.n_features), np.nan, dtype=np.float32)
+    blocks, start = [], 0
+    for columns, axis_values in axes:
+        scaled = (axis_values - artifact.scaler_mean[columns]) / artifact.scaler_scale[columns]
+        values[start:start + len(axis_values), columns] = scaled.astype(np.float32)
+        blocks.append(start)
+        start += len(axis_values)
+    leaves, reach = _reach(forest, values, np.asarray(blocks))
+    matrices = np.split(reach, blocks[1:], axis=1)
+    leaf_values = np.asarray(forest.value[leaves], dtype=np.float64)
+
+    shape = tuple(m.shape[1] for m in matrices)
+    sizes = np.cumprod(shape)
+    # 前后两组轴的取值数尽量接近，矩阵乘法的两个维度更均衡
+    split = int(np.argmin(np.abs(sizes[:-1] - sizes[-1] / sizes[:-1]))) + 1
+    cols_left, cols_right = int(sizes[split - 1]), int(sizes[-1] // sizes[split - 1])
+    total = np.zeros((cols_left, cols_right), dtype=np.float64)
+    chunk = max(1, _CHUNK_ELEMENTS // max(cols_left, cols_right))
+    for start in range(0, len(leaf_values), chunk):
+        part = slice(start, start + chunk)
+        left = _kron_rows([m[part] for m in matrices[:split]]) * leaf_values[part, None]
+        right = _kron_rows([m[part] for m in matrices[split:]])
+        total += left.T @ right
+    return decode_target(total / forest.meta["n_trees"], artifact.target).reshape(shape)
+
+
+def scenario_table(spec: dict) -> pd.DataFrame:
+    """网格展开成的情景表（行顺序与 predict_grid 结果 ravel 后一致）"""
+    spec = normalize_spec(spec)
+    shape = tuple(len(spec[axis]) for axis in WHATIF_AXES)
+    index = np.indices(shape).reshape(len(shape), -1)
+    columns = {}
+    for i, axis in enumerate(WHATIF_AXES):
+        labels = spec[axis] if axis != "genres" else [", ".join(combo) for combo in spec[axis]]
+        columns[axis] = np.asarray(labels, dtype=object)[index[i]]
+    return pd.DataFrame(columns)
+
+
+def marginal_effects(grid: np.ndarray, spec: dict) -> pd.DataFrame:
+    """
+    各轴每个取值的边际效应：固定该取值、对其余各轴取平均的预测热度，减去整个网格的平均。
+
+    返回：列 axis / value / mean_prediction / effect（各轴内按 effect 降序）
+    """
+    spec = normalize_spec(spec)
+    overall = grid.mean()
+    frames = []
+    for i, axis in enumerate(WHATIF_AXES):
+        means = grid.mean(axis=tuple(j for j in range(grid.ndim) if j != i))
+        labels = spec[axis] if axis != "genres" else [", ".join(combo) for combo in spec[axis]]
+        frames.append(pd.DataFrame({"axis": axis, "value": [str(v) for v in labels],
+                                    "mean_prediction": means, "effect": means - overall})
+                      .sort_values("effect", ascending=False, kind="stable"))
+    return pd.concat(frames, ignore_index=True)
+
+
+def score_scenarios(artifact, spec: dict, top_n: int = None):
+    """
+    :return: (ranked, effects)  ranked 为按预测热度降序的情景表（top_n 为 None 时返回全部），
+             effects 为 marginal_effects 的结果
+    """
+    grid = predict_grid(artifact, spec)
+    table = scenario_table(spec)
+    table["predicted_popularity"] = grid.ravel()
+    ranked = table.sort_values("predicted_popularity", ascending=False, kind="stable")
+    if top_n is not None:
+        ranked = ranked.head(top_n)
+    ranked = ranked.reset_index(drop=True)
+    ranked.insert(0, "rank", range(1, len(ranked) + 1))
+    return ranked, marginal_effects(grid, spec)
@@ -1,11 +1,12 @@
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
 from store.anime_store import AnimeStore
 from util.visualization_part1 import (
+    get_studio_year_counts,
     plot_studio_capacity_pie,
+    plot_studio_concentration,
     plot_top10_studio_source_composition,
     plot_trend_anime_vs_studios,
+    studio_concentration_metrics,
 )
 
 # ========== page title + get data ==========
@@ -20,13 +21,21 @@ except FileNotFoundError as e:
     st.stop()
 
 try:
+    # 年份 × 工作室 计数矩阵按数据集版本缓存；下方滑块只触发向量化的指标计算
+    years, studio_year_counts = get_studio_year_counts(
+        anime_df, 2016, 2025, dataset_version=store.version, studio_bridge=store.studio_bridge
+    )
+    overall = studio_concentration_metrics(years, studio_year_counts, window=len(years), k=10).iloc[0]
+
     st.subheader("Top 10 Studios vs. Others")
     st.markdown(
-        """
-        The Japanese animation industry has flourished in recent years, with a constant stream of new studios emerging. According to data compiled from various sources, there are nearly 500 active animation studios in Japan, roughly double the number around 2000. These new studios have expanded the animation production pool, but production is not concentrated in the hands of a few giants; instead, it exhibits a "long tail" pattern: according to our statistics on animation data from 2016 to 2025, the top ten studios in terms of output produced approximately 23% of all series animations, a relatively low concentration. This means that most animated works are completed by numerous small and medium-sized studios, with the vast majority producing very little each year, some even participating in only one project over several years.
+        f"""
+        The Japanese animation industry has flourished in recent years, with a constant stream of new studios emerging. According to data compiled from various sources, there are nearly 500 active animation studios in Japan, roughly double the number around 2000. These new studios have expanded the animation production pool, but production is not concentrated in the hands of a few giants; instead, it exhibits a "long tail" pattern: according to our statistics on animation data from 2016 to 2025, the top ten studios in terms of output produced approximately {overall['top_k_share']:.0%} of all series animations, a relatively low concentration (HHI {overall['hhi']:.3f}, Gini {overall['gini']:.2f} across {overall['active_studios']} studios). This means that most animated works are completed by numerous small and medium-sized studios, with the vast majority producing very little each year, some even participating in only one project over several years.
         """
     )
-    fig, top_series = plot_studio_capacity_pie(anime_df, top_n=10)
+    fig, top_series = plot_studio_capacity_pie(
+        anime_df, top_n=10, studio_dim=store.studio_dim, studio_bridge=store.studio_bridge
+    )
     st.plotly_chart(fig, use_container_width=True)
     st.subheader("Top 10 Studios (by number of works)")
     st.table(top_series.rename_axis("studio").reset_index(name="count"))
@@ -35,9 +44,29 @@ except ValueError as e:
 except Exception as e:
     st.error(f"绘图时发生错误：{e}")
 
+# ========== Rolling concentration (HHI / Gini / Top-k share) ==========
+try:
+    st.subheader("Studio concentration over time")
+    st.markdown(
+        "*Slide the window length and k: each point aggregates the titles in a rolling window of years, and the top-k set is recomputed for every window rather than fixed in advance.*"
+    )
+    col_w, col_k = st.columns(2)
+    with col_w:
+        window = st.slider("Window (years)", 1, len(years), 1)
+    with col_k:
+        k = st.slider("k (top-k share)", 1, 30, 10)
+    metrics = studio_concentration_metrics(years, studio_year_counts, window=window, k=k)
+    st.plotly_chart(plot_studio_concentration(metrics, k=k), use_container_width=True)
+except ValueError as e:
+    st.error(f"数据格式错误：{e}")
+except Exception as e:
+    st.error(f"计算集中度指标时出错：{e}")
+
 # ========== Top 10 studios organized by source (horizontally stacked bars) ==========
 try:
-    fig2, studio_source_df = plot_top10_studio_source_composition(anime_df, top_n=10)
+    fig2, studio_source_df = plot_top10_studio_source_composition(
+        anime_df, top_n=10, studio_dim=store.studio_dim, studio_bridge=store.studio_bridge
+    )
     st.subheader("Source Composition of Works from Top 10 Studios")
     st.markdown(
         """
@@ -46,7 +75,7 @@ try:
     )
     st.plotly_chart(fig2, use_container_width=True)
     st.markdown(
-        "*Top 10 studios with the highest output of animated series from 2016 to 2025 (by number of works). It can be seen that no single studio produces significantly more works than the others. The output of the top studios is relatively close, while a large number of small studios in the long tail contribute nearly 80% of the total output.*"
+        f"*Top 10 studios with the highest output of animated series from 2016 to 2025 (by number of works). It can be seen that no single studio produces significantly more works than the others. The output of the top studios is relatively close, while a large number of small studios in the long tail contribute about {1 - overall['top_k_share']:.0%} of the total output.*"
     )
 except ValueError as e:
     st.error(f"数据格式错误：{e}")
@@ -55,18 +84,28 @@ except Exception as e:
 
 # ========== Annual Trend Chart: Anime Production vs. Number of Active Studios (2016-2025) ==========
 try:
-    file_path = "public\\data\\anilist_anime_2016_2025_cleaned.csv"
-    fig_trend, trend_df = plot_trend_anime_vs_studios(file_path=file_path, start_year=2016, end_year=2025)
+    fig_trend, trend_df, cohorts_df = plot_trend_anime_vs_studios(
+        df=anime_df, start_year=2016, end_year=2025,
+        dataset_version=store.version, studio_bridge=store.studio_bridge,
+    )
+    first, last = trend_df.iloc[0], trend_df.iloc[-1]
+    second = trend_df.iloc[1]
+    later_new = trend_df["new_studios"].iloc[2:]
+    total_studios = int(trend_df["new_studios"].sum())
     st.subheader("Annual changes in studio output and animation production (2016–2025)")
     st.markdown(
+        f"""
+        Looking at the annual trends, the overall "activity" of studios has increased. In {first['start_year']}, {first['studio_count']} different studios launched animation series, and this number reaches {last['studio_count']} by {last['start_year']}. Although the number of works decreased slightly around 2020 due to the pandemic, the overall trend is an increase in the number of studios participating in production each year. **A large number of new studios are entering the market:** For example, in {second['start_year']}, {second['new_studios']} studios were "new faces" appearing on the production list for the first time that year, and since then, about {later_new.min()}-{later_new.max()} new companies have joined the production ranks each year. During our observation period ({first['start_year']}–{last['start_year']}), the dataset contains a total of **{total_studios}** different production companies. This indicates that in addition to established companies, new studios are constantly being established and participating in animation production, supporting the rapidly growing content supply. This reflects both a strong market demand for content and the relatively low barriers to entry in the industry, allowing many small teams to receive outsourcing or collaborative work, thus extending the supply chain.
         """
-        Looking at the annual trends, the overall "activity" of studios has increased. In 2016, approximately 141 different studios launched animation series, and this number is projected to rise to approximately 182 by 2025. Although the number of works decreased slightly around 2020 due to the pandemic, the overall trend is an increase in the number of studios participating in production each year. **A large number of new studios are entering the market:** For example, in 2017, approximately 55 studios were "new faces" appearing on the production list for the first time that year, and since then, about 30-40 new companies have joined the production ranks each year. During our observation period (2016–2025), the dataset contains a total of **473** different production companies. This indicates that in addition to established companies, new studios are constantly being established and participating in animation production, supporting the rapidly growing content supply. This reflects both a strong market demand for content and the relatively low barriers to entry in the industry, allowing many small teams to receive outsourcing or collaborative work, thus extending the supply chain.
-        """
-    )    
+    )
     st.plotly_chart(fig_trend, use_container_width=True)
-except FileNotFoundError as e:
-    st.error(f"❌ 年度趋势数据文件未找到: {file_path}")
+
+    st.subheader("New studio cohorts: how many are still active each year")
+    st.markdown(
+        "*Rows are the year a studio first appears in the dataset (the first row also contains every studio that already existed), columns are calendar years, and each cell counts the cohort's studios with at least one work that year.*"
+    )
+    st.dataframe(cohorts_df, use_container_width=True)
 except ValueError as e:
     st.error(f"数据格式错误：{e}")
 except Exception as e:
-    st.error(f"读取年度趋势数据时出错: {e}")
+    st.error(f"计算年度趋势数据时出错: {e}")
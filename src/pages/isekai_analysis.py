@@ -1,8 +1,8 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 from store.anime_store import AnimeStore
-from util.visualization_part1 import plot_isekai_trends, plot_isekai_wordcloud
+from util.visualization_part1 import (
+    plot_isekai_trends, plot_tag_trends, isekai_wordcloud, cooccurring_tags
+)
 
 # ========== 页面标题 + 获取数据 ==========
 st.set_page_config(page_title="The Rise of Isekai Anime", layout="wide")
@@ -15,11 +15,14 @@ except FileNotFoundError as e:
     st.error(f"❌ {e}")
     st.stop()
 
+# 标签下拉选项：按出现作品数降序
+tag_options = list(store.tag_index.vocab[store.tag_index.doc_freq.argsort(kind="stable")[::-1]])
+
 # ========== Top 10 tags and Isekai trends (2016–2025) ==========
 try:
     st.subheader("Top 10 tags and Isekai trends (2016–2025)")
     fig, year_tag_counts, isekai_count = plot_isekai_trends(
-        df=anime_df, start_year=2016, end_year=2025
+        df=anime_df, start_year=2016, end_year=2025, tag_index=store.tag_index
     )
     
     st.markdown(
@@ -41,43 +44,93 @@ except ValueError as e:
 except Exception as e:
     st.error(f"绘图时发生错误：{e}")
 
+# ========== 任意标签趋势浏览 ==========
+try:
+    st.subheader("Tag trend explorer")
+    tag_index = store.tag_index
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        focus_tag = st.selectbox(
+            "Focus tag", tag_options,
+            index=tag_options.index("Isekai") if "Isekai" in tag_options else 0
+        )
+    with col2:
+        year_range = st.slider("Year range", 2016, 2025, (2016, 2025))
+    fig_tag, tag_year_counts, focus_count = plot_tag_trends(
+        df=anime_df, focus_tag=focus_tag,
+        start_year=year_range[0], end_year=year_range[1], tag_index=tag_index
+    )
+    col1, col2, col3 = st.columns([0.1, 0.8, 0.1])
+    with col2:
+        st.plotly_chart(fig_tag, use_container_width=False, key="tag_trend_explorer")
+    st.markdown(
+        f"""
+        *{focus_tag} appears in {int(focus_count['count'].sum())} titles between {year_range[0]} and {year_range[1]}
+        (peak: {int(focus_count['count'].max())} titles in {int(focus_count.loc[focus_count['count'].idxmax(), 'start_year'])}).*
+        """
+    )
+except ValueError as e:
+    st.error(f"数据格式错误：{e}")
+except Exception as e:
+    st.error(f"绘图时发生错误：{e}")
+
 # ========== Isekai 标签词云 ==========
 try:
     st.subheader("Isekai anime tag word cloud")
-    fig_wordcloud, tfidf_rank = plot_isekai_wordcloud(df=anime_df)
+    # 词云 PNG 与 TF-IDF 排名按内容哈希缓存到磁盘，只在首次渲染时占用后台线程
+    wordcloud_png, tfidf_rank = isekai_wordcloud(df=anime_df)
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        st.pyplot(fig_wordcloud, use_container_width=True)
+        st.image(wordcloud_png, use_container_width=True)
 except ValueError as e:
     st.error(f"数据格式错误：{e}")
 except Exception as e:
     st.error(f"生成词云时发生错误：{e}")
 
-# ========== 分析说明 ==========
+# ========== 标签共现 ==========
 st.subheader("Top 10 Co-occurring Tags with Isekai")
-col1, col2, col3 = st.columns([1.3, 2, 0.5])
-with col2:
-    st.markdown(
-        """
-        | Rank | Tag | Count |
-        |------|-----|-------|
-        | 1 | Magic | 256 |
-        | 2 | Male Protagonist | 209 |
-        | 3 | Female Protagonist | 174 |
-        | 4 | Primarily Female Cast | 140 |
-        | 5 | Medieval | 118 |
-        | 6 | Female Harem | 114 |
-        | 7 | Demons | 109 |
-        | 8 | Swordplay | 106 |
-        | 9 | Ensemble Cast | 101 |
-        | 10 | Heterosexual | 97 |
-        """
-    )
+try:
+    # 共现矩阵 XᵀX 按数据集版本缓存，切换标签 / 排序方式只读取其中一行
+    isekai_related = cooccurring_tags(store.tag_index, "Isekai", n=10, dataset_version=store.version)
+    top_isekai_partner = isekai_related.loc[0, "Tag"] if len(isekai_related) else "Magic"
+    col1, col2, col3 = st.columns([1.3, 2, 0.5])
+    with col2:
+        st.dataframe(isekai_related[["Rank", "Tag", "Count"]], hide_index=True)
+
+    with st.expander("Co-occurrence explorer (any tag, ranked by count / lift / PMI)"):
+        col1, col2, col3 = st.columns([1, 1, 1])
+        with col1:
+            cooc_tag = st.selectbox(
+                "Tag", tag_options,
+                index=tag_options.index("Isekai") if "Isekai" in tag_options else 0,
+                key="cooc_tag"
+            )
+        with col2:
+            cooc_sort = st.radio("Rank by", ["count", "lift", "pmi"], horizontal=True,
+                                 format_func=lambda x: {"count": "Count", "lift": "Lift", "pmi": "PMI"}[x])
+        with col3:
+            cooc_min = st.number_input("Minimum co-occurrences", min_value=1, value=10, step=1)
+        st.dataframe(
+            cooccurring_tags(store.tag_index, cooc_tag, n=20, sort_by=cooc_sort,
+                             min_count=int(cooc_min), dataset_version=store.version),
+            hide_index=True,
+            column_config={
+                "Lift": st.column_config.NumberColumn(format="%.2f"),
+                "PMI": st.column_config.NumberColumn(format="%.2f"),
+            },
+        )
+        st.markdown(
+            "*Lift = P(A, B) / (P(A)·P(B)); values above 1 mean the two tags appear together more often than chance. PMI = log₂(Lift).*"
+        )
+except ValueError as e:
+    top_isekai_partner = "Magic"
+    st.error(f"数据格式错误：{e}")
+
 st.markdown(
-    """
+    f"""
     Based on the visualization results of this project and the real-world information we collected, we found that the popularity of the isekai (another world) genre is actually an external manifestation of the **industrialization of Japanese anime**. The content supply for this genre is low-cost and predictable, and its settings are highly modular (protagonist growth, leveling/systems, nation-building/harem/royal path/plot twists, etc.), allowing for the creation of new stories by replacing details within the same worldview template. For publishers looking to quickly attract viewers, this is a shortcut to "rapidly replicating successful elements."
 
-    Furthermore, we observed an explosive growth in the number of isekai works between 2020 and 2021, making it a significant genre in the anime lineup that season. This was primarily due to the strong expansion of streaming platforms during the pandemic, which facilitated cross-cultural dissemination of isekai and fantasy themes (statistics show that "Magic" was the most frequent tag appearing alongside "isekai" in the dataset; the top 10 tags reveal that isekai works are mostly set in medieval magical backgrounds and focus on combat). Furthermore, existing successful examples (such as *Re:Zero* and *That Time I Got Reincarnated as a Slime*) instilled commercial confidence in "replicating successful models."
+    Furthermore, we observed an explosive growth in the number of isekai works between 2020 and 2021, making it a significant genre in the anime lineup that season. This was primarily due to the strong expansion of streaming platforms during the pandemic, which facilitated cross-cultural dissemination of isekai and fantasy themes (statistics show that "{top_isekai_partner}" was the most frequent tag appearing alongside "isekai" in the dataset; the top 10 tags reveal that isekai works are mostly set in medieval magical backgrounds and focus on combat). Furthermore, existing successful examples (such as *Re:Zero* and *That Time I Got Reincarnated as a Slime*) instilled commercial confidence in "replicating successful models."
 
     However, in recent years, due to the influence of public opinion in the community, the proliferation of isekai (another world) anime has become synonymous with "low quality," which reflects the saturation of the isekai genre. Therefore, it is foreseeable that isekai works will not disappear, but their scale will slowly shrink, and they will not be able to replicate the increasingly prosperous scene of the past decade.
     """
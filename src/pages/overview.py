@@ -52,7 +52,7 @@ st.markdown("<hr>", unsafe_allow_html=True)
 # Studio and platform partnerships analysis
 st.header("**Studio and Platform Partnerships Analysis**")
 st.markdown("This analysis focuses on the relationships between anime studios and platforms, highlighting key collaborations that drive trends in the industry.")
-over_vl.plot_studio_platform_partnerships(anime_df)
+over_vl.plot_studio_platform_partnerships(anime_df, studio_dim=store.studio_dim)
 
 # Add a separator between sections
 st.markdown("<hr>", unsafe_allow_html=True)
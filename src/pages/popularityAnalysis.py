@@ -12,4 +12,4 @@ except FileNotFoundError as e:
     st.stop()
 
 # ========== 调用可视化函数 ==========
-vl.plot_popularity_analysis(anime_df)
+vl.plot_popularity_analysis(anime_df, studio_dim=store.studio_dim)
@@ -1,9 +1,18 @@
+import json
+
 import streamlit as st
+from model.predict import TOP_N
+from model.whatif import WHATIF_AXES, genre_combinations, scenario_count
+from util.prediction_visualization import (
+    filter_predictions, get_explanations, get_importance, get_predictions, get_whatif, load_candidates, load_model,
+    model_is_stale, offline_predictions, plot_contributions, plot_marginal_effects, plot_permutation_importance, predictions_csv,
+    studio_prediction_ranking, whatif_options,
+)
 
 st.set_page_config(page_title="Predictions Report", layout="wide")
 st.title("Prediction")
 
-md = """
+md_intro = """
 # Hit Analysis – Predicting Hit Anime Series in January 2026
 
 This module uses cleaned AniList data from 2016–2025 to construct a regression model with "whether it's a sequel, average popularity of the production company, production format, number of episodes, duration, average rating, and genre-specific popularity vector" as the main features. A Random Forest Regressor is used, and GridSearchCV is employed for hyperparameter search on the R² metric (50% CV). Finally, the model is trained on all training data and used to predict anime series for the winter of 2026. The results are written to a CSV file and ranked by popularity.
@@ -146,67 +155,9 @@ features.extend(genre_vector)
 
 
 4. Add the one-hot encoding to the feature column using `features.extend(genre_vector)`.
+"""
 
-## Results
-
-### Top10 Predicted Popularity
-
-| Rank | Title                                    | Predicted Popularity |
-| ---- | ---------------------------------------- | -------------------- |
-| 1    | Fate/strange Fake                        | 50273.4              |
-| 2    | Jigokuraku 2nd Season                    | 34273.2              |
-| 3    | Eris no Seihai                           | 28170.6              |
-| 4    | Mato Seihei no Slave 2                   | 24646.7              |
-| 5    | Jingai Kyoushitsu no Ningengirai Kyoushi | 23794.1              |
-| 6    | Okiraku Ryoushu no Tanoshii Ryouchi Boue | 22871.4              |
-| 7    | Jujutsu Kaisen: Shimetsu Kaiyuu - Zenpen | 22677.5              |
-| 8    | [Oshi no Ko] 3rd Season                  | 22236.5              |
-| 9    | Sousou no Frieren 2nd Season             | 19472.2              |
-| 10   | 29-sai Dokushin Chuuken Boukensha no Nic | 18883.4              |
-
-### Studio Average Predicted Popularity Ranking
-
-*(Studios with ≥1 Anime)*
-
-| Rank | Studio           | Avg Predicted Popularity | Count |
-| ---- | ---------------- | ------------------------ | ----- |
-| 1    | MAPPA            | 28475.3                  | 2     |
-| 2    | Ashi Productions | 28170.6                  | 1     |
-| 3    | A-1 Pictures     | 25453.8                  | 2     |
-| 4    | Hayabusa Film    | 24646.7                  | 1     |
-| 5    | Passione         | 24646.7                  | 1     |
-| 6    | Asread           | 23794.1                  | 1     |
-| 7    | NAZ              | 22871.4                  | 1     |
-| 8    | Doga Kobo        | 22236.5                  | 1     |
-| 9    | MADHOUSE         | 19472.2                  | 1     |
-| 10   | HORNETS          | 18883.4                  | 1     |
-| 11   | A.C.G.T.         | 18802.1                  | 1     |
-| 12   | David Production | 16847.9                  | 1     |
-| 13   | J.C.STAFF        | 13380.5                  | 1     |
-| 14   | 8-bit            | 12468.8                  | 1     |
-| 15   | Signal.MD        | 12453.6                  | 1     |
-
-## Model Performance Summary
-
-**Model Type:** Random Forest Regressor (Grid Search Optimized)
-
-**Best Parameters:**  
-
-```json
-{
-    "bootstrap": true,
-    "max_depth": 20,
-    "max_features": "sqrt",
-    "min_samples_leaf": 1,
-    "min_samples_split": 2,
-    "n_estimators": 200
-}
-```
-
-**Training R² Score:** 0.9290
-
-**Validation R² Score:** 0.5465
-
+md_findings = """
 Key patterns observed in the results:
 
 - **Signature Effect:** Sequels and existing IPs (such as Sousou no Frieren, Jigokuraku, and the Fate series) received higher predicted values, indicating that historical popularity in the training set has a strong predictive power for subsequent works of the same IP.
@@ -222,4 +173,222 @@ Considering the current industry environment, we found that the predicted result
 The current model can capture key signals such as "IP effect, production company, and genre," providing reasonable Top-N predictions, which is valuable for content planning and distribution prioritization. However, if used as a basis for decision-making, it should be supplemented with more preceding and market signals, report uncertainties, and adopt logarithmic targets and richer model integration strategies to reduce bias and improve the ability to identify sudden hits.
 """
 
-st.markdown(md)
+st.markdown(md_intro)
+
+# ========== 模型与候选集（模型每个进程只加载一次，打分按 模型版本 + 候选文件哈希 缓存） ==========
+st.markdown("## Results")
+artifact, candidates = None, None
+try:
+    artifact = load_model()
+    candidates, candidate_version = load_candidates()
+    results = get_predictions(artifact, candidates, candidate_version)
+    st.caption(
+        f"Live predictions from model version `{artifact.version}` "
+        f"(trained {artifact.metadata['created_at']} on {artifact.metadata['n_train']} titles) "
+        f"for {len(results)} candidate titles."
+    )
+    if model_is_stale(artifact):
+        st.warning(
+            f"Stale model: the training data changed after version `{artifact.version}` was trained. "
+            "These predictions still come from that version; refresh it with "
+            "`PYTHONPATH=src python -m model.incremental`."
+        )
+except Exception as e:
+    # 模型能加载但无法给候选集打分（如标签特征模型 + 无 tags 列的候选集）时，不再展示候选作品的分解
+    candidates = None
+    results = offline_predictions()
+    st.warning(f"模型加载失败，以下为 notebook 导出的离线预测结果：{e}")
+
+# ========== 筛选与排序 ==========
+SORT_OPTIONS = {
+    "Predicted popularity": "predicted_popularity",
+    "Start date": "start_date",
+    "Title": "title",
+}
+col1, col2, col3 = st.columns([1, 1, 1])
+with col1:
+    title_query = st.text_input("Title contains")
+    studio_query = st.text_input("Studio contains")
+with col2:
+    formats = st.multiselect("Format", sorted(results["format"].dropna().unique()))
+    genres = st.multiselect("Genres (all selected)", sorted(set(results["genre_list"].explode().dropna())))
+with col3:
+    sort_label = st.selectbox("Sort by", list(SORT_OPTIONS))
+    ascending = st.toggle("Ascending", value=False)
+
+filtered = filter_predictions(
+    results, title_query=title_query, formats=formats, genres=genres, studio_query=studio_query,
+    sort_by=SORT_OPTIONS[sort_label], ascending=ascending,
+)
+st.markdown(f"### Predicted Popularity ({len(filtered)} titles)")
+st.dataframe(
+    filtered.drop(columns=["genre_list"]),
+    hide_index=True,
+    column_config={
+        "rank": "Rank",
+        "id": None,
+        "title": "Title",
+        "predicted_popularity": st.column_config.NumberColumn("Predicted Popularity", format="%.1f"),
+        "popularity_low": st.column_config.NumberColumn(
+            "Popularity p10", format="%.0f", help="10th percentile of the per-tree predictions"
+        ),
+        "popularity_high": st.column_config.NumberColumn(
+            "Popularity p90", format="%.0f", help="90th percentile of the per-tree predictions"
+        ),
+        "rank_low": st.column_config.NumberColumn(
+            "Best Rank (p10)", help="Rank among all candidates in the most optimistic 10% of trees"
+        ),
+        "rank_high": st.column_config.NumberColumn(
+            "Worst Rank (p90)", help="Rank among all candidates in the most pessimistic 10% of trees"
+        ),
+        "p_top_n": st.column_config.ProgressColumn(
+            f"P(Top {TOP_N})", format="%.2f", min_value=0.0, max_value=1.0,
+            help=f"Share of trees that rank this title in the top {TOP_N} candidates"
+        ),
+        "studio": "Studio",
+        "genres": "Genres",
+        "format": "Format",
+        "start_date": "Start Date",
+        "top_drivers": st.column_config.TextColumn(
+            "Top Drivers", help="Features that moved this prediction most (decision-path contributions)"
+        ),
+    },
+)
+
+if "popularity_low" in filtered:
+    st.caption(
+        "Intervals and rank ranges come from the spread of the forest's individual trees: "
+        "wide ranges mean the trees disagree and the rank is unstable. Ranks are over all candidates."
+    )
+st.download_button("Download predictions (CSV)", predictions_csv(filtered), file_name="2026_winter_predictions.csv",
+                   mime="text/csv")
+
+st.markdown("### Studio Average Predicted Popularity Ranking")
+st.markdown("*(Studios with ≥1 Anime; co-productions count towards every studio involved)*")
+st.dataframe(
+    studio_prediction_ranking(filtered, top_n=15),
+    hide_index=True,
+    column_config={"Avg Predicted Popularity": st.column_config.NumberColumn(format="%.1f")},
+)
+
+# ========== 模型信息 ==========
+if artifact is not None:
+    meta = artifact.metadata
+    st.markdown("## Model Performance Summary")
+    st.markdown("**Model Type:** Random Forest Regressor (Grid Search Optimized)")
+    st.markdown("**Best Parameters:**")
+    st.code(json.dumps(meta["params"], indent=4), language="json")
+    st.markdown(f"**Training R² Score:** {meta['train_r2']:.4f}")
+    st.markdown(f"**Validation R² Score:** {meta['validation_r2']:.4f}")
+    if artifact.target == "log1p":
+        st.caption("Trained on log1p(popularity); predictions are transformed back, R² is on the original scale.")
+    if meta.get("mode") == "incremental":
+        last = meta["history"][-1]
+        if last["new_trees"]:
+            st.caption(
+                f"Incrementally refreshed from version {meta['parent']}: {last['new_trees']} trees added for "
+                f"{last['n_new']} new titles ({meta['n_trees']} trees in total); R² on the new titles before the "
+                f"refresh was {last['forward_r2']:.4f}. The scores above are from the last full training run."
+            )
+        else:
+            st.caption(
+                f"Incrementally refreshed from version {meta['parent']}: studio averages updated for "
+                f"{last.get('n_changed', 0)} titles whose popularity changed; no trees added. "
+                "The scores above are from the last full training run."
+            )
+
+    st.markdown("### What Drives the Predictions")
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        st.markdown("**Permutation importance** (training data)")
+        try:
+            importance = get_importance(artifact)
+        except Exception as e:
+            # 后台计算失败时只跳过这张图，不影响页面其余部分
+            st.warning(f"Permutation importance could not be computed; reload the page to retry. ({e})")
+        else:
+            if importance is None:
+                st.info("Permutation importance for this model version is being computed in the background; "
+                        "reload the page in a few seconds.")
+            else:
+                st.plotly_chart(plot_permutation_importance(importance), use_container_width=True,
+                                key="permutation_importance")
+    with col2:
+        st.markdown("**Breakdown of one prediction**")
+        if candidates is not None:
+            explanations = get_explanations(artifact, candidates, candidate_version)
+            titles = candidates["title"].fillna(candidates["id"].astype(str)).tolist()
+            row = st.selectbox("Candidate", range(len(titles)), format_func=lambda i: titles[i])
+            if artifact.target == "log1p":
+                st.caption(f"Contributions are in log1p(popularity) units; "
+                           f"bias (average training log1p popularity): {explanations['bias'].iloc[row]:.3f}")
+            else:
+                st.caption(f"Average training popularity (bias): {explanations['bias'].iloc[row]:,.0f}")
+            st.plotly_chart(plot_contributions(explanations, row, log_target=artifact.target == "log1p"), use_container_width=True, key="contributions")
+
+
+# ========== What-if 情景（整个网格一次打分，按 模型版本 + 情景范围 缓存） ==========
+MAX_SCENARIOS = 500_000
+if artifact is not None and artifact.builder.tags is not None:
+    st.markdown("## What-if Scenarios")
+    st.info(f"Model version `{artifact.version}` uses tag features, which the scenario grid cannot vary; "
+            "what-if scoring is only available for models trained without `--tag-dim`.")
+elif artifact is not None:
+    options = whatif_options(artifact)
+    st.markdown("## What-if Scenarios")
+    st.markdown(
+        "Pick ranges for each feature; every combination is scored by the model. "
+        "Source material is not a model feature, so it cannot be varied here."
+    )
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        wi_studios = st.multiselect("Studios", options["studio"], default=options["studio"][:5])
+        wi_formats = st.multiselect("Formats", options["format"], default=["TV", "MOVIE", "ONA"])
+        wi_sequel = st.multiselect("Sequel", ["No", "Yes"], default=["No", "Yes"])
+    with col2:
+        wi_episodes = st.multiselect("Episodes", [1, 6, 8, 12, 13, 24, 25, 50], default=[12, 13, 24])
+        wi_duration = st.multiselect("Duration (min)", [5, 12, 24, 30, 45, 90, 120], default=[24])
+        wi_score = st.multiselect("Average score (0 = not yet rated)", [0, 60, 65, 70, 75, 80, 85], default=[0, 70])
+    with col3:
+        wi_genres = st.multiselect("Genres", options["genres"],
+                                   default=[g for g in ["Action", "Fantasy", "Romance", "Comedy"] if g in options["genres"]])
+        wi_sizes = st.multiselect("Genres per title", [1, 2, 3], default=[1, 2])
+
+    spec = {
+        "studio": wi_studios,
+        "format": wi_formats,
+        "episodes": wi_episodes,
+        "duration": wi_duration,
+        "average_score": wi_score,
+        "is_sequel": [int(s == "Yes") for s in wi_sequel],
+        "genres": genre_combinations(wi_genres, sorted(wi_sizes)),
+    }
+    missing = [axis for axis in WHATIF_AXES if not spec[axis]]
+    if missing:
+        st.info(f"Select at least one value for: {', '.join(missing)}")
+    elif scenario_count(spec) > MAX_SCENARIOS:
+        st.warning(f"{scenario_count(spec):,} scenarios selected; narrow the ranges to at most {MAX_SCENARIOS:,}.")
+    else:
+        ranked, effects = get_whatif(artifact, spec)
+        st.markdown(f"### Top Scenarios ({len(ranked):,} scored)")
+        st.dataframe(
+            ranked.head(25),
+            hide_index=True,
+            column_config={
+                "rank": "Rank",
+                "studio": "Studio",
+                "format": "Format",
+                "episodes": "Episodes",
+                "duration": "Duration",
+                "average_score": "Avg Score",
+                "is_sequel": "Sequel",
+                "genres": "Genres",
+                "predicted_popularity": st.column_config.NumberColumn("Predicted Popularity", format="%.1f"),
+            },
+        )
+        st.markdown("### Marginal Effects")
+        st.caption("Average prediction with the value fixed and every other selection varied, minus the grid average.")
+        effect_axis = st.selectbox("Feature", WHATIF_AXES, format_func=lambda a: a.replace("_", " ").title())
+        st.plotly_chart(plot_marginal_effects(effects, effect_axis), use_container_width=True, key="whatif_effects")
+
+st.markdown(md_findings)
@@ -18,4 +18,4 @@ sv.plot_source_year_analysis(df)
 
 sv.plot_source_genre_analysis(df)
 
-sv.plot_source_score_analysis(df)
+sv.plot_source_score_analysis(df, dataset_version=store.version)
@@ -1,19 +1,38 @@
 # store/anime_store.py
+import hashlib
+import io
+import threading
 import pandas as pd
 from typing import Optional
+from store.studio_dimension import build_studio_dimension, primary_studio_codes
+from store.tag_index import TagIndex
+
+DATA_PATH = "public/data/anilist_anime_2016_2025.csv"
+
 
 class AnimeStore:
     # 单例实例
     _instance = None
+    # 多个会话（以及启动时的后台预热线程）可能同时首次创建实例，加锁保证只加载一次
+    _lock = threading.Lock()
     # 存储加载的原始数据
     _data: Optional[pd.DataFrame] = None
+    # 数据集版本（原始文件内容的哈希），用作各页面缓存的键
+    _version: Optional[str] = None
+    # 工作室维表与 作品-工作室 桥表（加载时构建一次）
+    _studio_dim: Optional[pd.DataFrame] = None
+    _studio_bridge: Optional[pd.DataFrame] = None
+    # 作品×标签 稀疏矩阵与标签词表（加载时构建一次）
+    _tag_index: Optional[TagIndex] = None
 
     def __new__(cls):
         """单例模式：确保全局只有一个AnimeStore实例"""
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            # 实例化时自动加载数据
-            cls._instance._load_data()
+        with cls._lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                # 实例化时自动加载数据（加载完成后才对其他线程可见）
+                instance._load_data()
+                cls._instance = instance
         return cls._instance
 
     def _load_data(self):
@@ -21,16 +40,25 @@ class AnimeStore:
         # 避免重复加载数据
         if self._data is not None:
             return
-        
+
         try:
-            # 读取原始数据文件（路径保持不变）
-            df = pd.read_csv("public/data/anilist_anime_2016_2025.csv")
-            # 仅存储原始数据，不做任何填充/类型转换
+            # 读取原始数据文件（路径保持不变），同时计算内容哈希作为数据集版本
+            with open(DATA_PATH, "rb") as f:
+                raw = f.read()
+            df = pd.read_csv(io.BytesIO(raw))
+            # 构建工作室维表，并在主表上附加整数编码 studio_id（主工作室，未知为 -1），
+            # 各页面按编码分组，不再各自对工作室名做字符串归一化
+            self._studio_dim, self._studio_bridge = build_studio_dimension(df["mainStudio"])
+            df["studio_id"] = primary_studio_codes(self._studio_bridge, len(df)).to_numpy()
+            # 标签只拆分一次，后续按年份/任意标签的统计都基于稀疏矩阵
+            self._tag_index = TagIndex.from_tags(df["tags"])
+            # 其余字段仅存储原始数据，不做任何填充/类型转换
             self._data = df
+            self._version = hashlib.md5(raw).hexdigest()[:12]
         except FileNotFoundError as e:
             # 自定义异常提示，方便定位问题
             raise FileNotFoundError(
-                f"数据文件未找到，请检查路径是否正确：public/data/anilist_anime_2016_2025.csv"
+                f"数据文件未找到，请检查路径是否正确：{DATA_PATH}"
             ) from e
 
     @property
@@ -39,4 +67,33 @@ class AnimeStore:
         if self._data is None:
             raise RuntimeError("数据加载失败，请检查文件是否存在或路径是否正确")
         # 返回副本，避免外部修改原数据
-        return self._data.copy()
\ No newline at end of file
+        return self._data.copy()
+
+    @property
+    def version(self) -> str:
+        """数据集版本号：原始CSV内容的哈希，数据文件变化时随之变化，用于 st.cache_data 的缓存键"""
+        if self._version is None:
+            raise RuntimeError("数据加载失败，请检查文件是否存在或路径是否正确")
+        return self._version
+
+    @property
+    def studio_dim(self) -> pd.DataFrame:
+        """工作室维表：studio_id / name（规范显示名）/ norm_name / aliases / n_titles"""
+        if self._studio_dim is None:
+            raise RuntimeError("数据加载失败，请检查文件是否存在或路径是否正确")
+        return self._studio_dim.copy()
+
+    @property
+    def studio_bridge(self) -> pd.DataFrame:
+        """作品-工作室 桥表：row（df 中的行位置）/ studio_id，多工作室作品对应多行"""
+        if self._studio_bridge is None:
+            raise RuntimeError("数据加载失败，请检查文件是否存在或路径是否正确")
+        return self._studio_bridge.copy()
+
+
+    @property
+    def tag_index(self) -> TagIndex:
+        """作品×标签 稀疏矩阵（行位置与 df 一致）；各页面共享同一对象，请勿原地修改"""
+        if self._tag_index is None:
+            raise RuntimeError("数据加载失败，请检查文件是否存在或路径是否正确")
+        return self._tag_index
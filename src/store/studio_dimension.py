@@ -0,0 +1,94 @@
+# store/studio_dimension.py
+import pandas as pd
+from typing import Iterable, List, Optional, Tuple
+
+# 缺失/未知工作室的编码
+UNKNOWN_STUDIO_ID = -1
+# 多个工作室之间的逗号；公司后缀前的逗号（如 'Yamamura Animation, Inc.'）属于名称本身，不拆分
+STUDIO_SEPARATOR = r",(?!\s*(?:Inc|Ltd|Co)\.?\s*(?:,|$))\s*"
+
+
+def normalize_studio_name(name) -> str:
+    """归一化工作室名称：只保留字母数字并小写，便于匹配不同写法（如 'J.C.STAFF' / 'JC Staff'）"""
+    if not isinstance(name, str):
+        return ""
+    return "".join(ch.lower() for ch in name if ch.isalnum())
+
+
+def _normalize_series(names: pd.Series) -> pd.Series:
+    """normalize_studio_name 的向量化版本（去掉所有非字母数字字符后小写）"""
+    return names.str.replace(r"[\W_]+", "", regex=True).str.lower()
+
+
+def build_studio_dimension(main_studio: pd.Series) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    由 mainStudio 列构建工作室维表与 作品-工作室 桥表（加载数据时执行一次）。
+
+    - 一个单元格内可能用逗号列出多个工作室，按逗号拆分（Inc. / Ltd. / Co. 等公司后缀前的逗号除外）；
+      空值 / 'Unknown' 不计入
+    - 归一化名称相同的不同写法视为同一工作室（别名），显示名取出现次数最多的写法
+
+    :param main_studio: 原始 mainStudio 列
+    :return: (studio_dim, studio_bridge)
+        studio_dim: 列 studio_id / name / norm_name / aliases / n_titles，studio_id 即行号
+        studio_bridge: 列 row（在输入 Series 中的位置）/ studio_id，每个 作品×工作室 一行
+    """
+    names = (
+        main_studio.reset_index(drop=True)
+                   .fillna("")
+                   .astype(str)
+                   .str.split(STUDIO_SEPARATOR, regex=True)
+                   .explode()
+                   .str.strip()
+    )
+    names = names[(names != "") & (names.str.lower() != "unknown")]
+    norm = _normalize_series(names)
+    keep = norm != ""
+    names, norm = names[keep], norm[keep]
+
+    codes, uniques = pd.factorize(norm, sort=True)
+    pairs = pd.DataFrame({"row": names.index.to_numpy(), "studio_id": codes, "name": names.to_numpy()})
+
+    # 别名：每个 studio_id 下出现过的全部原始写法；显示名取最常见的写法（并列时按字母序）
+    variants = pairs.groupby(["studio_id", "name"]).size().reset_index(name="n")
+    variants = variants.sort_values(["studio_id", "n", "name"], ascending=[True, False, True])
+    studio_dim = pd.DataFrame({
+        "studio_id": range(len(uniques)),
+        "name": variants.groupby("studio_id")["name"].first().to_numpy(),
+        "norm_name": list(uniques),
+        "aliases": variants.groupby("studio_id")["name"].agg(lambda s: tuple(sorted(s))).to_numpy(),
+        "n_titles": pairs.drop_duplicates(["row", "studio_id"]).groupby("studio_id").size().to_numpy(),
+    })
+
+    studio_bridge = pairs[["row", "studio_id"]].drop_duplicates().reset_index(drop=True)
+    return studio_dim, studio_bridge
+
+
+def primary_studio_codes(studio_bridge: pd.DataFrame, n_rows: int) -> pd.Series:
+    """每部作品的主工作室编码（单元格中列出的第一个工作室），无工作室时为 UNKNOWN_STUDIO_ID"""
+    first = studio_bridge.drop_duplicates("row").set_index("row")["studio_id"]
+    return first.reindex(range(n_rows), fill_value=UNKNOWN_STUDIO_ID).astype("int32")
+
+
+def studio_codes_for(df: pd.DataFrame,
+                     studio_dim: Optional[pd.DataFrame] = None,
+                     studio_bridge: Optional[pd.DataFrame] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    返回 df 对应的 (studio_dim, studio_bridge)。
+
+    页面传入 AnimeStore 预先构建好的维表/桥表时直接使用（桥表的 row 与 store.df 的行位置一致）；
+    未传入时（例如直接读 CSV 调用绘图函数）按 df 的 mainStudio / mainstudio 列现场构建。
+    """
+    if studio_dim is not None and studio_bridge is not None:
+        return studio_dim, studio_bridge
+    col_map = {c.lower(): c for c in df.columns}
+    main_col = col_map.get("mainstudio")
+    if main_col is None:
+        raise ValueError("数据中未找到工作室列（期望列名 mainStudio 或 mainstudio）")
+    return build_studio_dimension(df[main_col])
+
+
+def lookup_studio_ids(studio_dim: pd.DataFrame, names: Iterable[str]) -> List[int]:
+    """按归一化名称把工作室名称（任意写法）解析为 studio_id，找不到的返回 UNKNOWN_STUDIO_ID"""
+    norm_to_id = dict(zip(studio_dim["norm_name"], studio_dim["studio_id"]))
+    return [int(norm_to_id.get(normalize_studio_name(n), UNKNOWN_STUDIO_ID)) for n in names]
@@ -0,0 +1,152 @@
+# store/tag_index.py
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from typing import Iterable, List, Optional
+
+
+class TagIndex:
+    """
+    tags 列的稀疏 作品×标签 矩阵（CSR，0/1）及标签词表，加载数据时构建一次。
+
+    - matrix[i, j] = 1 表示第 i 部作品（与构建时的行位置一致）带有标签 vocab[j]
+    - 任意分组（如年份）下的标签计数 = 分组指示矩阵 @ matrix，无需再 explode 整张表
+    """
+
+    def __init__(self, matrix: sp.csr_matrix, vocab: np.ndarray):
+        self.matrix = matrix
+        self.vocab = vocab
+        self._position = {tag: i for i, tag in enumerate(vocab)}
+        # 每个标签出现在多少部作品中
+        self.doc_freq = np.asarray(matrix.sum(axis=0)).ravel().astype(np.int64)
+
+    @classmethod
+    def from_tags(cls, tags: pd.Series, sep: str = "|") -> "TagIndex":
+        """由 'A|B|C' 形式的 tags 列构建（空值视为无标签）"""
+        exploded = (
+            tags.reset_index(drop=True)
+                .fillna("")
+                .astype(str)
+                .str.split(sep)
+                .explode()
+                .str.strip()
+        )
+        exploded = exploded[exploded != ""]
+        cols, vocab = pd.factorize(exploded, sort=True)
+        rows = exploded.index.to_numpy()
+        matrix = sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(len(tags), len(vocab)),
+        )
+        # 同一作品重复出现的标签只记一次
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return cls(matrix, np.asarray(vocab, dtype=object))
+
+    @property
+    def n_docs(self) -> int:
+        return self.matrix.shape[0]
+
+    def __contains__(self, tag) -> bool:
+        return tag in self._position
+
+    def columns(self, tags: Iterable[str]) -> List[int]:
+        """标签名 → 列号（不存在的标签忽略）"""
+        return [self._position[t] for t in tags if t in self._position]
+
+    def top_tags(self, n: int = 10, exclude_keywords: Optional[Iterable[str]] = None) -> List[str]:
+        """按出现作品数降序返回前 n 个标签，可按子串排除（如 'Male' / 'Female' / 'Cast'）"""
+        order = np.argsort(-self.doc_freq, kind="stable")
+        keywords = list(exclude_keywords or [])
+        result = []
+        for j in order:
+            tag = self.vocab[j]
+            if any(k in tag for k in keywords):
+                continue
+            result.append(tag)
+            if len(result) >= n:
+                break
+        return result
+
+    def counts_by_group(self, group_codes: np.ndarray, n_groups: int) -> np.ndarray:
+        """
+        分组 × 标签 计数矩阵：构造 (n_groups × n_docs) 的 0/1 指示矩阵后与标签矩阵相乘。
+
+        :param group_codes: 每部作品的组号（0..n_groups-1），负数表示不属于任何组
+        :return: 稠密 int64 数组，形状 (n_groups, 词表大小)
+        """
+        group_codes = np.asarray(group_codes)
+        docs = np.flatnonzero(group_codes >= 0)
+        indicator = sp.csr_matrix(
+            (np.ones(len(docs), dtype=np.int32), (group_codes[docs], docs)),
+            shape=(n_groups, self.n_docs),
+        )
+        return (indicator @ self.matrix).toarray().astype(np.int64)
+
+    def counts_by_year(self, years, start_year: int, end_year: int,
+                       tags: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        年份 × 标签 计数表。
+
+        :param years: 每部作品的年份（可含 NaN），长度与构建时的行数一致
+        :param tags: 只返回这些标签的列；None 返回全部标签
+        :return: DataFrame，索引为 start_year..end_year，列为标签
+        """
+        years = pd.to_numeric(pd.Series(np.asarray(years)), errors="coerce")
+        in_range = years.between(start_year, end_year)
+        codes = np.where(in_range, years.fillna(start_year).astype(int) - start_year, -1)
+        counts = self.counts_by_group(codes, end_year - start_year + 1)
+
+        if tags is None:
+            cols, labels = slice(None), self.vocab
+        else:
+            tags = [t for t in tags if t in self._position]
+            cols, labels = self.columns(tags), tags
+        return pd.DataFrame(
+            counts[:, cols],
+            index=pd.RangeIndex(start_year, end_year + 1, name="start_year"),
+            columns=pd.Index(labels, name="tag"),
+        )
+
+    def cooccurrence(self) -> sp.csr_matrix:
+        """
+        标签共现矩阵 XᵀX（稀疏，int64）：[a, b] 为同时带有标签 a、b 的作品数，对角线即 doc_freq。
+
+        全量两两计算开销较大，页面应通过带版本缓存的入口获取（见 get_tag_cooccurrence）。
+        """
+        x = self.matrix.astype(np.int64)
+        return (x.T.tocsr() @ x).tocsr()
+
+    def related_tags(self, cooc: sp.csr_matrix, tag: str, n: int = 10,
+                     sort_by: str = "count", min_count: int = 1) -> pd.DataFrame:
+        """
+        与 tag 共现的标签排行，只读取共现矩阵中的一行。
+
+        - lift = P(a, b) / (P(a) · P(b)) = n_ab · N / (n_a · n_b)，>1 表示比随机组合更常一起出现
+        - pmi = log2(lift)
+
+        :param cooc: self.cooccurrence() 的结果
+        :param sort_by: 'count' / 'lift' / 'pmi'
+        :param min_count: 共现次数下限（按 lift / PMI 排序时用于过滤只出现一两次的冷门标签）
+        :return: DataFrame，列 tag / count / lift / pmi
+        """
+        if tag not in self._position:
+            raise ValueError(f"数据中没有标签：{tag}")
+        if sort_by not in ("count", "lift", "pmi"):
+            raise ValueError("sort_by 只能是 'count'、'lift' 或 'pmi'")
+        j = self._position[tag]
+        row = cooc.getrow(j)
+        cols, counts = row.indices, row.data
+        keep = (cols != j) & (counts >= min_count)
+        cols, counts = cols[keep], counts[keep]
+
+        lift = counts * self.n_docs / (self.doc_freq[j] * self.doc_freq[cols])
+        result = pd.DataFrame({
+            "tag": self.vocab[cols],
+            "count": counts.astype(np.int64),
+            "lift": lift,
+            "pmi": np.log2(lift),
+        })
+        # 并列时按标签名排序，保证结果稳定
+        result = result.sort_values([sort_by, "tag"], ascending=[False, True], kind="stable")
+        return result.head(n).reset_index(drop=True)
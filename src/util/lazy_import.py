@@ -0,0 +1,70 @@
+# util/lazy_import.py
+import importlib
+import threading
+
+# 页面里用到、但导入很慢的第三方库：服务启动后在后台线程里预先导入
+HEAVY_MODULES = [
+    "plotly.graph_objects",
+    "plotly.express",
+    "matplotlib.pyplot",
+    "scipy.stats",
+    "scipy.sparse",
+    "sklearn.feature_extraction.text",
+    "wordcloud",
+]
+
+
+class LazyModule:
+    """
+    模块代理：首次访问属性时才真正 import。
+
+    用法与普通模块一致，例如 `go = lazy_import("plotly.graph_objects")` 后直接 `go.Figure(...)`。
+    import 本身由解释器的导入锁保证线程安全，与后台预加载线程并发访问也没有问题。
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """返回一个延迟导入的模块代理"""
+    return LazyModule(name)
+
+
+def _preload(modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            # 可选依赖缺失时跳过，真正用到时再由调用方报错
+            pass
+
+
+def preload_in_background(modules=None) -> threading.Thread:
+    """
+    在守护线程中依次导入重量级依赖，避免把数秒的 import 开销留给第一个用户请求。
+
+    :param modules: 要预加载的模块名列表，默认 HEAVY_MODULES
+    :return: 已启动的线程对象
+    """
+    thread = threading.Thread(
+        target=_preload,
+        args=(list(modules or HEAVY_MODULES),),
+        name="heavy-import-preload",
+        daemon=True,
+    )
+    thread.start()
+    return thread
@@ -1,9 +1,12 @@
 import streamlit as st
 from streamlit_echarts import st_echarts
 import json
-import plotly.graph_objects as go
 import pandas as pd
-import plotly.express as px
+from util.lazy_import import lazy_import
+from store.studio_dimension import UNKNOWN_STUDIO_ID, build_studio_dimension, primary_studio_codes
+
+# plotly.express 导入较慢，延迟到绘制热力图时再加载
+px = lazy_import("plotly.express")
 
 def plot_anime_visualizations(anime_df):
     """
@@ -191,28 +194,27 @@ def clean_external_links(external_links_json):
             return []  # Return an empty list if unable to parse
     return []  # Return an empty list if not a valid string
 
-def plot_studio_platform_partnerships(anime_df):
+def plot_studio_platform_partnerships(anime_df, studio_dim=None):
     """Display top 10 studios and their streaming platform partnerships"""
     st.subheader("Top 10 Studios and Streaming Platform Partnerships")
 
+    # Studio integer codes built once at load time (see store/studio_dimension.py); build them here if not provided
+    if studio_dim is None or "studio_id" not in anime_df.columns:
+        studio_dim, studio_bridge = build_studio_dimension(anime_df["mainStudio"])
+        anime_df = anime_df.assign(studio_id=primary_studio_codes(studio_bridge, len(anime_df)).to_numpy())
+
     # Get top 10 studios by anime production count
-    top_10_studios = anime_df['mainStudio'].value_counts().head(10).index.tolist()
-    
-    # Create data structure to store partnerships
-    studio_platform_data = []
+    codes = anime_df["studio_id"]
+    top_10_ids = codes[codes != UNKNOWN_STUDIO_ID].value_counts().head(10).index
+
+    # Extract streaming platforms for each anime of the top 10 studios (one anime can have multiple platforms)
+    studio_data = anime_df.loc[codes.isin(top_10_ids), ["studio_id", "externalLinks_json"]]
+    studio_platform_counts = pd.DataFrame({
+        "studio": studio_data["studio_id"].map(studio_dim.set_index("studio_id")["name"]),
+        "platform": studio_data["externalLinks_json"].map(clean_external_links),
+    }).explode("platform").dropna(subset=["platform"])
 
     # Count collaborations between studios and streaming platforms
-    for studio in top_10_studios:
-        studio_data = anime_df[anime_df['mainStudio'] == studio]
-        
-        # Extract streaming platforms for each anime (one anime can have multiple platforms)
-        for _, row in studio_data.iterrows():
-            platforms = clean_external_links(row['externalLinks_json'])
-            for platform in platforms:
-                studio_platform_data.append((studio, platform))
-
-    # Create DataFrame for platform counts
-    studio_platform_counts = pd.DataFrame(studio_platform_data, columns=['studio', 'platform'])
     platform_counts = studio_platform_counts.groupby(['studio', 'platform']).size().reset_index(name='count')
 
     # Create pivot table to use for heatmap
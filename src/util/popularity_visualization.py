@@ -1,10 +1,7 @@
 import streamlit as st
-import matplotlib.pyplot as plt
 import pandas as pd
 from streamlit_echarts import st_echarts
-
-# Configure font (no need for Chinese font now)
-plt.rcParams['axes.unicode_minus'] = False
+from store.studio_dimension import UNKNOWN_STUDIO_ID, build_studio_dimension, primary_studio_codes
 
 '''
 Objective: 
@@ -179,29 +176,22 @@ Among mainstream studios, diomedéa has the highest high popularity ratio (52.4%
 
 Analyzing the reasons: 
 Top studios (e.g., diomedéa, bones) typically possess mature production teams, stable high-quality project partnerships, and a keen grasp of market-preferred content styles. Their technical expertise, industry resource access, and accumulated audience trust allow them to consistently deliver works that align with viewer preferences—directly boosting their works’ likelihood of becoming popular.'''
-def studios_popularity_analysis(df):
+def studios_popularity_analysis(df, studio_dim):
     # ========== 5. Analysis 4: Impact of Studios on Popularity ==========
-    df = df.dropna(subset=["mainStudio"])
+    # 按整数编码 studio_id 分组（见 store/studio_dimension.py），-1 为缺失工作室
+    df = df[df["studio_id"] != UNKNOWN_STUDIO_ID]
 
     st.subheader("4. Animation Studios vs Popularity")
-    # Filter top studios with ≥20 animated works
-    studio_count = df.explode("mainStudio")["mainStudio"].value_counts()
-    major_studios = studio_count[studio_count >= 20].index.tolist()
-
-    # Statistics on high popularity ratio for each studio
-    studio_stats = {}
-    for studio in major_studios:
-        studio_anime = df[df["mainStudio"].apply(lambda x: studio in x)]
-        if len(studio_anime) < 20:
-            continue
-        high_pop_ratio = studio_anime["is_high_pop"].mean()
-        studio_stats[studio] = {
-            "High Popularity Ratio": high_pop_ratio,
-            "Number of Works": len(studio_anime),
-            "Average Popularity": studio_anime["popularity"].mean()
-        }
+    # Filter top studios with ≥20 animated works, statistics on high popularity ratio for each studio
+    studio_stats = df.groupby("studio_id").agg(**{
+        "High Popularity Ratio": ("is_high_pop", "mean"),
+        "Number of Works": ("is_high_pop", "size"),
+        "Average Popularity": ("popularity", "mean"),
+    })
+    studio_stats = studio_stats[studio_stats["Number of Works"] >= 20]
+    studio_stats.index = studio_stats.index.map(studio_dim.set_index("studio_id")["name"])
     # 按高流行占比降序排序，并保留前15个工作室（核心修改）
-    studio_stats = pd.DataFrame(studio_stats).T.sort_values("High Popularity Ratio", ascending=False).round(3)
+    studio_stats = studio_stats.sort_values("High Popularity Ratio", ascending=False).round(3)
     top15_studios = studio_stats.head(15)  # 只取前15名
 
     # Visualization: 只显示前15个工作室
@@ -456,9 +446,14 @@ Data processing & Feature engineering:
 Conclusion:
 Producing "13-24 episode TV anime adapted from Light Novel (or Manga)", with core genres of Romance/Supernatural/Action, produced by top studios (e.g., diomedéa), ensuring 16-25 minutes per episode and an average score ≥70, is the optimal combination to create a highly popular anime work.
 '''
-def plot_popularity_analysis(anime_df):
+def plot_popularity_analysis(anime_df, studio_dim=None):
+    # 工作室编码：优先使用 AnimeStore 加载时构建的 studio_id / 维表，否则现场构建
+    if studio_dim is None or "studio_id" not in anime_df.columns:
+        studio_dim, studio_bridge = build_studio_dimension(anime_df["mainStudio"])
+        anime_df = anime_df.assign(studio_id=primary_studio_codes(studio_bridge, len(anime_df)).to_numpy())
+
     # Keep core analysis columns (adjust according to your CSV column names, ensure lowercase)
-    core_cols = ["title_romaji", "format", "genres", "source", "season", "mainStudio",
+    core_cols = ["title_romaji", "format", "genres", "source", "season", "mainStudio", "studio_id",
                  "episodes", "duration", "averageScore", 'meanScore', "popularity"]
     df = anime_df[core_cols]
     # 1. Process multi-value columns (genres/studios separated by pipes)
@@ -480,7 +475,7 @@ def plot_popularity_analysis(anime_df):
     format_popularity_analysis(df)
     source_popularity_analysis(df)
     genres_popularity_analysis(df, high_pop_df, normal_pop_df)
-    studios_popularity_analysis(df)
+    studios_popularity_analysis(df, studio_dim)
     episodes_popularity_analysis(high_pop_df, normal_pop_df)
     duration_popularity_analysis(high_pop_df, normal_pop_df)
     score_popularity_analysis(df)
@@ -0,0 +1,264 @@
+# util/prediction_visualization.py
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import streamlit as st
+from model.artifacts import TRAIN_PATH, ModelArtifact, load_or_train, training_data_changed
+from model.explain import load_or_compute_importance, prediction_contributions, top_drivers
+from model.features import CANDIDATE_FORMAT_CODES, CANDIDATE_SCHEMA, genre_lists
+from model.predict import CANDIDATE_PATH, RESULT_COLUMNS, TOP_N, predict_table
+from model.whatif import score_scenarios, spec_key
+from store.studio_dimension import STUDIO_SEPARATOR
+from util.lazy_import import lazy_import
+
+px = lazy_import("plotly.express")
+
+# notebook 离线导出的预测结果（候选集路径与结果列见 model.predict）
+OFFLINE_PREDICTIONS_PATH = "DataAnalysisPart/2026_winter_anime_predictions_gridsearch.csv"
+
+# 置换重要性在后台线程中计算（首次约十几秒，之后读取产物目录中的结果）
+_importance_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="importance")
+
+
+@st.cache_resource(show_spinner="Loading prediction model...")
+def load_model() -> ModelArtifact:
+    """每个服务进程只加载一次模型产物；还没有产物时先训练并保存（训练数据变化时不刷新，见 model_is_stale）"""
+    return load_or_train()
+
+
+@st.cache_data(show_spinner=False)
+def _model_is_stale(version: str, _artifact: ModelArtifact, train_path: str, mtime_ns: int, size: int) -> bool:
+    return training_data_changed(_artifact, train_path)
+
+
+def model_is_stale(artifact: ModelArtifact, train_path: str = TRAIN_PATH) -> bool:
+    """训练数据在产物训练之后是否有变化（以文件修改时间 + 大小为缓存键，文件不变时不重复哈希）"""
+    try:
+        stat = os.stat(train_path)
+    except FileNotFoundError:
+        return False
+    return _model_is_stale(artifact.version, artifact, train_path, stat.st_mtime_ns, stat.st_size)
+
+
+@st.cache_data(show_spinner=False)
+def _read_candidates(path: str, mtime_ns: int, size: int):
+    # 以文件修改时间 + 大小作为缓存键：文件不变时不重复读取和哈希
+    with open(path, "rb") as f:
+        raw = f.read()
+    return pd.read_csv(io.BytesIO(raw)), hashlib.md5(raw).hexdigest()[:12]
+
+
+def load_candidates(path: str = CANDIDATE_PATH):
+    """
+    读取候选集。
+
+    返回：(candidates, candidate_version)  candidate_version 为文件内容哈希
+    """
+    stat = os.stat(path)
+    return _read_candidates(path, stat.st_mtime_ns, stat.st_size)
+
+
+def _with_genre_list(results: pd.DataFrame) -> pd.DataFrame:
+    results = results.copy()
+    results["genre_list"] = genre_lists(results["genres"])
+    results["genres"] = results["genre_list"].map(", ".join)
+    return results
+
+
+def explain_candidates(artifact: ModelArtifact, candidates: pd.DataFrame) -> pd.DataFrame:
+    """
+    候选集每行预测的决策路径贡献。
+
+    返回：与 candidates 行对应的表，列 id / bias / 各特征（显示名）贡献
+    """
+    bias, contributions = prediction_contributions(artifact, candidates, CANDIDATE_SCHEMA)
+    contributions.insert(0, "bias", bias)
+    contributions.insert(0, "id", candidates["id"].to_numpy())
+    return contributions
+
+
+def predict_candidates(artifact: ModelArtifact, candidates: pd.DataFrame) -> pd.DataFrame:
+    """
+    对整张候选表做一次向量化打分，返回按预测热度降序的结果表：
+    含各树预测的 p10 / p90 区间与排名区间（见 model.predict），top_drivers 为贡献最大的三个特征
+    """
+    results = predict_table(artifact, candidates, top_n=TOP_N)
+    explanations = explain_candidates(artifact, candidates)
+    fmt = "{:+.2f}" if artifact.target == "log1p" else "{:+,.0f}"
+    results["top_drivers"] = top_drivers(explanations.drop(columns=["id", "bias"]), fmt=fmt).to_numpy()
+    results = results.sort_values("predicted_popularity", ascending=False, kind="stable")
+    return _with_genre_list(results.reset_index(drop=True))
+
+
+@st.cache_data(show_spinner=False)
+def _cached_predictions(artifact_version, candidate_version, _artifact, _candidates):
+    # _artifact / _candidates 不参与哈希，缓存按 模型版本 + 候选文件哈希 区分
+    return predict_candidates(_artifact, _candidates)
+
+
+def get_predictions(artifact: ModelArtifact, candidates: pd.DataFrame, candidate_version: str = None) -> pd.DataFrame:
+    """predict_candidates 的页面入口：提供 candidate_version 时按 (模型版本, 候选文件哈希) 缓存"""
+    if candidate_version is None:
+        return predict_candidates(artifact, candidates)
+    return _cached_predictions(artifact.version, candidate_version, artifact, candidates)
+
+
+@st.cache_data(show_spinner=False)
+def _cached_explanations(artifact_version, candidate_version, _artifact, _candidates):
+    return explain_candidates(_artifact, _candidates)
+
+
+def get_explanations(artifact: ModelArtifact, candidates: pd.DataFrame, candidate_version: str = None) -> pd.DataFrame:
+    """explain_candidates 的页面入口：提供 candidate_version 时按 (模型版本, 候选文件哈希) 缓存"""
+    if candidate_version is None:
+        return explain_candidates(artifact, candidates)
+    return _cached_explanations(artifact.version, candidate_version, artifact, candidates)
+
+
+@st.cache_resource(show_spinner=False)
+def _importance_future(artifact_version, _artifact):
+    # 每个模型版本只提交一次
+    return _importance_executor.submit(load_or_compute_importance, _artifact)
+
+
+def get_importance(artifact: ModelArtifact, wait: float = 0.5):
+    """
+    模型的置换重要性；仍在后台计算时返回 None。
+
+    :param wait: 最多等待的秒数（已有 importance.json 时读取很快）
+    :raises Exception: 后台计算失败（如进程池损坏）时原样抛出；失败的任务不再缓存，下次调用重新提交
+    """
+    try:
+        return _importance_future(artifact.version, artifact).result(timeout=wait)
+    except TimeoutError:
+        return None
+    except Exception:
+        _importance_future.clear()
+        raise
+
+
+def plot_permutation_importance(importance: pd.DataFrame):
+    """置换重要性水平条形图（误差线为多次置换的标准差）"""
+    data = importance.sort_values("importance_mean", kind="stable")
+    fig = px.bar(data, x="importance_mean", y="feature", error_x="importance_std", orientation="h",
+                 labels={"importance_mean": "Drop in R² when permuted", "feature": "Feature"},
+                 template="plotly_white")
+    fig.update_layout(height=320, margin=dict(l=10, r=10, t=30, b=10))
+    return fig
+
+
+def plot_contributions(explanations: pd.DataFrame, row: int, top_n: int = 10, log_target: bool = False):
+    """一部候选作品预测热度的分解：贡献绝对值最大的 top_n 个特征（log_target 时为 log1p 尺度）"""
+    contrib = explanations.drop(columns=["id", "bias"]).iloc[row]
+    contrib = contrib.reindex(contrib.abs().sort_values(ascending=False).index[:top_n]).iloc[::-1]
+    data = pd.DataFrame({"feature": contrib.index, "contribution": contrib.to_numpy()})
+    data["direction"] = (data["contribution"] >= 0).map({True: "raises", False: "lowers"})
+    fig = px.bar(data, x="contribution", y="feature", color="direction", orientation="h",
+                 color_discrete_map={"raises": "#2a9d8f", "lowers": "#e76f51"},
+                 labels={"contribution": "Contribution to log1p(predicted popularity)" if log_target
+                         else "Contribution to predicted popularity", "feature": "Feature"},
+                 template="plotly_white")
+    fig.update_layout(height=max(300, 28 * len(data)), margin=dict(l=10, r=10, t=30, b=10), showlegend=False)
+    return fig
+
+
+def predictions_csv(results: pd.DataFrame) -> bytes:
+    """页面下载用的预测结果 CSV（去掉页面内部使用的 genre_list 列）"""
+    return results.drop(columns=["genre_list"], errors="ignore").to_csv(index=False).encode("utf-8")
+
+
+def offline_predictions(path: str = OFFLINE_PREDICTIONS_PATH) -> pd.DataFrame:
+    """notebook 导出的离线预测（模型无法加载/训练时的兜底展示）"""
+    results = pd.read_csv(path).reindex(columns=RESULT_COLUMNS)
+    results = results.sort_values("predicted_popularity", ascending=False, kind="stable")
+    return _with_genre_list(results.reset_index(drop=True))
+
+
+def filter_predictions(results: pd.DataFrame, title_query: str = "", formats=None, genres=None,
+                       studio_query: str = "", sort_by: str = "predicted_popularity",
+                       ascending: bool = False) -> pd.DataFrame:
+    """
+    按标题/工作室关键词（不区分大小写）、播出形式、题材（需包含全部所选题材）筛选并排序。
+    """
+    mask = pd.Series(True, index=results.index)
+    if title_query:
+        mask &= results["title"].fillna("").str.contains(title_query, case=False, regex=False)
+    if studio_query:
+        mask &= results["studio"].fillna("").str.contains(studio_query, case=False, regex=False)
+    if formats:
+        mask &= results["format"].isin(formats)
+    if genres:
+        wanted = set(genres)
+        mask &= results["genre_list"].map(lambda g: wanted.issubset(g))
+    filtered = results[mask].sort_values(sort_by, ascending=ascending, kind="stable", na_position="last")
+    filtered = filtered.reset_index(drop=True)
+    filtered.insert(0, "rank", range(1, len(filtered) + 1))
+    return filtered
+
+
+def studio_prediction_ranking(results: pd.DataFrame, top_n: int = 15) -> pd.DataFrame:
+    """
+    各工作室的平均预测热度（联合制作的作品计入每个参与工作室）。
+
+    返回：列 Rank / Studio / Avg Predicted Popularity / Count
+    """
+    studios = (
+        results[["studio", "predicted_popularity"]]
+        .assign(studio=results["studio"].fillna("").str.split(STUDIO_SEPARATOR, regex=True))
+        .explode("studio")
+    )
+    studios["studio"] = studios["studio"].str.strip()
+    studios = studios[studios["studio"] != ""]
+    ranking = (
+        studios.groupby("studio")["predicted_popularity"]
+               .agg(["mean", "count"])
+               .sort_values(["mean", "count"], ascending=[False, False], kind="stable")
+               .head(top_n)
+               .reset_index()
+    )
+    ranking.columns = ["Studio", "Avg Predicted Popularity", "Count"]
+    ranking.insert(0, "Rank", range(1, len(ranking) + 1))
+    return ranking
+
+
+# ---------------- What-if 情景 ----------------
+
+def whatif_options(artifact: ModelArtifact) -> dict:
+    """
+    情景各维度的可选值：工作室按训练集平均热度降序，题材只保留解析干净的题材名（候选集使用的形式）。
+    """
+    studio_popularity = artifact.builder.studio_popularity
+    return {
+        "studio": sorted(studio_popularity, key=lambda s: (-studio_popularity[s], s)),
+        "format": list(CANDIDATE_FORMAT_CODES),
+        "genres": [g for g in artifact.builder.genres.classes_ if not set(g) & set("[]'\"")],
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _cached_whatif(artifact_version, key, _artifact):
+    # 缓存按 模型版本 + 规范化后的情景范围 区分
+    return score_scenarios(_artifact, json.loads(key))
+
+
+def get_whatif(artifact: ModelArtifact, spec: dict):
+    """
+    score_scenarios 的页面入口。
+
+    返回：(ranked, effects)
+    """
+    return _cached_whatif(artifact.version, spec_key(spec), artifact)
+
+
+def plot_marginal_effects(effects: pd.DataFrame, axis: str):
+    """某一维各取值的边际效应（相对整个网格平均预测热度）水平条形图"""
+    data = effects[effects["axis"] == axis].sort_values("effect", kind="stable")
+    fig = px.bar(data, x="effect", y="value", orientation="h",
+                 labels={"effect": "Effect on predicted popularity", "value": axis},
+                 template="plotly_white")
+    fig.update_layout(height=max(300, 24 * len(data)), margin=dict(l=10, r=10, t=30, b=10))
+    return fig
@@ -1,10 +1,12 @@
 import pandas as pd
+import numpy as np
 from streamlit_echarts import st_echarts
 import streamlit as st
+from util.lazy_import import lazy_import
+
+# scipy 导入较慢，延迟到卡方检验真正执行时再加载
+stats = lazy_import("scipy.stats")
 
-import pandas as pd
-from streamlit_echarts import st_echarts
-import streamlit as st
 
 
 
@@ -186,14 +188,6 @@ def plot_interactive_heatmap(residuals):
 
 # ========== 第二部分：Source × Genre 卡方检验 + 热力图 ==========
 def plot_source_genre_analysis(df):
-    import streamlit as st
-    import pandas as pd
-    import numpy as np
-    import scipy.stats as stats
-    import seaborn as sns
-    import matplotlib.pyplot as plt
-    import ast
-
     # 标题（样式与分析1一致）
     st.subheader("2. Source × Genre Statistical Relationship Analysis")
 
@@ -203,16 +197,6 @@ def plot_source_genre_analysis(df):
     major_sources = ["MANGA", "LIGHT_NOVEL", "ORIGINAL", "VIDEO_GAME", "VISUAL_NOVEL"]
     df = df[df["source"].isin(major_sources)]
 
-    def parse_genres(x):
-        try:
-            lst = ast.literal_eval(x)
-            if isinstance(lst, list) and len(lst) > 0:
-                return lst[0].split("|")
-        except:
-            return []
-        return []
-
-
     df["genres"] = df["genres"].fillna("").astype(str)
     df["genres"] = df["genres"].apply(lambda x: [g.strip() for g in x.split("|") if g.strip()])
     df = df.explode("genres")
@@ -276,7 +260,6 @@ Cramér's V: {cramers_v}
 
     residuals = (table - expected) / np.sqrt(expected)
 
-    fig, ax = plt.subplots(figsize=(16, 8))
     plot_interactive_heatmap(residuals)
 
     # ---------- 热力图解读 ----------
@@ -302,71 +285,140 @@ Cramér's V: {cramers_v}
 
     
 
-import streamlit as st
-import matplotlib.pyplot as plt
-import seaborn as sns
+MAJOR_SOURCES = ["MANGA", "LIGHT_NOVEL", "ORIGINAL", "VIDEO_GAME", "VISUAL_NOVEL"]
 
-def plot_source_score_analysis(df):
+# KDE 曲线统一在 0–100 分的固定网格上计算，前端直接画折线
+SCORE_GRID = np.linspace(0, 100, 201)
+
+
+def compute_source_score_summary(df):
+    """
+    按 source 预先计算评分分布摘要（替代服务端 seaborn 绘图）：
+
+    - box: 每个 source 的 [下须, Q1, 中位数, Q3, 上须]（1.5×IQR 规则，与 seaborn 箱线图一致）
+    - outliers: 须外的离群点 [source 序号, 分数]
+    - kde: 每个 source 在 SCORE_GRID 上的高斯核密度（Scott 带宽，cut=0 即只保留数据范围内）
+
+    返回可直接 JSON 序列化的 dict，供 ECharts 使用。
+    """
+    scores = df.loc[df["source"].isin(MAJOR_SOURCES), ["source", "averageScore"]]
+    scores = scores[scores["averageScore"].notna()]
+
+    sources = [s for s in MAJOR_SOURCES if (scores["source"] == s).any()]
+    box, outliers, kde = [], [], {}
+    for i, src in enumerate(sources):
+        values = scores.loc[scores["source"] == src, "averageScore"].to_numpy(dtype=float)
+
+        q1, med, q3 = np.percentile(values, [25, 50, 75])
+        iqr = q3 - q1
+        inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+        low, high = inside.min(), inside.max()
+        box.append([float(low), float(q1), float(med), float(q3), float(high)])
+        outliers.extend([i, float(v)] for v in values[(values < low) | (values > high)])
+
+        # 高斯核密度：网格 × 样本 一次广播计算
+        n = len(values)
+        bw = values.std(ddof=1) * n ** (-1 / 5) if n > 1 else 0.0
+        if bw > 0:
+            z = (SCORE_GRID[:, None] - values[None, :]) / bw
+            density = np.exp(-0.5 * z ** 2).sum(axis=1) / (n * bw * np.sqrt(2 * np.pi))
+        else:
+            density = np.zeros_like(SCORE_GRID)
+        in_range = (SCORE_GRID >= values.min()) & (SCORE_GRID <= values.max())
+        kde[src] = [round(float(d), 6) if ok else None for d, ok in zip(density, in_range)]
+
+    return {
+        "sources": sources,
+        "box": box,
+        "outliers": outliers,
+        "grid": SCORE_GRID.tolist(),
+        "kde": kde,
+    }
+
+
+@st.cache_data(show_spinner=False)
+def _cached_score_summary(dataset_version, _df):
+    # _df 以下划线开头，不参与哈希；缓存只按数据集版本区分
+    return compute_source_score_summary(_df)
+
+
+def plot_source_score_analysis(df, dataset_version=None):
     """
     Score Distribution Analysis by Source
     Includes:
     - Boxplot
-    - Violin plot
+    - Density (KDE) curves
+
+    分位数 / 须 / 离群点 / KDE 在服务端按 source 预计算一次（按 dataset_version 缓存），
+    图形交给 ECharts 在浏览器端渲染。
     """
 
     st.subheader("3. Score Distribution Analysis by Source")
 
-    # ------------------------------
-    # 数据过滤
-    # ------------------------------
-    major_sources = ["MANGA", "LIGHT_NOVEL", "ORIGINAL", "VIDEO_GAME", "VISUAL_NOVEL"]
-    df = df[df["source"].isin(major_sources)]
-
-    df = df[df["averageScore"].notna()].copy()
-    df["averageScore"] = df["averageScore"].astype(float)
+    if dataset_version is None:
+        summary = compute_source_score_summary(df)
+    else:
+        summary = _cached_score_summary(dataset_version, df)
+    sources = summary["sources"]
 
     # ============================
     # 箱线图
     # ============================
     st.markdown("### 📦 Score Distribution (Boxplot)")
 
-    fig1, ax1 = plt.subplots(figsize=(10, 5))
-    sns.boxplot(
-        data=df,
-        x="source",
-        y="averageScore",
-        hue="source",
-        palette="Set2",
-        legend=False,
-        ax=ax1
-    )
-    ax1.set_title("Score Distribution by Source (Boxplot)")
-    ax1.set_xlabel("Source")
-    ax1.set_ylabel("Average Score")
-    ax1.grid(axis="y", linestyle="--", alpha=0.4)
-
-    st.pyplot(fig1)
+    box_options = {
+        "title": {"text": "Score Distribution by Source (Boxplot)", "left": "center"},
+        "tooltip": {"trigger": "item"},
+        "xAxis": {"type": "category", "data": sources, "name": "Source"},
+        "yAxis": {
+            "type": "value",
+            "name": "Average Score",
+            "splitLine": {"lineStyle": {"type": "dashed", "opacity": 0.4}},
+        },
+        "series": [
+            {
+                "name": "Score",
+                "type": "boxplot",
+                "data": summary["box"],
+                "colorBy": "data",
+            },
+            {
+                "name": "Outlier",
+                "type": "scatter",
+                "data": summary["outliers"],
+                "symbolSize": 6,
+            },
+        ],
+        "grid": {"left": 60, "right": 20, "bottom": 50, "top": 60},
+    }
+    st_echarts(options=box_options, height="450px", key="source score boxplot")
 
     # ============================
-    # 小提琴图
+    # 密度曲线（替代小提琴图）
     # ============================
-    st.markdown("### 🎻 Score Distribution (Violin Plot)")
-
-    fig2, ax2 = plt.subplots(figsize=(10, 5))
-    sns.violinplot(
-        data=df,
-        x="source",
-        y="averageScore",
-        palette="Set3",
-        cut=0,
-        ax=ax2
-    )
-    ax2.set_title("Score Distribution by Source (Violin Plot)")
-    ax2.set_xlabel("Source")
-    ax2.set_ylabel("Average Score")
-    ax2.grid(axis="y", linestyle="--", alpha=0.4)
+    st.markdown("### 🎻 Score Distribution (Density)")
 
-    st.pyplot(fig2)
+    grid = summary["grid"]
+    density_options = {
+        "title": {"text": "Score Density by Source (KDE)", "left": "center"},
+        "tooltip": {"trigger": "axis"},
+        "legend": {"data": sources, "top": 30},
+        "xAxis": {"type": "value", "name": "Average Score", "min": 0, "max": 100},
+        "yAxis": {"type": "value", "name": "Density"},
+        "series": [
+            {
+                "name": src,
+                "type": "line",
+                "showSymbol": False,
+                "smooth": True,
+                "areaStyle": {"opacity": 0.15},
+                "data": [[x, y] for x, y in zip(grid, summary["kde"][src]) if y is not None],
+            }
+            for src in sources
+        ],
+        "grid": {"left": 60, "right": 20, "bottom": 50, "top": 80},
+    }
+    st_echarts(options=density_options, height="450px", key="source score density")
 
     # ============================
     # 文本结论（蓝色 info 卡片）
@@ -381,7 +433,7 @@ def plot_source_score_analysis(df):
         font-size: 16px;
         line-height: 1.6;
     ">
-    <b>Conclusion:</b> Boxplots and violin plots show that <b>MANGA</b> and <b>LIGHT_NOVEL</b> adaptations have higher average ratings than <b>ORIGINAL</b> works, with relatively small differences between them. This suggests that production companies tend to select strong source material for adaptation. However, <b>MANGA</b> adaptations have many <b>lower outliers</b>, likely because manga plots and artwork usually come from the same creator, resulting in a consistent style and tone while leaving room for reader imagination. When adapted into anime by large production teams, discrepancies between plot and visuals can occur—sometimes called "radical adaptation" by fans—leading to more outliers compared to other sources. <b>ORIGINAL</b> works, produced by studios of varying levels, show a more uniform distribution of ratings. <b>VIDEO_GAME</b> and <b>VISUAL_NOVEL</b> adaptations, while fewer in number, generally cluster around moderate ratings, reflecting niche appeal and adaptation challenges.
+    <b>Conclusion:</b> Boxplots and density curves show that <b>MANGA</b> and <b>LIGHT_NOVEL</b> adaptations have higher average ratings than <b>ORIGINAL</b> works, with relatively small differences between them. This suggests that production companies tend to select strong source material for adaptation. However, <b>MANGA</b> adaptations have many <b>lower outliers</b>, likely because manga plots and artwork usually come from the same creator, resulting in a consistent style and tone while leaving room for reader imagination. When adapted into anime by large production teams, discrepancies between plot and visuals can occur—sometimes called "radical adaptation" by fans—leading to more outliers compared to other sources. <b>ORIGINAL</b> works, produced by studios of varying levels, show a more uniform distribution of ratings. <b>VIDEO_GAME</b> and <b>VISUAL_NOVEL</b> adaptations, while fewer in number, generally cluster around moderate ratings, reflecting niche appeal and adaptation challenges.
     </div>
     """,
     unsafe_allow_html=True)
@@ -1,16 +1,22 @@
+import io
 import streamlit as st
-import matplotlib.pyplot as plt
 import pandas as pd
-from streamlit_echarts import st_echarts
-from pyecharts import options as opts
-from pyecharts.charts import Pie, Bar, Boxplot
-import plotly.graph_objects as go
-import plotly.express as px
 import numpy as np
+from util.lazy_import import lazy_import
+from store.studio_dimension import build_studio_dimension, studio_codes_for
+from store.tag_index import TagIndex
+from util import wordcloud_cache
 
-# 配置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei']
-plt.rcParams['axes.unicode_minus'] = False
+# 重量级绘图/建模库延迟到首次使用时才导入（服务启动时由 app.py 在后台预加载）
+plt = lazy_import("matplotlib.pyplot")
+go = lazy_import("plotly.graph_objects")
+px = lazy_import("plotly.express")
+
+
+def _configure_matplotlib():
+    """配置中文字体（仅在确实需要 matplotlib 绘图时调用，避免 import 本模块就加载 matplotlib）"""
+    plt.rcParams['font.sans-serif'] = ['SimHei']
+    plt.rcParams['axes.unicode_minus'] = False
 
 
 # ---------------- 数据预处理工具 ----------------
@@ -125,56 +131,34 @@ def preprocess_anime_df(df: pd.DataFrame, write_cleaned_path: str = None) -> pd.
     return df_hist
 
 # ---------------- 预处理工具结束 ----------------
-def plot_studio_capacity_pie(anime_df, top_n: int = 10):
+def top_studio_ids(studio_bridge: pd.DataFrame, n_studios: int, top_n: int = 10) -> np.ndarray:
+    """按作品数降序返回 Top N 工作室的 studio_id（并列时按 studio_id 稳定排序）"""
+    counts = np.bincount(studio_bridge["studio_id"], minlength=n_studios)
+    return np.argsort(-counts, kind="stable")[:top_n]
+
+
+def plot_studio_capacity_pie(anime_df, top_n: int = 10, studio_dim=None, studio_bridge=None):
     """
     返回一个 Plotly 饼图（Top N 工作室 vs Other）及 Top N 的计数 Series。
 
     :param anime_df: DataFrame，包含工作室字段（支持列名 `mainStudio` 或 `mainstudio`，不区分大小写）
     :param top_n: int，计算 Top N 工作室
+    :param studio_dim, studio_bridge: 可选，AnimeStore 预先构建的工作室维表/桥表；未提供时按 anime_df 现场构建
     :return: (fig, top_series)  fig 为 plotly.graph_objects.Figure，top_series 为 pandas.Series
     """
     if not isinstance(anime_df, pd.DataFrame):
         raise TypeError("anime_df 必须是 pandas.DataFrame")
 
-    # 先预处理数据，确保列名/字段统一
-    df = preprocess_anime_df(anime_df)
-
-    df["mainstudio"] = df["mainstudio"].fillna("Unknown")
-
-    df = df.assign(
-        mainstudio=df["mainstudio"].str.split(",")
-    ).explode("mainstudio")
-
-    df["mainstudio"] = df["mainstudio"].str.strip()
-    df = df[df["mainstudio"].str.lower() != "unknown"]
-
-    studio_counts = df["mainstudio"].value_counts()
-
-    # 使用固定的 Top10 列表（按用户要求）
-    fixed_top10 = [
-        "J.C.STAFF",
-        "Toei Animation",
-        "TMS Entertainment",
-        "OLM",
-        "A-1 Pictures",
-        "Sunrise",
-        "Studio DEEN",
-        "Production I.G",
-        "LIDENFILMS",
-        "MAPPA",
-    ]
+    studio_dim, studio_bridge = studio_codes_for(anime_df, studio_dim, studio_bridge)
 
-    # 归一化函数：只保留字母数字并小写，便于匹配不同写法
-    def _norm(name: str) -> str:
-        if not isinstance(name, str):
-            return ""
-        return "".join(ch.lower() for ch in name if ch.isalnum())
-
-    fixed_norm = {_norm(s) for s in fixed_top10}
-    # 按归一化后判断是否属于固定 top10
-    df["studio_group"] = df["mainstudio"].apply(lambda x: "Top 10 Studios" if _norm(x) in fixed_norm else "Other Studios")
-
-    group_counts = df["studio_group"].value_counts()    
+    # 按整数编码计数（每个 作品×工作室 一行，已排除 Unknown），Top N 由数据动态决定
+    studio_counts = np.bincount(studio_bridge["studio_id"], minlength=len(studio_dim))
+    top_ids = top_studio_ids(studio_bridge, len(studio_dim), top_n)
+    in_top = studio_bridge["studio_id"].isin(top_ids)
+    group_counts = pd.Series({
+        f"Top {top_n} Studios": int(in_top.sum()),
+        "Other Studios": int((~in_top).sum()),
+    }).sort_values(ascending=False)
 
     labels = group_counts.index.tolist()
     values = group_counts.values.tolist()
@@ -201,103 +185,64 @@ def plot_studio_capacity_pie(anime_df, top_n: int = 10):
         showlegend=True
     )
 
-    # 为了返回固定 Top10 的计数（按给定顺序），构造按 fixed_top10 的统计结果
-    counts_map = { _norm(s): 0 for s in fixed_top10 }
-    for name, cnt in studio_counts.items():
-        n = _norm(name)
-        if n in counts_map:
-            counts_map[n] += int(cnt)
-
-    top_counts_list = [counts_map[_norm(s)] for s in fixed_top10]
-    top_series = pd.Series(data=top_counts_list, index=fixed_top10)
+    # 返回 Top N 的计数（按作品数降序）
+    names = studio_dim.set_index("studio_id")["name"]
+    top_series = pd.Series(data=studio_counts[top_ids].astype(int), index=names.loc[top_ids].to_numpy())
 
     return fig, top_series
 
 
-def plot_top10_studio_source_composition(anime_df, top_n: int = 10):
+def plot_top10_studio_source_composition(anime_df, top_n: int = 10, studio_dim=None, studio_bridge=None):
     """
     绘制 Top N 工作室按 source 的构成（水平堆叠条形图），返回 plotly Figure 与按 studio/source 聚合的表格。
 
     :param anime_df: DataFrame，包含工作室和 source 字段（支持大小写变体）
     :param top_n: int，选择 Top N 工作室
+    :param studio_dim, studio_bridge: 可选，AnimeStore 预先构建的工作室维表/桥表；未提供时按 anime_df 现场构建
     :return: (fig, studio_source_counts_df)  fig 为 plotly Figure，studio_source_counts_df 为聚合 DataFrame
     """
     if not isinstance(anime_df, pd.DataFrame):
         raise TypeError("anime_df 必须是 pandas.DataFrame")
 
-    # 先预处理数据
-    df = preprocess_anime_df(anime_df)
-
-    # 查找主制作方列与 source 列（不区分大小写）
-    col_map = {c.lower(): c for c in df.columns}
-    main_col = col_map.get("mainstudio")
+    # 查找 source 列（不区分大小写）
+    col_map = {c.lower(): c for c in anime_df.columns}
     source_col = col_map.get("source")
-    if main_col is None:
-        raise ValueError("数据中未找到工作室列（期望列名 mainStudio 或 mainstudio）")
     if source_col is None:
         raise ValueError("数据中未找到 source 列（期望列名 source）")
 
-    df[main_col] = df[main_col].fillna("Unknown")
-    df[source_col] = df[source_col].fillna("Unknown")
+    studio_dim, studio_bridge = studio_codes_for(anime_df, studio_dim, studio_bridge)
 
     # 合并 Unknown / Other（统一为 'Other'）
-    df[source_col] = df[source_col].astype(str).str.strip().str.lower()
-    df[source_col] = df[source_col].replace({"unknown": "Other", "other": "Other"})
-
-    # 拆分多个 studio
-    df_exploded = df.assign(**{main_col: df[main_col].str.split(",")}).explode(main_col)
-    df_exploded[main_col] = df_exploded[main_col].str.strip()
-    df_exploded = df_exploded[df_exploded[main_col].str.lower() != "unknown"]
-
-    # 使用固定的 Top10 公司列表（只统计这十个公司）
-    fixed_top10 = [
-        "J.C.STAFF",
-        "Toei Animation",
-        "TMS Entertainment",
-        "OLM",
-        "A-1 Pictures",
-        "Sunrise",
-        "Studio DEEN",
-        "Production I.G",
-        "LIDENFILMS",
-        "MAPPA",
-    ]
-
-    # 归一化函数：保留字母数字并小写，便于匹配不同写法
-    def _norm(name: str) -> str:
-        if not isinstance(name, str):
-            return ""
-        return "".join(ch.lower() for ch in name if ch.isalnum())
-
-    fixed_norm = {_norm(s) for s in fixed_top10}
-
-    # 为匹配便利，添加一列 studio_norm
-    df_exploded = df_exploded.copy()
-    df_exploded["studio_norm"] = df_exploded[main_col].apply(lambda x: _norm(x))
-
-    # 只保留固定 Top10 的记录
-    df_topN = df_exploded[df_exploded["studio_norm"].isin(fixed_norm)].copy()
-
-    # 把 studio 列映射为固定显示名（按 fixed_top10 中的规范名称）
-    norm_to_name = { _norm(s): s for s in fixed_top10 }
-    df_topN[main_col] = df_topN["studio_norm"].map(norm_to_name)
+    source = anime_df[source_col].fillna("Unknown").astype(str).str.strip().str.lower()
+    source = source.replace({"unknown": "Other", "other": "Other"}).to_numpy()
+
+    # 只统计作品数最多的 Top N 工作室，按 studio_id 过滤
+    top_ids = top_studio_ids(studio_bridge, len(studio_dim), top_n)
+    names = studio_dim.set_index("studio_id")["name"]
+    top_names = names.loc[top_ids].tolist()
+    id_to_name = dict(zip(top_ids, top_names))
+    top_pairs = studio_bridge[studio_bridge["studio_id"].isin(top_ids)]
 
     studio_source_counts = (
-        df_topN.groupby([main_col, source_col])
+        pd.DataFrame({
+            "mainstudio": top_pairs["studio_id"].map(id_to_name).to_numpy(),
+            "source": source[top_pairs["row"].to_numpy()],
+        })
+        .groupby(["mainstudio", "source"])
         .size()
         .reset_index(name="count")
     )
 
-    # 保持固定顺序（只包含数据中存在的那些），用于 category_orders
-    studio_order = [s for s in fixed_top10 if s in df_topN[main_col].unique()]
+    # 按作品数降序排列，用于 category_orders
+    studio_order = top_names
 
     fig = px.bar(
         studio_source_counts,
         x="count",
-        y=main_col,
-        color=source_col,
+        y="mainstudio",
+        color="source",
         orientation="h",
-        category_orders={main_col: studio_order},
+        category_orders={"mainstudio": studio_order},
         title=f"Top {top_n} Anime Studios – Source Composition"
     )
     fig.update_layout(
@@ -317,62 +262,109 @@ def plot_top10_studio_source_composition(anime_df, top_n: int = 10):
     return fig, studio_source_counts
 
 
+def _start_year(df: pd.DataFrame) -> pd.Series:
+    """
+    每部作品的上映年份（列名已经 normalize_columns 处理）：优先使用已有的 start_year，否则取 startdate 的年份。
+    """
+    if "start_year" in df.columns:
+        return pd.to_numeric(df["start_year"], errors="coerce")
+    if "startdate" in df.columns:
+        return pd.to_datetime(df["startdate"], errors="coerce").dt.year
+    raise ValueError("数据中缺少 'startdate' / 'start_year' 列，无法按年份统计")
+
+
+def _studio_year_pairs(df: pd.DataFrame, start_year: int, end_year: int, studio_bridge=None) -> pd.DataFrame:
+    """
+    从原始/清洗后的数据中提取 (start_year, id, studio_id) 三列：每个 作品×工作室 一行（已去掉 Unknown）。
+    只处理需要的列，避免对整表做文本清洗。
+    """
+    df = normalize_columns(df)
+    if "mainstudio" not in df.columns:
+        raise ValueError("数据中缺少 'mainstudio' 列，无法计算工作室统计")
+
+    year = _start_year(df)
+
+    if studio_bridge is None:
+        _, studio_bridge = build_studio_dimension(df["mainstudio"])
+    rows = studio_bridge["row"].to_numpy()
+    pairs = pd.DataFrame({
+        "start_year": year.to_numpy()[rows],
+        "id": df["id"].to_numpy()[rows],
+        "studio_id": studio_bridge["studio_id"].to_numpy(),
+    })
+    pairs = pairs[pairs["start_year"].between(start_year, end_year)]
+    pairs["start_year"] = pairs["start_year"].astype(int)
+    return pairs
+
+
+def compute_studio_trend(df: pd.DataFrame, start_year: int = 2016, end_year: int = 2025, studio_bridge=None):
+    """
+    一次分组计算年度产能趋势与新工作室 cohort：
+
+    - trend: 每年 anime_count（按 id 去重）、studio_count（活跃工作室数）、new_studios（当年首次出现的工作室数）
+    - cohorts: 行为首次出现年份（cohort），列为年份，值为该 cohort 中当年仍有作品的工作室数（存活数）
+
+    注意：数据从 start_year 开始，首年的 cohort 包含所有此前已存在的工作室。
+    工作室按 studio_bridge 中的整数编码分组（未提供时按 df 现场构建）。
+
+    返回：(trend, cohorts)
+    """
+    pairs = _studio_year_pairs(df, start_year, end_year, studio_bridge)
+    years = range(start_year, end_year + 1)
+
+    # 每个工作室每年只记一次活跃
+    active = pairs[["studio_id", "start_year"]].drop_duplicates()
+    first_year = active.groupby("studio_id")["start_year"].min()
+    active = active.assign(cohort=active["studio_id"].map(first_year))
+
+    trend = pd.DataFrame({
+        "anime_count": pairs.groupby("start_year")["id"].nunique(),
+        "studio_count": active.groupby("start_year").size(),
+        "new_studios": first_year.value_counts(),
+    }).reindex(years).fillna(0).astype(int).rename_axis("start_year").reset_index()
+
+    cohorts = (
+        pd.crosstab(active["cohort"], active["start_year"])
+          .reindex(index=years, columns=years, fill_value=0)
+          .rename_axis(index="cohort", columns="year")
+    )
+    return trend, cohorts
+
+
+@st.cache_data(show_spinner=False)
+def _cached_studio_trend(dataset_version, start_year, end_year, _df, _studio_bridge=None):
+    # _df / _studio_bridge 不参与哈希，缓存按数据集版本 + 年份区间区分
+    return compute_studio_trend(_df, start_year, end_year, _studio_bridge)
+
+
 def plot_trend_anime_vs_studios(file_path: str = None, df: pd.DataFrame = None,
-                                 start_year: int = 2016, end_year: int = 2025):
+                                 start_year: int = 2016, end_year: int = 2025,
+                                 dataset_version: str = None, studio_bridge: pd.DataFrame = None):
     """
-    绘制年度趋势：每年动漫作品数量 与 每年活跃工作室数量（双轴折线图），返回 plotly Figure 与趋势数据 DataFrame。
+    绘制年度趋势：每年动漫作品数量 与 每年活跃工作室数量（双轴折线图 + 新工作室柱状图），返回 plotly Figure 与趋势数据。
 
     参数说明：
     - file_path: 可选，CSV 文件路径（当 df 未提供时读取）
-    - df: 可选，已加载的 DataFrame（优先使用 df）
+    - df: 可选，已加载的 DataFrame（优先使用 df，页面中应传入 AnimeStore 的数据）
     - start_year, end_year: 年份区间
+    - dataset_version: 可选，数据集版本；提供时按版本缓存计算结果（见 AnimeStore.version）
+    - studio_bridge: 可选，AnimeStore.studio_bridge（与 df 行位置对应）；未提供时现场构建
 
-    返回：(fig, trend_df)
+    返回：(fig, trend_df, cohorts_df)
     """
     # 读取或复制数据
     if df is None:
         if file_path is None:
             raise ValueError("必须提供 file_path 或 df 中的一个")
         # 让 pandas 抛出 FileNotFoundError 或其它读取异常，由调用方捕获
-        df_trend = pd.read_csv(file_path)
-    else:
-        df_trend = df.copy()
-
-    # 使用已有的预处理函数以规范列名/日期/数值
-    df_trend = preprocess_anime_df(df_trend)
-
-    # 确保存在 start_year（preprocess 会在有 startdate 时填充 start_year）
-    if "start_year" not in df_trend.columns:
-        # 尝试从任意可能的列提取年份（兼容老字段名）
-        if "startdate" in df_trend.columns:
-            df_trend["start_year"] = df_trend["startdate"].dt.year
-        else:
-            df_trend["start_year"] = pd.NA
-
-    # 过滤时间区间
-    df_trend = df_trend[df_trend["start_year"].between(start_year, end_year)]
-
-    # 规范并拆分 mainstudio
-    if "mainstudio" not in df_trend.columns:
-        raise ValueError("数据中缺少 'mainstudio' 列，无法计算工作室统计")
-
-    df_trend["mainstudio"] = df_trend["mainstudio"].fillna("Unknown")
-    df_trend = df_trend.assign(mainstudio=df_trend["mainstudio"].str.split(",")).explode("mainstudio")
-    df_trend["mainstudio"] = df_trend["mainstudio"].astype(str).str.strip()
-    df_trend = df_trend[df_trend["mainstudio"].str.lower() != "unknown"]
-
-    # 计算每年动漫作品数（按 id 去重）和每年活跃工作室数（去重 mainstudio）
-    anime_per_year = (
-        df_trend.groupby("start_year")["id"].nunique().reset_index(name="anime_count")
-    )
-    studio_per_year = (
-        df_trend.groupby("start_year")["mainstudio"].nunique().reset_index(name="studio_count")
-    )
+        df = pd.read_csv(file_path)
 
-    trend = pd.merge(anime_per_year, studio_per_year, on="start_year", how="outer").fillna(0)
-    trend = trend.sort_values("start_year")
+    if dataset_version is None:
+        trend, cohorts = compute_studio_trend(df, start_year, end_year, studio_bridge)
+    else:
+        trend, cohorts = _cached_studio_trend(dataset_version, start_year, end_year, df, studio_bridge)
 
-    # 绘图（双轴折线）
+    # 绘图（双轴折线 + 新工作室柱）
     fig = go.Figure()
     fig.add_trace(go.Scatter(
         x=trend["start_year"],
@@ -388,127 +380,214 @@ def plot_trend_anime_vs_studios(file_path: str = None, df: pd.DataFrame = None,
         mode="lines+markers",
         yaxis="y2"
     ))
+    fig.add_trace(go.Bar(
+        x=trend["start_year"],
+        y=trend["new_studios"],
+        name="New Studios",
+        opacity=0.35,
+        yaxis="y2"
+    ))
 
     fig.update_layout(
         title=f"Anime Industry Scale Trend ({start_year}–{end_year})",
         xaxis=dict(title="Year"),
         yaxis=dict(title="Anime Series Count"),
-        yaxis2=dict(title="Active Studios Count", overlaying="y", side="right"),
+        yaxis2=dict(title="Active / New Studios Count", overlaying="y", side="right"),
         template="plotly_white",
         legend=dict(x=0.01, y=0.99)
     )
 
-    return fig, trend
+    return fig, trend, cohorts
 
 
-def plot_isekai_trends(df: pd.DataFrame = None, file_path: str = None,
-                       start_year: int = 2016, end_year: int = 2025):
+def compute_studio_year_counts(df: pd.DataFrame, start_year: int = 2016, end_year: int = 2025, studio_bridge=None):
+    """
+    年份 × 工作室 的作品计数矩阵（滚动集中度指标的输入，只需分组一次）。
+
+    返回：(years, counts)  years 为年份数组；counts 为 int64 矩阵，形状 (年份数, 工作室数)，
+    列号即 studio_id（未提供 studio_bridge 时为现场构建的编码）
     """
-    绘制 Isekai 与 Top10 标签的年度趋势对比图（主图 + 右下角子图）。
+    pairs = _studio_year_pairs(df, start_year, end_year, studio_bridge)
+    years = np.arange(start_year, end_year + 1)
+    n_studios = int(pairs["studio_id"].max()) + 1 if len(pairs) else 0
+    counts = np.zeros((len(years), n_studios), dtype=np.int64)
+    np.add.at(counts, (pairs["start_year"].to_numpy() - start_year, pairs["studio_id"].to_numpy()), 1)
+    return years, counts
+
+
+@st.cache_data(show_spinner=False)
+def _cached_studio_year_counts(dataset_version, start_year, end_year, _df, _studio_bridge=None):
+    # _df / _studio_bridge 不参与哈希，缓存按数据集版本 + 年份区间区分
+    return compute_studio_year_counts(_df, start_year, end_year, _studio_bridge)
+
+
+def get_studio_year_counts(df: pd.DataFrame, start_year: int = 2016, end_year: int = 2025,
+                           dataset_version: str = None, studio_bridge=None):
+    """compute_studio_year_counts 的页面入口：提供 dataset_version 时按版本缓存，滑动窗口 / k 时无需重新分组"""
+    if dataset_version is None:
+        return compute_studio_year_counts(df, start_year, end_year, studio_bridge)
+    return _cached_studio_year_counts(dataset_version, start_year, end_year, df, studio_bridge)
+
+
+def studio_concentration_metrics(years: np.ndarray, counts: np.ndarray, window: int = 1, k: int = 10) -> pd.DataFrame:
+    """
+    按滚动窗口计算工作室集中度：HHI、Gini、Top-k 份额。
+
+    先对年份做累计和，窗口内各工作室计数 = cum[t] - cum[t - window]（所有窗口一次向量化得到），
+    再对每个窗口的计数降序排序并累计，Top-k 份额直接取第 k 个累计值，Top-k 集合随窗口动态变化。
+
+    :param years: 年份数组（compute_studio_year_counts 的返回）
+    :param counts: 年份 × 工作室 计数矩阵
+    :param window: 窗口长度（年），1 即逐年
+    :param k: Top-k 中的 k
+    :return: DataFrame，每个窗口一行：end_year / window_label / total / active_studios / hhi / gini / top_k_share
+    """
+    window = int(max(1, min(window, len(years))))
+    cum = np.vstack([np.zeros((1, counts.shape[1]), dtype=counts.dtype), counts.cumsum(axis=0)])
+    win = cum[window:] - cum[:-window]                      # (窗口数, 工作室数)
+
+    total = win.sum(axis=1).astype(float)
+    safe_total = np.where(total > 0, total, 1.0)
+    shares = win / safe_total[:, None]
+
+    # 降序累计：Top-k 份额
+    desc_cum = np.cumsum(-np.sort(-win, axis=1), axis=1)
+    k_idx = min(max(k, 1), win.shape[1]) - 1
+    top_k_share = desc_cum[:, k_idx] / safe_total if win.shape[1] else np.zeros(len(total))
+
+    # HHI：份额平方和（0–1，越大越集中）
+    hhi = (shares ** 2).sum(axis=1)
+
+    # Gini：只在窗口内活跃（计数 > 0）的工作室之间计算。升序排序后 0 排在前面，
+    # 活跃工作室的秩 = 位置 - 非活跃数，Σ i·x_i 可整体减去偏移量一次求得
+    asc = np.sort(win, axis=1)
+    n_active = (win > 0).sum(axis=1)
+    positions = np.arange(1, win.shape[1] + 1)
+    offset = win.shape[1] - n_active
+    weighted = (asc * positions).sum(axis=1) - offset * total
+    safe_n = np.where(n_active > 0, n_active, 1)
+    gini = np.where(n_active > 0, 2 * weighted / (safe_n * safe_total) - (safe_n + 1) / safe_n, 0.0)
+
+    end_years = years[window - 1:]
+    labels = [str(y) if window == 1 else f"{y - window + 1}–{y}" for y in end_years]
+    return pd.DataFrame({
+        "end_year": end_years,
+        "window_label": labels,
+        "total": total.astype(int),
+        "active_studios": n_active,
+        "hhi": hhi,
+        "gini": gini,
+        "top_k_share": top_k_share,
+    })
+
+
+def plot_studio_concentration(metrics: pd.DataFrame, k: int = 10):
+    """
+    绘制滚动集中度折线图（HHI / Gini / Top-k 份额），返回 plotly Figure。
+
+    :param metrics: studio_concentration_metrics 的返回
+    :param k: 图例中显示的 k
+    """
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=metrics["window_label"], y=metrics["top_k_share"],
+        name=f"Top-{k} Share", mode="lines+markers"
+    ))
+    fig.add_trace(go.Scatter(
+        x=metrics["window_label"], y=metrics["gini"],
+        name="Gini (active studios)", mode="lines+markers"
+    ))
+    fig.add_trace(go.Scatter(
+        x=metrics["window_label"], y=metrics["hhi"],
+        name="HHI", mode="lines+markers", yaxis="y2"
+    ))
+    fig.update_layout(
+        title="Studio Concentration over Time",
+        xaxis=dict(title="Window"),
+        yaxis=dict(title="Share / Gini", tickformat=".0%", range=[0, 1]),
+        yaxis2=dict(title="HHI", overlaying="y", side="right"),
+        template="plotly_white",
+        legend=dict(x=0.01, y=0.99)
+    )
+    return fig
+
+
+# 绘制标签趋势时排除的关键词（角色构成类标签，几乎每部作品都有）
+TAG_EXCLUDE_KEYWORDS = ["Male", "Female", "Cast"]
+
+
+def plot_tag_trends(df: pd.DataFrame = None, file_path: str = None, focus_tag: str = "Isekai",
+                    start_year: int = 2016, end_year: int = 2025, tag_index: TagIndex = None,
+                    top_n: int = 10):
+    """
+    绘制任意标签与 Top N 标签的年度趋势对比图（主图 + 右下角子图）。
+
+    年度计数由稀疏 作品×标签 矩阵与年份指示矩阵相乘得到（见 store/tag_index.py），不再逐行拆分 tags。
 
     参数：
     - df: 已加载的 DataFrame（优先使用）
     - file_path: CSV 文件路径（当 df 未提供时读取）
+    - focus_tag: 重点展示（红线 + 子图）的标签
     - start_year, end_year: 年份区间
+    - tag_index: 可选，AnimeStore.tag_index（行位置与 df 一致）；未提供时按 df 的 tags 列现场构建
+    - top_n: 对比的高频标签个数
 
-    返回：(fig, year_tag_counts, isekai_count)
+    返回：(fig, year_tag_counts, focus_count)
     """
-    from collections import Counter
-    import numpy as np
-
-    # 读取或复制数据
+    # 读取数据
     if df is None:
         if file_path is None:
             raise ValueError("必须提供 file_path 或 df 中的一个")
         df = pd.read_csv(file_path)
-    else:
-        df = df.copy()
-
-    # 预处理：确保存在 start_year 和 tag_list
-    df = preprocess_anime_df(df)
-
-    # 处理 tags 列表
-    df['tag_list'] = df['tags'].fillna('').apply(lambda x: x.split('|') if x else [])
 
-    # 生成 is_isekai 标记
-    df['is_isekai'] = df['tag_list'].apply(lambda x: 1 if 'Isekai' in x else 0)
+    if tag_index is None:
+        col_map = {c.lower(): c for c in df.columns}
+        if "tags" not in col_map:
+            raise ValueError("数据中缺少 'tags' 列")
+        tag_index = TagIndex.from_tags(df[col_map["tags"]])
+    if focus_tag not in tag_index:
+        raise ValueError(f"数据中没有标签：{focus_tag}")
 
-    # 排除关键词
-    exclude_keywords = ["Male", "Female", "Cast"]
-    def is_excluded(tag):
-        return any(keyword in tag for keyword in exclude_keywords)
+    # Top N 标签（按出现作品数，排除角色构成类标签），并确保包含重点标签
+    top_tags = tag_index.top_tags(top_n, exclude_keywords=TAG_EXCLUDE_KEYWORDS)
+    if focus_tag not in top_tags:
+        top_tags.append(focus_tag)
 
-    # 计算 Top10 标签
-    all_tags = Counter(
-        tag for tags in df['tag_list'] for tag in tags
-        if tag and not is_excluded(tag)
-    )
-    top10 = [t for t, _ in all_tags.most_common(10)]
-    if "Isekai" not in top10:
-        top10.append("Isekai")
-
-    # 准备主图数据
-    df_filtered = df.copy()
-    df_filtered['tag_list'] = df_filtered['tag_list'].apply(
-        lambda tags: [t for t in tags if not is_excluded(t)]
-    )
-    year_tag_counts = (
-        df_filtered.explode('tag_list')
-                   .groupby(['start_year', 'tag_list'])
-                   .size()
-                   .unstack(fill_value=0)
-    )
-
-    # 过滤到指定年份区间
-    year_tag_counts = year_tag_counts.loc[start_year:end_year]
-
-    # 准备子图数据
-    isekai_count = df.groupby('start_year')['is_isekai'].sum().reset_index()
-    isekai_count = isekai_count[
-        (isekai_count['start_year'] >= start_year) &
-        (isekai_count['start_year'] <= end_year)
-    ]
+    years = _start_year(normalize_columns(df))
+    year_tag_counts = tag_index.counts_by_year(years, start_year, end_year, tags=top_tags)
+    focus_count = year_tag_counts[focus_tag].rename("count").reset_index()
 
     # 创建图表
     fig = go.Figure()
 
-    # 记录 2025 年 Isekai 值（用于箭头指向）
-    isekai_2025_val = 0
-
     # 绘制主图（左侧）
-    for tag in top10:
-        if tag in year_tag_counts.columns:
-            if tag == "Isekai":
-                try:
-                    isekai_2025_val = year_tag_counts.loc[end_year, tag]
-                except KeyError:
-                    isekai_2025_val = 0
-
-                fig.add_trace(go.Scatter(
-                    x=year_tag_counts.index,
-                    y=year_tag_counts[tag],
-                    mode='lines+markers',
-                    name=tag,
-                    line=dict(width=5, color='red'),
-                    marker=dict(size=8),
-                    zorder=10
-                ))
-            else:
-                fig.add_trace(go.Scatter(
-                    x=year_tag_counts.index,
-                    y=year_tag_counts[tag],
-                    mode='lines+markers',
-                    name=tag,
-                    opacity=0.5,
-                    line=dict(width=2)
-                ))
+    for tag in top_tags:
+        if tag == focus_tag:
+            fig.add_trace(go.Scatter(
+                x=year_tag_counts.index,
+                y=year_tag_counts[tag],
+                mode='lines+markers',
+                name=tag,
+                line=dict(width=5, color='red'),
+                marker=dict(size=8),
+                zorder=10
+            ))
+        else:
+            fig.add_trace(go.Scatter(
+                x=year_tag_counts.index,
+                y=year_tag_counts[tag],
+                mode='lines+markers',
+                name=tag,
+                opacity=0.5,
+                line=dict(width=2)
+            ))
 
     # 绘制子图（右下角）
     fig.add_trace(go.Scatter(
-        x=isekai_count['start_year'],
-        y=isekai_count['is_isekai'],
+        x=focus_count['start_year'],
+        y=focus_count['count'],
         mode='lines+markers',
-        name='Isekai Volume',
+        name=f'{focus_tag} Volume',
         xaxis='x2',
         yaxis='y2',
         line=dict(color='blue', width=2),
@@ -518,7 +597,7 @@ def plot_isekai_trends(df: pd.DataFrame = None, file_path: str = None,
 
     # 布局设置
     fig.update_layout(
-        title=f"Top 10 Tags vs Isekai Trends ({start_year}–{end_year})",
+        title=f"Top {top_n} Tags vs {focus_tag} Trends ({start_year}–{end_year})",
         width=1300,
         height=650,
         template="plotly_white",
@@ -552,7 +631,7 @@ def plot_isekai_trends(df: pd.DataFrame = None, file_path: str = None,
 
     # 添加注释和箭头
     fig.add_annotation(
-        text="Isekai Anime Count",
+        text=f"{focus_tag} Anime Count",
         xref="paper", yref="paper",
         x=0.88, y=0.38,
         showarrow=False,
@@ -560,10 +639,11 @@ def plot_isekai_trends(df: pd.DataFrame = None, file_path: str = None,
         xanchor="center"
     )
 
-    # 箭头：指向 2025 年 Isekai 数据点
-    if isekai_2025_val > 0:
+    # 箭头：指向最后一年的重点标签数据点
+    focus_last_val = year_tag_counts.loc[end_year, focus_tag]
+    if focus_last_val > 0:
         fig.add_annotation(
-            x=end_year, y=isekai_2025_val,
+            x=end_year, y=focus_last_val,
             xref="x", yref="y",
             ax=90,
             ay=10,
@@ -572,75 +652,100 @@ def plot_isekai_trends(df: pd.DataFrame = None, file_path: str = None,
             arrowcolor="black", opacity=0.8, standoff=4
         )
 
-    return fig, year_tag_counts, isekai_count
+    return fig, year_tag_counts, focus_count
 
 
-def plot_isekai_wordcloud(df: pd.DataFrame = None, file_path: str = None,
-                          width: int = 1200, height: int = 800):
+def plot_isekai_trends(df: pd.DataFrame = None, file_path: str = None,
+                       start_year: int = 2016, end_year: int = 2025, tag_index: TagIndex = None):
     """
-    生成 Isekai 动漫标签的词云（基于 TF-IDF 向量化）。
+    绘制 Isekai 与 Top10 标签的年度趋势对比图（plot_tag_trends 的 Isekai 版本）。
 
-    参数：
-    - df: 已加载的 DataFrame（优先使用）
-    - file_path: CSV 文件路径（当 df 未提供时读取）
-    - width, height: 词云宽高
+    返回：(fig, year_tag_counts, isekai_count)
+    """
+    fig, year_tag_counts, focus_count = plot_tag_trends(
+        df=df, file_path=file_path, focus_tag="Isekai",
+        start_year=start_year, end_year=end_year, tag_index=tag_index
+    )
+    return fig, year_tag_counts, focus_count.rename(columns={"count": "is_isekai"})
 
-    返回：(fig, tfidf_rank)  fig 为 matplotlib figure，tfidf_rank 为 TF-IDF 得分 DataFrame
+
+@st.cache_data(show_spinner=False)
+def _cached_tag_cooccurrence(dataset_version, _tag_index: TagIndex):
+    # _tag_index 不参与哈希，缓存按数据集版本区分
+    return _tag_index.cooccurrence()
+
+
+def get_tag_cooccurrence(tag_index: TagIndex, dataset_version: str = None):
     """
-    import re
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from wordcloud import WordCloud
+    标签共现矩阵 XᵀX 的页面入口：提供 dataset_version 时按版本缓存，之后查询任意标签只需读取一行。
 
-    # 读取或复制数据
+    返回：scipy.sparse.csr_matrix，行列顺序与 tag_index.vocab 一致
+    """
+    if dataset_version is None:
+        return tag_index.cooccurrence()
+    return _cached_tag_cooccurrence(dataset_version, tag_index)
+
+
+def cooccurring_tags(tag_index: TagIndex, tag: str = "Isekai", n: int = 10, sort_by: str = "count",
+                     min_count: int = 1, dataset_version: str = None) -> pd.DataFrame:
+    """
+    与 tag 共现最多（或 lift / PMI 最高）的 n 个标签。
+
+    返回：DataFrame，列 Rank / Tag / Count / Lift / PMI
+    """
+    cooc = get_tag_cooccurrence(tag_index, dataset_version)
+    related = tag_index.related_tags(cooc, tag, n=n, sort_by=sort_by, min_count=min_count)
+    related.insert(0, "rank", range(1, len(related) + 1))
+    return related.rename(columns=str.title).rename(columns={"Pmi": "PMI"})
+
+
+def isekai_tag_texts(df: pd.DataFrame) -> pd.Series:
+    """Isekai 作品的标签文本：去掉括号/引号/空格，'|' 换成空格并小写（TF-IDF 与词云的输入）"""
+    isekai_tags = df.loc[df["tags"].str.contains("Isekai", case=False, na=False), "tags"]
+    if isekai_tags.empty:
+        raise ValueError("数据中未找到包含 Isekai 标签的作品")
+    return (
+        isekai_tags.str.replace(r"[\[\]'\" ]", "", regex=True)
+                   .str.replace("|", " ", regex=False)
+                   .str.lower()
+    )
+
+
+def isekai_wordcloud(df: pd.DataFrame = None, file_path: str = None,
+                     width: int = 1200, height: int = 800, timeout: float = None):
+    """
+    Isekai 标签词云（PNG）与 TF-IDF 排名，经 util/wordcloud_cache 按内容哈希缓存到磁盘，
+    未命中时在后台线程池中渲染（同一输入并发请求只渲染一次）。
+
+    返回：(png_bytes, tfidf_rank)
+    """
     if df is None:
         if file_path is None:
             raise ValueError("必须提供 file_path 或 df 中的一个")
         df = pd.read_csv(file_path)
-    else:
-        df = df.copy()
+    return wordcloud_cache.get_wordcloud(isekai_tag_texts(df), width=width, height=height, timeout=timeout)
 
-    # 筛选 Isekai 动漫
-    isekai_df = df[df["tags"].str.contains("Isekai", case=False, na=False)]
 
-    if isekai_df.empty:
-        raise ValueError("数据中未找到包含 Isekai 标签的作品")
+def plot_isekai_wordcloud(df: pd.DataFrame = None, file_path: str = None,
+                          width: int = 1200, height: int = 800):
+    """
+    生成 Isekai 动漫标签的词云（基于 TF-IDF 向量化）。
 
-    # 清洗标签
-    def clean_tags(tag_str):
-        if pd.isna(tag_str):
-            return ""
-        tag_str = re.sub(r"[\[\]'\" ]", "", tag_str)
-        tag_str = tag_str.replace("|", " ")
-        return tag_str.lower()
-
-    isekai_df = isekai_df.copy()
-    isekai_df["clean_tags"] = isekai_df["tags"].apply(clean_tags)
-
-    # TF-IDF 向量化
-    vectorizer = TfidfVectorizer(max_features=500, stop_words="english")
-    tfidf_matrix = vectorizer.fit_transform(isekai_df["clean_tags"])
-    feature_names = vectorizer.get_feature_names_out()
-
-    # 计算 TF-IDF 得分
-    tfidf_scores = np.asarray(tfidf_matrix.mean(axis=0)).ravel()
-
-    tfidf_rank = pd.DataFrame({
-        "word": feature_names,
-        "score": tfidf_scores
-    }).sort_values(by="score", ascending=False)
-
-    # 生成词云
-    wordcloud = WordCloud(
-        width=width,
-        height=height,
-        background_color="white"
-    ).generate(" ".join(isekai_df["clean_tags"]))
+    参数：
+    - df: 已加载的 DataFrame（优先使用）
+    - file_path: CSV 文件路径（当 df 未提供时读取）
+    - width, height: 词云宽高
+
+    返回：(fig, tfidf_rank)  fig 为 matplotlib figure，tfidf_rank 为 TF-IDF 得分 DataFrame
+    页面直接展示 PNG 时请使用 isekai_wordcloud，无需经过 matplotlib
+    """
+    png, tfidf_rank = isekai_wordcloud(df=df, file_path=file_path, width=width, height=height)
 
     # 创建 matplotlib figure
+    _configure_matplotlib()
     fig = plt.figure(figsize=(width / 100, height / 100))
-    plt.imshow(wordcloud, interpolation="bilinear")
+    plt.imshow(plt.imread(io.BytesIO(png), format="png"), interpolation="bilinear")
     plt.axis("off")
     plt.tight_layout(pad=0)
 
     return fig, tfidf_rank
-
@@ -0,0 +1,172 @@
+# util/wordcloud_cache.py
+"""
+词云渲染缓存：TF-IDF 排名 + 词云 PNG 按“输入文本集合 + 渲染参数”的哈希缓存到磁盘。
+
+- 同一输入在任何会话、任何进程重启后都直接读盘，不再重新拟合 TfidfVectorizer / 渲染 WordCloud
+- 渲染在后台线程池中执行；多个会话同时请求同一张词云时只渲染一次（共享同一个 Future）
+- 磁盘缓存按最近使用时间（mtime）做 LRU 淘汰，最多保留 MAX_ENTRIES 组
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+from util.lazy_import import lazy_import
+
+sk_text = lazy_import("sklearn.feature_extraction.text")
+wordcloud_lib = lazy_import("wordcloud")
+
+# 缓存目录（相对仓库根目录，与数据路径一致）
+CACHE_DIR = ".cache/wordcloud"
+# 磁盘上最多保留的词云组数
+MAX_ENTRIES = 32
+# 缓存格式版本：渲染逻辑变化时递增，使旧文件自然失效
+CACHE_FORMAT = 1
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="wordcloud")
+_pending: Dict[str, Future] = {}
+_pending_lock = threading.Lock()
+
+
+def cache_key(texts: Iterable[str], params: dict) -> str:
+    """
+    内容寻址键：文本集合（排序后，与行顺序无关）+ 渲染参数 的 sha256 前 16 位。
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps({"format": CACHE_FORMAT, **params}, sort_keys=True).encode("utf-8"))
+    for text in sorted(texts):
+        h.update(text.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def _paths(key: str) -> Tuple[str, str]:
+    return os.path.join(CACHE_DIR, f"{key}.png"), os.path.join(CACHE_DIR, f"{key}.tfidf.csv")
+
+
+def _write_atomic(path: str, data: bytes):
+    # 先写临时文件再替换，避免并发读到半个文件
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read(key: str):
+    png_path, rank_path = _paths(key)
+    try:
+        with open(png_path, "rb") as f:
+            png = f.read()
+        tfidf_rank = pd.read_csv(rank_path)
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        return None
+    # 命中时刷新 mtime，作为 LRU 的“最近使用”时间
+    for path in (png_path, rank_path):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+    return png, tfidf_rank
+
+
+def _evict(max_entries: int = MAX_ENTRIES):
+    """按 mtime 淘汰最久未使用的缓存组（PNG 与 TF-IDF 文件一起删除）"""
+    try:
+        names = [n for n in os.listdir(CACHE_DIR) if n.endswith(".png")]
+    except FileNotFoundError:
+        return
+    if len(names) <= max_entries:
+        return
+
+    def mtime(name):
+        try:
+            return os.path.getmtime(os.path.join(CACHE_DIR, name))
+        except FileNotFoundError:
+            return 0.0
+
+    for name in sorted(names, key=mtime)[:len(names) - max_entries]:
+        for path in _paths(name[:-len(".png")]):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def render_wordcloud(texts, width: int = 1200, height: int = 800,
+                     max_features: int = 500, random_state: int = 42) -> Tuple[bytes, pd.DataFrame]:
+    """
+    拟合 TF-IDF 并渲染词云（不使用缓存，CPU 密集，应在线程池中调用）。
+
+    :param texts: 每部作品一个字符串，词之间用空格分隔
+    :return: (png_bytes, tfidf_rank)  tfidf_rank 列 word / score，按得分降序
+    """
+    texts = list(texts)
+    vectorizer = sk_text.TfidfVectorizer(max_features=max_features, stop_words="english")
+    tfidf_matrix = vectorizer.fit_transform(texts)
+    tfidf_rank = pd.DataFrame({
+        "word": vectorizer.get_feature_names_out(),
+        "score": np.asarray(tfidf_matrix.mean(axis=0)).ravel(),
+    }).sort_values(by="score", ascending=False).reset_index(drop=True)
+
+    # 固定 random_state，使同一输入得到同一张图（内容寻址缓存的前提）
+    wordcloud = wordcloud_lib.WordCloud(
+        width=width,
+        height=height,
+        background_color="white",
+        random_state=random_state,
+    ).generate(" ".join(texts))
+    buffer = io.BytesIO()
+    wordcloud.to_image().save(buffer, format="PNG")
+    return buffer.getvalue(), tfidf_rank
+
+
+def _render_and_store(key: str, texts, params: dict):
+    try:
+        cached = _read(key)
+        if cached is not None:
+            return cached
+        png, tfidf_rank = render_wordcloud(texts, **params)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        png_path, rank_path = _paths(key)
+        _write_atomic(rank_path, tfidf_rank.to_csv(index=False).encode("utf-8"))
+        _write_atomic(png_path, png)
+        _evict()
+        return png, tfidf_rank
+    finally:
+        with _pending_lock:
+            _pending.pop(key, None)
+
+
+def submit(texts, width: int = 1200, height: int = 800,
+           max_features: int = 500, random_state: int = 42) -> Future:
+    """
+    提交渲染任务并立即返回 Future；磁盘已有缓存时返回已完成的 Future，
+    同一键正在渲染时返回同一个 Future（不会重复渲染）。
+    """
+    texts = list(texts)
+    params = {"width": width, "height": height, "max_features": max_features, "random_state": random_state}
+    key = cache_key(texts, params)
+
+    cached = _read(key)
+    if cached is not None:
+        done = Future()
+        done.set_result(cached)
+        return done
+
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is None:
+            future = _executor.submit(_render_and_store, key, texts, params)
+            _pending[key] = future
+    return future
+
+
+def get_wordcloud(texts, width: int = 1200, height: int = 800, max_features: int = 500,
+                  random_state: int = 42, timeout: float = None) -> Tuple[bytes, pd.DataFrame]:
+    """submit 的阻塞版本：返回 (png_bytes, tfidf_rank)"""
+    return submit(texts, width, height, max_features, random_state).result(timeout=timeout)
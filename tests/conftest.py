@@ -0,0 +1,8 @@
+# tests/conftest.py
+# 与 PYTHONPATH=src python -m ... 相同：测试从仓库根目录运行，模块从 src 导入
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+os.chdir(ROOT)
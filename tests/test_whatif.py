@@ -0,0 +1,38 @@
+# tests/test_whatif.py
+import numpy as np
+import pytest
+from model.artifacts import train_artifact
+from model.whatif import WHATIF_AXES, genre_combinations, score_scenarios
+
+# 小森林：只检查打分路径，不关心精度
+PARAMS = {"n_estimators": 5, "max_depth": 6}
+
+
+def _spec(artifact):
+    studios = sorted(artifact.builder.studio_popularity)[:2]
+    return {"studio": studios, "format": ["TV", "MOVIE"], "episodes": [12, 24], "duration": [24],
+            "average_score": [0, 70], "is_sequel": [0, 1], "genres": genre_combinations(["Action", "Comedy"])}
+
+
+@pytest.fixture(scope="module")
+def plain_artifact():
+    return train_artifact(params=PARAMS, n_jobs=1)
+
+
+@pytest.fixture(scope="module")
+def tag_artifact():
+    return train_artifact(params=PARAMS, n_jobs=1, feature_config={"tag_dim": 32, "tag_encoding": True})
+
+
+def test_grid_scores_every_scenario(plain_artifact):
+    spec = _spec(plain_artifact)
+    ranked, effects = score_scenarios(plain_artifact, spec)
+    assert len(ranked) == int(np.prod([len(spec[axis]) for axis in WHATIF_AXES]))
+    assert np.isfinite(ranked["predicted_popularity"]).all()
+    assert set(effects["axis"]) == set(WHATIF_AXES)
+
+
+def test_grid_refuses_tag_model(tag_artifact):
+    # 情景没有标签维度：标签模型若按“无标签”打分，预测会整体塌缩，必须报错
+    with pytest.raises(ValueError, match="标签特征"):
+        score_scenarios(tag_artifact, _spec(tag_artifact))